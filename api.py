@@ -1,6 +1,6 @@
 import sys
 from fastapi import FastAPI
-from database.session import Base, engine
+from database.session import Base, SessionLocal, engine
 from src.articles.controller import router as article_router
 from src.addresse.controller import router as address_router
 from src.command.controller import router as command_router
@@ -11,6 +11,8 @@ from src.livraison.controller import router as livraison_router
 from src.facturation.controller import router as facture_router
 from src.pricing.controller import router as pricing_router
 from src.settings.controller import router as settings_router
+from src.pricing.service import init_pricing_engine
+from src.taxe.service import init_tax_tables
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import asyncio
@@ -35,6 +37,15 @@ Base.metadata.create_all(bind=engine)
 
 sync_lock = asyncio.Lock()
 
+def warm_pricing_engine():
+    """Build the shared pricing engine caches and the tax decision table for the current sync generation."""
+    db = SessionLocal()
+    try:
+        init_pricing_engine(db)
+        init_tax_tables(db)
+    finally:
+        db.close()
+
 async def periodic_sync():
     """Run sync_email immediately at startup and then every 15 minutes."""
     while True:
@@ -45,6 +56,11 @@ async def periodic_sync():
                 logger.info("sync_emails completed.")
         except Exception as e:
             logger.error(f" Error in periodic sync: {e}")
+        try:
+            await asyncio.to_thread(warm_pricing_engine)
+            logger.info("Pricing engine warmed up.")
+        except Exception as e:
+            logger.error(f" Error warming up pricing engine: {e}")
         await asyncio.sleep(60 * 15)  # wait 15 minutes before next run
 
 @asynccontextmanager
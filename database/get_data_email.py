@@ -8,6 +8,8 @@ import csv
 from sqlalchemy import MetaData, select, update, insert, and_, create_engine
 from .session import SessionLocal, engine
 from .models import POPConfig, FolderConfig
+from .sync_data import bump_sync_generation, record_synced_rows, stamp_snapshot
+from .pricing_lines import refresh_typed_pricing_lines
 
 
 class EmailCSVDownloader:
@@ -17,6 +19,7 @@ class EmailCSVDownloader:
         self.password = password
         self.save_dir = save_dir
         self.target_db_path = target_db_path
+        self.synced_tables = set()  # Tables upserted by the CSV files of this sync
         if not os.path.exists(self.save_dir):
             os.makedirs(self.save_dir)  
 
@@ -173,6 +176,9 @@ class EmailCSVDownloader:
                             stmt = select(table).where(pk_column == auuid_value)
                             result = conn.execute(stmt).fetchone()
                             
+                            # Rows before and after their upsert, for the consumers watching the table
+                            record_synced_rows(actual_table_name, [row_data] + ([dict(result._mapping)] if result else []))
+                            
                             if result:
                                 # Update existing record
                                 update_stmt = update(table).where(pk_column == auuid_value).values(row_data)
@@ -183,10 +189,12 @@ class EmailCSVDownloader:
                                 insert_stmt = insert(table).values(row_data)
                                 conn.execute(insert_stmt)
                                 print(f"DEBUG: Inserted {table_name} record with AUUID_0={auuid_value}")
+                            self.synced_tables.add(actual_table_name.upper())
                                 
                         except Exception as e:
                             print(f"Error upserting row {row_idx} into '{table_name}': {e}")
                             
+                stamp_snapshot(conn.connection.driver_connection)
                 conn.commit()
                 print(f"DEBUG: Finished processing {filepath}")
             except Exception as e:
@@ -194,12 +202,16 @@ class EmailCSVDownloader:
 
 
 def run_email_sync_once(host, user, password, save_dir, target_db_path):
-    """Instantiates the downloader and fetches CSV attachments once."""
+    """Instantiates the downloader, fetches CSV attachments once and returns the tables they synced."""
     downloader = EmailCSVDownloader(host, user, password, save_dir, target_db_path)
     try:
         downloader.download_csv_attachments()
     except Exception as e:
         print(f"Error during email sync: {e}")
+    if 'SPRICLIST' in downloader.synced_tables:
+        # Rebuilt once from the pricing lines of all the CSV files
+        refresh_typed_pricing_lines(target_db_path)
+    return downloader.synced_tables
 
 
 def sync_emails():
@@ -215,12 +227,15 @@ def sync_emails():
         print(f"Target database path: {sqlite_db.path}")
         print(f"Email config: {email_config}")
         
-        run_email_sync_once(
+        synced_tables = run_email_sync_once(
                 host=email_config.server,
                 user=email_config.username,
                 password=email_config.password,
                 save_dir="./attachments",
                 target_db_path=sqlite_db.path
         )
+        if synced_tables:
+            # One generation per sync, the caches reload once after all its CSV files
+            bump_sync_generation()
     finally:
         db.close()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import sqlite3
+import logging
+from .sync_data import stamp_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Typed copy of SPRICLIST used by the pricing engine
+TYPED_PRICING_LINES_TABLE = "SPRICLIST_TYPED"
+
+_CRITERIA = range(1, 6)
+
+
+def typed_pricing_lines_exists(conn: sqlite3.Connection) -> bool:
+    """Check whether the typed pricing lines table has been built"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (TYPED_PRICING_LINES_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+def rebuild_typed_pricing_lines(conn: sqlite3.Connection):
+    """
+    Rebuild SPRICLIST_TYPED from SPRICLIST.
+
+    The ingest stores everything as text, so the table adds:
+    - MINQTY_N / MAXQTY_N: quantity bounds as REAL
+    - PLISTRDAT_D / PLIENDDAT_D: validity dates completed to ISO 'YYYY-MM-DD HH:MM:SS',
+      compared to order dates as the text dates are ('2025-03-15' ends before its midnight)
+    - PLICRIn_W: 1 when criterion n is a '~' wildcard
+    and composite indexes on the columns the pricing engine filters on.
+    The new table is built aside and swapped in one transaction.
+    """
+    building = f"{TYPED_PRICING_LINES_TABLE}_NEW"
+    wildcard_columns = ",\n            ".join(
+        f"COALESCE(PLICRI{i}_0 LIKE '%~%', 0) AS PLICRI{i}_W" for i in _CRITERIA
+    )
+
+    conn.execute(f"DROP TABLE IF EXISTS {building}")
+    conn.execute(f"""
+        CREATE TABLE {building} AS
+        SELECT
+            *,
+            CAST(MINQTY_0 AS REAL) AS MINQTY_N,
+            CAST(MAXQTY_0 AS REAL) AS MAXQTY_N,
+            CASE
+                WHEN substr(datetime(PLISTRDAT_0), 1, length(PLISTRDAT_0)) = PLISTRDAT_0 THEN datetime(PLISTRDAT_0)
+                ELSE PLISTRDAT_0
+            END AS PLISTRDAT_D,
+            CASE
+                WHEN datetime(PLIENDDAT_0) = PLIENDDAT_0 THEN PLIENDDAT_0
+                WHEN substr(datetime(PLIENDDAT_0), 1, length(PLIENDDAT_0)) = PLIENDDAT_0
+                    THEN datetime(PLIENDDAT_0, '-1 second')
+                ELSE PLIENDDAT_0
+            END AS PLIENDDAT_D,
+            {wildcard_columns}
+        FROM
+            SPRICLIST
+        ORDER BY
+            rowid
+    """)
+
+    try:
+        conn.execute("BEGIN")
+        conn.execute(f"DROP TABLE IF EXISTS {TYPED_PRICING_LINES_TABLE}")
+        conn.execute(f"ALTER TABLE {building} RENAME TO {TYPED_PRICING_LINES_TABLE}")
+        conn.execute(f"""
+            CREATE INDEX IX_{TYPED_PRICING_LINES_TABLE}_LINE
+            ON {TYPED_PRICING_LINES_TABLE} (PLI_0, PLILIN_0)
+        """)
+        for i in (1, 2):
+            conn.execute(f"""
+                CREATE INDEX IX_{TYPED_PRICING_LINES_TABLE}_CRI{i}
+                ON {TYPED_PRICING_LINES_TABLE} (PLI_0, CUR_0, UOM_0, PLICRI{i}_0, PLISTRDAT_D)
+            """)
+            conn.execute(f"""
+                CREATE INDEX IX_{TYPED_PRICING_LINES_TABLE}_WLD{i}
+                ON {TYPED_PRICING_LINES_TABLE} (PLI_0, CUR_0, UOM_0, PLICRI{i}_W, PLISTRDAT_D)
+            """)
+        stamp_snapshot(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    logger.info(f"Rebuilt {TYPED_PRICING_LINES_TABLE}")
+
+
+def refresh_typed_pricing_lines(db_path: str):
+    """Open the target database and rebuild the typed pricing lines table"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        rebuild_typed_pricing_lines(conn)
+    finally:
+        conn.close()
+
+
+def ensure_typed_pricing_lines(db_path: str):
+    """Build the typed pricing lines table if no sync has built it yet"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        if not typed_pricing_lines_exists(conn):
+            rebuild_typed_pricing_lines(conn)
+    finally:
+        conn.close()
@@ -3,7 +3,10 @@ from database.models import FolderConfig
 from database.session import get_db
 import logging
 import os
+import sqlite3
 import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set
 from sqlalchemy.orm import Session
 
 
@@ -19,6 +22,91 @@ logger = logging.getLogger(__name__)
 
 
 _sync_lock = threading.Lock()
+_sync_generation = 0
+
+
+def get_sync_generation() -> int:
+    """
+    Return the number of syncs committed since the process started.
+    In-memory caches compare it with the value they were built at to know when to reload.
+    """
+    return _sync_generation
+
+
+def bump_sync_generation() -> int:
+    """Mark a sync as committed and return the new generation."""
+    global _sync_generation
+    with _sync_lock:
+        _sync_generation += 1
+        logger.info(f"Sync generation is now {_sync_generation}")
+        return _sync_generation
+
+
+def adopt_sync_generation(generation: int):
+    """Follow the sync generation of another process, used by pricing worker processes."""
+    global _sync_generation
+    with _sync_lock:
+        _sync_generation = generation
+
+
+_watched_tables: Set[str] = set()
+_synced_rows: Dict[str, List[Dict[str, Any]]] = {}
+
+
+def watch_synced_tables(tables: Iterable[str]):
+    """Keep the rows syncs upsert into these tables until clear_synced_rows drops them."""
+    with _sync_lock:
+        _watched_tables.update(table.upper() for table in tables)
+
+
+def record_synced_rows(table: str, rows: List[Dict[str, Any]]):
+    """Record the rows of an upsert (new values, then the previous ones for an update) of a watched table."""
+    table = table.upper()
+    if table not in _watched_tables:
+        return
+    with _sync_lock:
+        _synced_rows.setdefault(table, []).extend(rows)
+
+
+def has_synced_rows(tables: Iterable[str]) -> bool:
+    """Whether rows synced into one of these tables have not been collected yet."""
+    with _sync_lock:
+        return any(_synced_rows.get(table.upper()) for table in tables)
+
+
+def synced_rows(tables: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Rows synced into these tables and not cleared yet, by table."""
+    with _sync_lock:
+        return {table.upper(): list(_synced_rows[table.upper()]) for table in tables if _synced_rows.get(table.upper())}
+
+
+def clear_synced_rows(tables: Iterable[str]):
+    """Drop the rows synced into these tables, once their consumer has processed them."""
+    with _sync_lock:
+        for table in tables:
+            _synced_rows.pop(table.upper(), None)
+
+# Token of the last commit of each kind of data, written in the transaction of the commit
+SNAPSHOT_TABLE = "SYNCSNAPSHOT"
+
+
+def stamp_snapshot(conn: sqlite3.Connection, name: str = 'data'):
+    """
+    Write a new token for a kind of data, inside the transaction committing it.
+    Readers compare the tokens read in their own transaction to know whether they saw the same commits.
+    """
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (NAME_0 TEXT PRIMARY KEY, TOKEN_0 TEXT)")
+    conn.execute(f"INSERT OR REPLACE INTO {SNAPSHOT_TABLE} VALUES (?, ?)", (name, uuid.uuid4().hex))
+
+
+def read_snapshot(conn: sqlite3.Connection, name: str = 'data') -> Optional[str]:
+    """Token of the last commit of a kind of data, None when none was stamped."""
+    try:
+        row = conn.execute(f"SELECT TOKEN_0 FROM {SNAPSHOT_TABLE} WHERE NAME_0 = ?", (name,)).fetchone()
+    except sqlite3.OperationalError:
+        return None  # No commit stamped yet
+    return row[0] if row is not None else None
+
 
 def get_db_file(db: Session) -> str | None:
     """
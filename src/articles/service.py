@@ -8,6 +8,7 @@ import ast
 # from src.articles.model import ArticleInput
 
 from ..articles.model import ArticleInput, ArticleRequest
+from ..articles.stock_ledger import get_stock_ledger
 
 
 def get_articles_site(input: ArticleInput, db: Session) -> List[ArticleRequest]:
@@ -23,12 +24,9 @@ def get_articles_site(input: ArticleInput, db: Session) -> List[ArticleRequest]:
             T3.ITMDES1_0,
             T4.TCLCOD_0,
             T3.BASPRI_0,
-            T4.SAU_0,
-            SUM(T2.QTYSTUACT_0) AS StockActif
+            T4.SAU_0
         FROM
         ITMFACILIT AS T1
-        LEFT JOIN STOCK AS T2 ON T1.ITMREF_0 = T2.ITMREF_0
-        AND T1.STOFCY_0 = T2.STOFCY_0
         LEFT JOIN ITMSALES AS T3 ON T1.ITMREF_0 = T3.ITMREF_0
         LEFT JOIN ITMMASTER AS T4 ON T4.ITMREF_0 = T3.ITMREF_0
         WHERE
@@ -44,6 +42,9 @@ def get_articles_site(input: ArticleInput, db: Session) -> List[ArticleRequest]:
     articles = sqlite_cursor.fetchall()
     sqlite_conn.close()
 
+    # Stock comes from the ledger so orders written since the last sync are accounted for
+    stock_site = get_stock_ledger(db_path).available_site(input.site_id) # type: ignore
+
     for article in articles:
         results.append(ArticleRequest(
             item_code=article[0],
@@ -52,7 +53,7 @@ def get_articles_site(input: ArticleInput, db: Session) -> List[ArticleRequest]:
             base_price=article[3] or 0.0,
             unit_sales=article[4] or "",
             image=None,   
-            stock=article[5] or 0.0,
+            stock=stock_site.get(article[0], 0.0),
         ))
 
     return results
@@ -73,12 +74,9 @@ def search_article(site_id: str, q: str, db: Session) -> List[ArticleRequest]:
   T3.ITMDES1_0,
   T3.TCLCOD_0,
   T3.PURBASPRI_0,
-                          T4.SAU_0,
-  SUM(T2.QTYSTUACT_0) AS StockActif
+  T3.SAU_0
 FROM
   ITMFACILIT AS T1
-  LEFT JOIN STOCK AS T2 ON T1.ITMREF_0 = T2.ITMREF_0
-  AND T1.STOFCY_0 = T2.STOFCY_0
   LEFT JOIN ITMMASTER AS T3 ON T1.ITMREF_0 = T3.ITMREF_0
 WHERE
   T1.STOFCY_0 = ?
@@ -88,11 +86,12 @@ GROUP BY
   T3.ITMDES1_0,
   T3.TCLCOD_0,
   T3.PURBASPRI_0,
-                          T4.SAU_0
+  T3.SAU_0
 
         """, (site_id, q))
     articles = sqlite_cursor.fetchall()
     sqlite_conn.close()
+    stock_site = get_stock_ledger(db_path).available_site(site_id) # type: ignore
     for article in articles:
         results.append(ArticleRequest(
             item_code=article[0],
@@ -100,7 +99,7 @@ GROUP BY
             categorie= article[2],
             base_price=article[3] if article[3] is not None else 0.0,
             unit_sales=article[4] if article[4] is not None else "",
-            stock=article[5] if article[5] is not None else 0.0,
+            stock=stock_site.get(article[0], 0.0),
         ))
     return results
 
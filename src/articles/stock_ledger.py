@@ -0,0 +1,131 @@
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from database.sync_data import get_sync_generation
+
+logger = logging.getLogger(__name__)
+
+
+class StockLedger:
+    """
+    In-memory available stock per (site, item).
+
+    The ledger is seeded from SUM(STOCK.QTYSTUACT_0) and decremented with the
+    SORDERQ allocations of the orders written locally. When a new sync generation
+    is committed it is re-seeded from STOCK minus the allocations still pending:
+    those of the local orders Sage has not sent back yet, whose quantities the
+    synced stock does not reflect.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.generation: Optional[int] = None
+        self._available: Dict[str, Dict[str, float]] = {}
+        self._seeded_orders: Set[str] = set()  # Pending orders already counted by the seed
+        self._lock = threading.Lock()
+
+    def _seed(self):
+        """Load the stock of every (site, item) from the STOCK table"""
+        sqlite_conn = sqlite3.connect(self.db_path)
+        cursor = sqlite_conn.cursor()
+        cursor.execute("""
+            SELECT
+                STOFCY_0,
+                ITMREF_0,
+                SUM(QTYSTUACT_0)
+            FROM
+                STOCK
+            GROUP BY
+                STOFCY_0,
+                ITMREF_0
+        """)
+        available: Dict[str, Dict[str, float]] = {}
+        for row in cursor.fetchall():
+            available.setdefault(row[0], {})[row[1]] = float(row[2] or 0.0)
+        pending = self._pending_allocations(cursor)
+        sqlite_conn.close()
+        for _, site, item_code, quantity in pending:
+            stock_site = available.setdefault(site, {})
+            stock_site[item_code] = stock_site.get(item_code, 0.0) - quantity
+        self._available = available
+        self._seeded_orders = {row[0] for row in pending}
+        logger.info(f"Stock ledger seeded for {len(available)} sites, {len(self._seeded_orders)} pending orders")
+
+    @staticmethod
+    def _pending_allocations(cursor: sqlite3.Cursor) -> List[Tuple[str, str, str, float]]:
+        """
+        Allocated quantity of the local orders not synced back yet, per (order, site, item)
+
+        create_commande writes its rows with binary AUUID_0 values, synced rows carry
+        the text AUUID_0 of Sage. A local order is pending until Sage sends back an
+        order with the same SOHNUM_0.
+        """
+        try:
+            cursor.execute("""
+                SELECT
+                    SORDERQ.SOHNUM_0,
+                    SORDER.SALFCY_0,
+                    SORDERQ.ITMREF_0,
+                    SUM(SORDERQ.ALLQTY_0)
+                FROM
+                    SORDERQ
+                    JOIN SORDER ON SORDER.SOHNUM_0 = SORDERQ.SOHNUM_0 AND typeof(SORDER.AUUID_0) = 'blob'
+                WHERE
+                    typeof(SORDERQ.AUUID_0) = 'blob'
+                    AND NOT EXISTS (
+                        SELECT 1 FROM SORDER AS SYNCED
+                        WHERE SYNCED.SOHNUM_0 = SORDERQ.SOHNUM_0 AND typeof(SYNCED.AUUID_0) != 'blob'
+                    )
+                GROUP BY
+                    SORDERQ.SOHNUM_0,
+                    SORDER.SALFCY_0,
+                    SORDERQ.ITMREF_0
+            """)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"No local orders to keep allocated: {e}")
+            return []
+        return [(row[0], row[1], row[2], float(row[3] or 0.0)) for row in cursor.fetchall()]
+
+    def _reconcile(self):
+        """Re-seed the ledger when the sync generation changed (caller holds the lock)"""
+        generation = get_sync_generation()
+        if self.generation != generation:
+            self._seed()
+            self.generation = generation
+
+    def available(self, site: str, item_code: str) -> float:
+        """Get the available stock of an item on a site"""
+        with self._lock:
+            self._reconcile()
+            return self._available.get(site, {}).get(item_code, 0.0)
+
+    def available_site(self, site: str) -> Dict[str, float]:
+        """Get the available stock of every item of a site"""
+        with self._lock:
+            self._reconcile()
+            return dict(self._available.get(site, {}))
+
+    def allocate(self, site: str, item_code: str, quantity: float, order_number: Optional[str] = None):
+        """Decrement the available stock with an allocated SORDERQ quantity, unless the seed counted its order"""
+        with self._lock:
+            self._reconcile()
+            if order_number is not None and order_number in self._seeded_orders:
+                return
+            stock_site = self._available.setdefault(site, {})
+            stock_site[item_code] = stock_site.get(item_code, 0.0) - float(quantity)
+            logger.debug(f"Allocated {quantity} of {item_code} on {site}, available: {stock_site[item_code]}")
+
+
+_ledgers: Dict[str, StockLedger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_stock_ledger(db_path: str) -> StockLedger:
+    """Get the stock ledger of a database, creating it on first use"""
+    with _ledgers_lock:
+        ledger = _ledgers.get(db_path)
+        if ledger is None:
+            ledger = StockLedger(db_path)
+            _ledgers[db_path] = ledger
+        return ledger
@@ -3,6 +3,7 @@ from typing import List
 from ..command.model import CommandTypeRRequest, CreateCommandRequest
 import uuid
 from database.sync_data import get_db_file
+from ..articles.stock_ledger import get_stock_ledger
 import logging
 import sys
 
@@ -142,6 +143,12 @@ def create_commande(inputs: CreateCommandRequest, db: Session):
     
     sqlite_conn.commit()
     sqlite_conn.close()
+
+    # Keep the available stock in line with the allocations just written
+    ledger = get_stock_ledger(db_path) # type: ignore
+    for line in inputs.ligne:
+        ledger.allocate(inputs.site_vente, line.item_code, line.quantity, sohnnum)
+
     return { 'sorder': sohnnum }
 
 
@@ -0,0 +1,41 @@
+import sqlite3
+import logging
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ItemBasePrices:
+    """ITMMASTER base price (BASPRI_0) of every item, for one sync generation"""
+    generation: int
+    prices: Dict[str, Decimal] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, connection: sqlite3.Connection, generation: int) -> 'ItemBasePrices':
+        """
+        Read the base price of every item from the ITMMASTER table
+
+        Args:
+            connection: Open connection using sqlite3.Row as row factory
+            generation: Sync generation the prices are read at
+
+        Returns:
+            ItemBasePrices for the given generation
+        """
+        prices: Dict[str, Decimal] = {}
+        for row in connection.execute("SELECT ITMREF_0, BASPRI_0 FROM ITMMASTER").fetchall():
+            if row[0] in prices or row[1] is None:
+                continue  # Same row as a "WHERE ITMREF_0 = ?" lookup would return first
+            try:
+                prices[row[0]] = Decimal(str(row[1]))
+            except InvalidOperation:
+                logger.warning(f"Invalid base price {row[1]!r} for item {row[0]}")
+        logger.info(f"Loaded base prices of {len(prices)} items (sync generation {generation})")
+        return cls(generation=generation, prices=prices)
+
+    def get(self, item_code: str) -> Decimal:
+        """Base price of an item, 0 when unknown"""
+        return self.prices.get(item_code, Decimal('0'))
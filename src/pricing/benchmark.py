@@ -0,0 +1,473 @@
+"""
+Pricing engine benchmark
+
+Generates a seeded synthetic Sage X3 pricing database (SPRICCONF, SPRICLIST,
+PRICSTRUCT, ITMMASTER, BPCUSTOMER) and times the pricing engine on a single line,
+a 50 lines cart and a 1000 lines quote. Results are written as JSON and can be
+compared against a stored baseline:
+
+    python -m src.pricing.benchmark --lines 200000 --output benchmark.json
+    python -m src.pricing.benchmark --lines 200000 --baseline benchmark.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import logging
+import argparse
+import platform
+import tempfile
+import contextlib
+import statistics
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from database.pricing_lines import rebuild_typed_pricing_lines
+from ..pricing.service import SageX3PricingEngine, PricingContext, PriceAdjustment
+from ..pricing.minor_units import apply_adjustments_minor_units
+from ..pricing.vectorized import apply_adjustments_vectorized, vectorized_available
+
+logger = logging.getLogger(__name__)
+
+CURRENCIES = ['EUR', 'EUR', 'EUR', 'USD']
+UNITS = ['UN', 'UN', 'UN', 'CS']
+START_DATES = ['2020-01-01 00:00:00', '2024-01-01 00:00:00', '2025-01-01 00:00:00']
+END_DATES = ['2099-12-31 00:00:00', '2030-12-31 00:00:00', '2025-06-30 00:00:00']
+
+# PLI_0, PLIENAFLG_0, PIO_0, PLISTC_0, PLITYP_0, PRIPRO_0, PRIFLD_0, FOCPRO_0, FOCTYP_0, criteria (FIL_i, FLD_i)
+PRICING_RULES = [
+    ('T01', '2', '1', 'S1', '1', '2', '', '2', '1', [('ITMMASTER', 'ITMREF'), ('BPCUSTOMER', 'BPCNUM')]),
+    ('T02', '2', '2', 'S2', '1', '1', 'BASPRI', '3', '2', [('ITMMASTER', 'ITMREF')]),
+    ('T03', '2', '3', 'S3', '1', '2', '', '4', '1', [('BPCUSTOMER', 'BPCNUM')]),
+    ('T04', '2', '4', 'S1', '2', '2', '', '1', '1', [('ITMMASTER', 'ITMREF'), ('SPRICLINK', 'CUR')]),
+]
+
+# PLISTC_0: (INCDCR, VALTYP, CLCRUL) of the DCGVAL_0..8 columns
+PRICE_STRUCTURES = {
+    'S1': [('2', '2', '1'), ('2', '3', '1'), ('1', '1', '2'), ('2', '2', '3')],
+    'S2': [('2', '2', '1'), ('1', '1', '1'), ('2', '3', '2')],
+    'S3': [('2', '2', '2'), ('2', '2', '3'), ('1', '1', '3')],
+}
+
+
+def _columns(prefix: str, count: int) -> str:
+    return ", ".join(f"{prefix}_{i} TEXT" for i in range(count))
+
+
+def _pricing_lines(lines: int, items: List[str], customers: List[str], rng: random.Random) -> Iterator[tuple]:
+    """Generate SPRICLIST rows spread over the pricing rules"""
+    for number in range(lines):
+        rule = PRICING_RULES[number % len(PRICING_RULES)]
+        criteria = []
+        for table, field in rule[9]:
+            if field == 'ITMREF':
+                criteria.append(rng.choice(items) if rng.random() > 0.02 else '~')
+            elif field == 'BPCNUM':
+                criteria.append(rng.choice(customers) if rng.random() > 0.05 else '~')
+            else:
+                criteria.append(rng.choice(CURRENCIES))
+        criteria += [''] * (5 - len(criteria))
+
+        minimum, maximum = rng.choice([('0', '0'), ('0', '0'), ('1', '20'), ('10', '100'), ('50', '0')])
+        discounts = [rng.choice(['0.0', '0.0', '2.5', '5', '10']) for _ in range(9)]
+        focpro = rule[7]
+        yield (
+            f"U{number}", rule[0], f"CRD{number}", str(number + 1),
+            rng.choice(START_DATES), rng.choice(END_DATES),
+            *criteria, minimum, maximum,
+            rng.choice(CURRENCIES), rng.choice(UNITS),
+            f"{rng.randint(1, 500)}.{rng.randint(0, 99):02d}",
+            *discounts,
+            rng.choice(['0', '10', '20']) if focpro != '1' else '0',
+            rng.choice(['0', '0', '500']) if focpro != '1' else '0',
+            rng.choice(['0', '5']), rng.choice(['0', '100']),
+            rng.choice(items) if focpro == '3' else '',
+            rng.choice(['0', '2', '3']) if focpro != '1' else '0',
+            '1'
+        )
+
+
+def generate_dataset(db_path: str, lines: int, items: int, customers: int, seed: int = 42):
+    """
+    Create a synthetic pricing database
+
+    Args:
+        db_path: SQLite file to create, replaced when it exists
+        lines: Number of SPRICLIST lines
+        items: Number of ITMMASTER items
+        customers: Number of BPCUSTOMER customers
+        seed: Seed of the random generator, the same seed gives the same database
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    rng = random.Random(seed)
+    item_codes = [f"IT{i:06d}" for i in range(items)]
+    customer_codes = [f"C{i:05d}" for i in range(customers)]
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute(f"""
+        CREATE TABLE SPRICCONF (PLI_0 TEXT, PLIENAFLG_0 TEXT, PIO_0 TEXT, PLISTC_0 TEXT, PLITYP_0 TEXT,
+        PRIPRO_0 TEXT, PRIFLD_0 TEXT, FOCPRO_0 TEXT, FOCTYP_0 TEXT, {_columns('FIL', 5)}, {_columns('FLD', 5)})
+    """)
+    conn.execute(f"""
+        CREATE TABLE SPRICLIST (AUUID_0 TEXT, PLI_0 TEXT, PLICRD_0 TEXT, PLILIN_0 TEXT, PLISTRDAT_0 TEXT,
+        PLIENDDAT_0 TEXT, PLICRI1_0 TEXT, PLICRI2_0 TEXT, PLICRI3_0 TEXT, PLICRI4_0 TEXT, PLICRI5_0 TEXT,
+        MINQTY_0 TEXT, MAXQTY_0 TEXT, CUR_0 TEXT, UOM_0 TEXT, PRI_0 TEXT, {_columns('DCGVAL', 9)},
+        FOCQTYMIN_0 TEXT, FOCAMTMIN_0 TEXT, FOCQTYBKT_0 TEXT, FOCAMTBKT_0 TEXT, FOCITMREF_0 TEXT,
+        FOCQTY_0 TEXT, COMCOE_0 TEXT)
+    """)
+    conn.execute(f"""
+        CREATE TABLE PRICSTRUCT (PLISTC_0 TEXT, {_columns('INCDCR', 9)}, {_columns('VALTYP', 9)},
+        {_columns('CLCRUL', 9)}, {_columns('LANDESSHO', 9)})
+    """)
+    conn.execute("CREATE TABLE ITMMASTER (ITMREF_0 TEXT, BASPRI_0 TEXT, TCLCOD_0 TEXT, SAU_0 TEXT, STU_0 TEXT, "
+                 "SAUSTUCOE_0 TEXT, VACITM_0 TEXT, ITMDES1_0 TEXT)")
+    conn.execute("CREATE TABLE BPCUSTOMER (BPCNUM_0 TEXT, BCGCOD_0 TEXT, CUR_0 TEXT, VACBPR_0 TEXT)")
+
+    conn.execute("BEGIN")
+    for rule in PRICING_RULES:
+        tables = [table for table, _ in rule[9]] + [''] * (5 - len(rule[9]))
+        fields = [field for _, field in rule[9]] + [''] * (5 - len(rule[9]))
+        conn.execute(f"INSERT INTO SPRICCONF VALUES ({', '.join('?' * 19)})", list(rule[:9]) + tables + fields)
+    for code, columns in PRICE_STRUCTURES.items():
+        columns = columns + [('0', '0', '0')] * (9 - len(columns))
+        conn.execute(
+            f"INSERT INTO PRICSTRUCT VALUES ({', '.join('?' * 37)})",
+            [code] + [c[0] for c in columns] + [c[1] for c in columns] + [c[2] for c in columns]
+            + [f"{code} column {i}" for i in range(9)]
+        )
+    conn.executemany(
+        "INSERT INTO ITMMASTER VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ((code, str(rng.randint(5, 500)), rng.choice(['A', 'B']), 'UN', 'UN', '1', 'NOR', code) for code in item_codes)
+    )
+    conn.executemany(
+        "INSERT INTO BPCUSTOMER VALUES (?, ?, ?, ?)",
+        ((code, rng.choice(['G1', 'G2']), 'EUR', 'FRA') for code in customer_codes)
+    )
+    conn.executemany(
+        f"INSERT INTO SPRICLIST VALUES ({', '.join('?' * 32)})",
+        _pricing_lines(lines, item_codes, customer_codes, rng)
+    )
+    conn.execute("COMMIT")
+
+    rebuild_typed_pricing_lines(conn)
+    conn.close()
+    logger.info(f"Generated {lines} pricing lines, {items} items, {customers} customers "
+                f"in {time.perf_counter() - started:.1f}s")
+
+
+def build_contexts(count: int, items: int, customers: int, rng: random.Random) -> List[PricingContext]:
+    """Draw pricing contexts over the generated items and customers"""
+    order_date = datetime(2025, 3, 15)
+    return [
+        PricingContext(
+            customer_code=f"C{rng.randrange(customers):05d}",
+            item_code=f"IT{rng.randrange(items):06d}",
+            quantity=Decimal(rng.choice(['1', '2', '5', '10', '24', '60', '150'])),
+            currency=rng.choice(CURRENCIES),
+            unit_of_measure=rng.choice(UNITS),
+            order_date=order_date
+        )
+        for _ in range(count)
+    ]
+
+
+def _time_runs(run: Callable[[], Any], repeats: int) -> List[float]:
+    """Wall time in milliseconds of each run, engine output silenced"""
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def _summary(timings: List[float], lines: int) -> Dict[str, float]:
+    median = statistics.median(timings)
+    return {
+        'runs': len(timings),
+        'lines': lines,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(median, 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'median_us_per_line': round(median * 1000 / lines, 3),
+    }
+
+
+def run_benchmark(db_path: str, items: int, customers: int, repeats: int = 20,
+                  seed: int = 42, result_cache_size: int = 4096) -> Dict[str, Any]:
+    """
+    Time the pricing scenarios on a generated database
+
+    Args:
+        db_path: Database created by generate_dataset
+        items: Number of items of the database
+        customers: Number of customers of the database
+        repeats: Runs of each scenario
+        seed: Seed of the pricing contexts
+        result_cache_size: Result cache size of the engine, 0 disables it
+
+    Returns:
+        Timings by scenario
+    """
+    rng = random.Random(seed)
+    engine = SageX3PricingEngine(db_path, result_cache_size=result_cache_size)
+    scenarios: Dict[str, Any] = {}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        engine.warm_up()
+        scenarios['warm_up'] = {'runs': 1, 'median_ms': round((time.perf_counter() - started) * 1000, 3)}
+
+    singles = build_contexts(repeats * 50, items, customers, rng)
+    single_timings = _time_runs(lambda: engine.calculate_pricing(singles.pop()), repeats * 50)
+    scenarios['single_line'] = _summary(single_timings, 1)
+
+    for name, size in (('cart_50', 50), ('quote_1000', 1000)):
+        carts = [build_contexts(size, items, customers, rng) for _ in range(repeats)]
+        timings = _time_runs(lambda: engine.calculate_pricing_batch(carts.pop()), repeats)
+        scenarios[name] = _summary(timings, size)
+
+    scenarios['result_cache'] = engine.get_result_cache_stats()
+    engine.disconnect()
+    return scenarios
+
+
+def _random_adjustments(rng: random.Random) -> List[PriceAdjustment]:
+    """Draw up to nine adjustments over every type, calculation type and basis"""
+    adjustments = []
+    for index in rng.sample(range(9), rng.randint(1, 9)):
+        adjustments.append(PriceAdjustment(
+            index=index,
+            value=Decimal(rng.choice(['5', '10', '2.5', '0.5', '12.345', '33.33', '1', '0.01', '99.99'])),
+            adjustment_type=rng.choice(['discount', 'fee']),
+            calculation_type=rng.choice(['amount', 'percentage_cumulative', 'percentage_cascading']),
+            calculation_basis=rng.choice(['unit', 'unit', 'line', 'document'])
+        ))
+    return adjustments
+
+
+def check_minor_unit_parity(samples: int, seed: int = 42) -> Dict[str, Any]:
+    """
+    Compare the scaled integer adjustments with the Decimal ones
+
+    Prices include half cent ties and quantities include fractional and non
+    dividing values, so both the exact integer results and the fallbacks are covered.
+
+    Args:
+        samples: Random cases to compare
+        seed: Seed of the cases
+
+    Returns:
+        Number of cases, fallbacks to Decimal, and the mismatching cases
+    """
+    rng = random.Random(seed)
+    engine = SageX3PricingEngine(':memory:')
+    fallbacks = 0
+    mismatches = []
+    for _ in range(samples):
+        base_price = Decimal(rng.choice([
+            f"{rng.randint(0, 999)}.{rng.randint(0, 99):02d}",
+            f"{rng.randint(0, 99)}.{rng.randint(0, 99):02d}5",
+            f"{rng.randint(1, 99999)}",
+            f"{rng.randint(0, 9)}.{rng.randint(0, 9999):04d}",
+        ]))
+        quantity = Decimal(rng.choice(['1', '2', '3', '4', '7', '10', '12', '50.5', '0.25', '1000', str(rng.randint(1, 500))]))
+        adjustments = _random_adjustments(rng)
+        context = PricingContext(customer_code='', item_code='', quantity=quantity)
+
+        expected = engine.apply_decimal_adjustments(base_price, adjustments, context)
+        actual = apply_adjustments_minor_units(base_price, adjustments, quantity)
+        if actual is None:
+            fallbacks += 1
+        elif actual != expected or str(actual) != str(expected):
+            mismatches.append({
+                'base_price': str(base_price), 'quantity': str(quantity),
+                'adjustments': [(adj.index, str(adj.value), adj.adjustment_type, adj.calculation_type,
+                                 adj.calculation_basis) for adj in adjustments],
+                'decimal': str(expected), 'minor_units': str(actual),
+            })
+    return {'samples': samples, 'fallbacks': fallbacks, 'mismatches': len(mismatches), 'cases': mismatches[:20]}
+
+
+def check_vectorized_parity(samples: int, seed: int = 42) -> Dict[str, Any]:
+    """
+    Compare the vectorized adjustments with the Decimal ones, on one batch of random lines
+
+    Args:
+        samples: Lines in the batch
+        seed: Seed of the lines
+
+    Returns:
+        Number of lines, lines left to the scalar engine, and the mismatching lines
+    """
+    if not vectorized_available():
+        return {'samples': 0, 'skipped': 'NumPy is not installed'}
+    rng = random.Random(seed)
+    engine = SageX3PricingEngine(':memory:')
+    base_prices, quantities, adjustments = [], [], []
+    for _ in range(samples):
+        base_prices.append(Decimal(rng.choice([
+            f"{rng.randint(0, 999)}.{rng.randint(0, 99):02d}",
+            f"{rng.randint(0, 99)}.{rng.randint(0, 99):02d}5",
+            f"{rng.randint(1, 99999)}",
+        ])))
+        quantities.append(Decimal(rng.choice(['1', '2', '3', '7', '10', '50.5', '0.25', '1000', str(rng.randint(1, 500))])))
+        adjustments.append(_random_adjustments(rng))
+
+    prices = apply_adjustments_vectorized(base_prices, quantities, adjustments)
+    scalar = 0
+    mismatches = []
+    for base_price, quantity, line_adjustments, price in zip(base_prices, quantities, adjustments, prices):
+        if price is None:
+            scalar += 1
+            continue
+        context = PricingContext(customer_code='', item_code='', quantity=quantity)
+        expected = engine.apply_decimal_adjustments(base_price, line_adjustments, context)
+        if price != expected:
+            mismatches.append({'base_price': str(base_price), 'quantity': str(quantity),
+                               'decimal': str(expected), 'vectorized': str(price)})
+    return {'samples': samples, 'scalar': scalar, 'mismatches': len(mismatches), 'cases': mismatches[:20]}
+
+
+def time_adjustment_paths(samples: int, seed: int = 42) -> Dict[str, Any]:
+    """Time the Decimal and the scaled integer adjustments on the same cases"""
+    rng = random.Random(seed)
+    engine = SageX3PricingEngine(':memory:')
+    cases = []
+    for _ in range(samples):
+        quantity = Decimal(rng.choice(['1', '2', '5', '10', '24', '60', '150']))
+        cases.append((Decimal(f"{rng.randint(1, 500)}.{rng.randint(0, 99):02d}"), _random_adjustments(rng),
+                      PricingContext(customer_code='', item_code='', quantity=quantity)))
+
+    started = time.perf_counter()
+    for base_price, adjustments, context in cases:
+        engine.apply_decimal_adjustments(base_price, adjustments, context)
+    decimal_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for base_price, adjustments, context in cases:
+        if apply_adjustments_minor_units(base_price, adjustments, context.quantity) is None:
+            engine.apply_decimal_adjustments(base_price, adjustments, context)
+    minor_units_ms = (time.perf_counter() - started) * 1000
+
+    timings = {
+        'decimal': {'runs': 1, 'lines': samples, 'median_ms': round(decimal_ms, 3)},
+        'minor_units': {'runs': 1, 'lines': samples, 'median_ms': round(minor_units_ms, 3)},
+    }
+
+    if vectorized_available():
+        started = time.perf_counter()
+        prices = apply_adjustments_vectorized(
+            [case[0] for case in cases], [case[2].quantity for case in cases], [case[1] for case in cases]
+        )
+        for (base_price, adjustments, context), price in zip(cases, prices):
+            if price is None:
+                engine.apply_sage_x3_adjustments(base_price, adjustments, context)
+        timings['vectorized'] = {'runs': 1, 'lines': samples,
+                                 'median_ms': round((time.perf_counter() - started) * 1000, 3)}
+    return timings
+
+
+def compare_with_baseline(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compare the median timings of a report with a baseline report
+
+    Args:
+        report: Report of this run
+        baseline: Stored report
+        tolerance: Allowed slowdown, 0.1 for 10%
+
+    Returns:
+        Descriptions of the scenarios slower than the baseline beyond the tolerance
+    """
+    regressions = []
+    if report.get('dataset') != baseline.get('dataset'):
+        logger.warning("Baseline was measured on a different dataset, timings are not comparable")
+
+    for name, timing in report['scenarios'].items():
+        reference = baseline.get('scenarios', {}).get(name)
+        if not reference or 'median_ms' not in timing or not reference.get('median_ms'):
+            continue
+        ratio = timing['median_ms'] / reference['median_ms']
+        timing['baseline_median_ms'] = reference['median_ms']
+        timing['ratio'] = round(ratio, 3)
+        logger.info(f"{name}: {timing['median_ms']}ms vs {reference['median_ms']}ms baseline (x{ratio:.2f})")
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name} is x{ratio:.2f} slower than the baseline")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Sage X3 pricing engine on a synthetic dataset")
+    parser.add_argument('--lines', type=int, default=100000, help="SPRICLIST lines to generate")
+    parser.add_argument('--items', type=int, default=5000, help="ITMMASTER items to generate")
+    parser.add_argument('--customers', type=int, default=500, help="BPCUSTOMER customers to generate")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the dataset and of the pricing contexts")
+    parser.add_argument('--repeats', type=int, default=20, help="Runs of each scenario")
+    parser.add_argument('--db', help="Database file, generated in a temporary directory when omitted")
+    parser.add_argument('--reuse', action='store_true', help="Reuse the --db file instead of generating it")
+    parser.add_argument('--no-result-cache', action='store_true', help="Disable the engine result cache")
+    parser.add_argument('--output', help="Write the JSON report to this file")
+    parser.add_argument('--baseline', help="JSON report to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed slowdown against the baseline")
+    parser.add_argument('--parity', type=int, default=0, metavar='N',
+                        help="Only compare the scaled integer and vectorized adjustments with the Decimal ones "
+                             "on N random cases")
+    args = parser.parse_args(argv)
+
+    # The engine logs every priced line at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    if args.parity:
+        parity = {
+            'minor_units': check_minor_unit_parity(args.parity, args.seed),
+            'vectorized': check_vectorized_parity(args.parity, args.seed),
+        }
+        print(json.dumps(parity, indent=2))
+        return 1 if any(check.get('mismatches') for check in parity.values()) else 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'pricing_benchmark.db')
+        if not (args.reuse and args.db and os.path.exists(args.db)):
+            generate_dataset(db_path, args.lines, args.items, args.customers, args.seed)
+
+        report = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'dataset': {'lines': args.lines, 'items': args.items, 'customers': args.customers, 'seed': args.seed},
+            'result_cache': not args.no_result_cache,
+            'scenarios': run_benchmark(
+                db_path, args.items, args.customers, args.repeats, args.seed,
+                0 if args.no_result_cache else 4096
+            ),
+        }
+        for name, timing in time_adjustment_paths(args.repeats * 1000, args.seed).items():
+            report['scenarios'][f'adjustments_{name}'] = timing
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_with_baseline(report, json.load(baseline_file), args.tolerance)
+        report['regressions'] = regressions
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    print(output)
+
+    for regression in regressions:
+        logger.warning(regression)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
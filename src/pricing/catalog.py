@@ -0,0 +1,61 @@
+import sqlite3
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+from database.pricing_lines import TYPED_PRICING_LINES_TABLE, typed_pricing_lines_exists
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PricingRuleCatalog:
+    """
+    Prepared SPRICCONF rules for one sync generation
+
+    Holds the active pricing configurations in priority order and the free goods
+    settings (FOCPRO_0, FOCTYP_0) of every pricing rule, so that pricing a line
+    does not read SPRICCONF again. Also records which table pricing lines are
+    read from: the typed SPRICLIST_TYPED once a sync built it, SPRICLIST otherwise.
+    """
+    generation: int
+    configurations: List[Dict[str, Any]] = field(default_factory=list)
+    free_goods: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    pricing_lines_table: str = 'SPRICLIST'
+
+    @classmethod
+    def load(cls, connection: sqlite3.Connection, generation: int) -> 'PricingRuleCatalog':
+        """
+        Build the catalog from the SPRICCONF table
+
+        Args:
+            connection: Open connection using sqlite3.Row as row factory
+            generation: Sync generation the catalog is built for
+
+        Returns:
+            PricingRuleCatalog for the given generation
+        """
+        cursor = connection.cursor()
+
+        cursor.execute("""
+        SELECT * FROM SPRICCONF
+        WHERE PLIENAFLG_0 = '2'  -- Active pricing rules
+        ORDER BY PIO_0 ASC  -- Priority order (ascending)
+        """)
+        configurations = [dict(row) for row in cursor.fetchall()]
+
+        cursor.execute("SELECT PLI_0, FOCPRO_0, FOCTYP_0 FROM SPRICCONF")
+        free_goods: Dict[str, Tuple[str, str]] = {}
+        for row in cursor.fetchall():
+            # Same row as a "WHERE PLI_0 = ?" lookup would return first
+            free_goods.setdefault(row['PLI_0'], (row['FOCPRO_0'], row['FOCTYP_0']))
+
+        pricing_lines_table = TYPED_PRICING_LINES_TABLE if typed_pricing_lines_exists(connection) else 'SPRICLIST'
+
+        logger.info(f"Loaded pricing rule catalog: {len(configurations)} active configurations "
+                    f"reading lines from {pricing_lines_table} (sync generation {generation})")
+        return cls(generation=generation, configurations=configurations, free_goods=free_goods,
+                   pricing_lines_table=pricing_lines_table)
+
+    def get_free_goods(self, pricing_rule_code: str) -> Tuple[str, str]:
+        """Get (FOCPRO_0, FOCTYP_0) of a pricing rule, ('', '') when unknown"""
+        return self.free_goods.get(pricing_rule_code, ('', ''))
@@ -1,9 +1,11 @@
-from typing import List
+from typing import Dict, List
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from database.session import get_db
-from src.pricing.service import test_pricing_engine_complete
-from .model import PricingInput, PricingOutput
+from src.pricing.service import calculate_cart_pricing, calculate_quantity_ladder, calculate_taxed_cart_pricing, \
+    explain_cart_pricing, get_customer_price_book, get_pricing_cache_stats
+from .model import PricingInput, PricingOutput, PricingExplainOutput, PriceBookOutput, PricingLadderInput, PricingLadderOutput, \
+    PricingTaxedCartInput, PricingTaxedCartOutput
 
 router = APIRouter(
     prefix="/pricing",
@@ -14,6 +16,36 @@ router = APIRouter(
 @router.post("/", response_model=List[PricingOutput])
 def get_pricing(input: List[PricingInput], db: Session = Depends(get_db)) -> List[PricingOutput]:
 
-    result = test_pricing_engine_complete(input, db)
+    result = calculate_cart_pricing(input, db)
 
-    return result
\ No newline at end of file
+    return result
+
+
+@router.post("/taxed", response_model=PricingTaxedCartOutput)
+def get_taxed_pricing(input: PricingTaxedCartInput, db: Session = Depends(get_db)) -> PricingTaxedCartOutput:
+
+    return calculate_taxed_cart_pricing(input, db)
+
+
+@router.post("/ladder", response_model=PricingLadderOutput)
+def get_quantity_ladder(input: PricingLadderInput, db: Session = Depends(get_db)) -> PricingLadderOutput:
+
+    return calculate_quantity_ladder(input, db)
+
+
+@router.post("/explain", response_model=PricingExplainOutput)
+def explain_pricing(input: List[PricingInput], db: Session = Depends(get_db)) -> PricingExplainOutput:
+
+    return explain_cart_pricing(input, db)
+
+
+@router.get("/cache")
+def get_cache_stats(db: Session = Depends(get_db)) -> Dict[str, int]:
+
+    return get_pricing_cache_stats(db)
+
+
+@router.get("/book/{customer_code}", response_model=List[PriceBookOutput])
+def get_price_book(customer_code: str, db: Session = Depends(get_db)) -> List[PriceBookOutput]:
+
+    return get_customer_price_book(customer_code, db)
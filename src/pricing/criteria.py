@@ -0,0 +1,144 @@
+import re
+import sqlite3
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Master data tables criteria can be read from: key column and the context attribute holding the key
+CRITERIA_TABLES = {
+    'BPCUSTOMER': ('BPCNUM_0', 'customer_code'),
+    'BPARTNER': ('BPRNUM_0', 'customer_code'),
+    'ITMMASTER': ('ITMREF_0', 'item_code'),
+    'ITMSALES': ('ITMREF_0', 'item_code'),
+}
+
+# SPRICLINK criteria are the order values themselves
+CONTEXT_CRITERIA = {
+    'CUR': 'currency',
+    'UOM': 'unit_of_measure',
+    'SALFCY': 'site',
+    'REP': 'sales_rep',
+}
+
+_INDEXED_COLUMN = re.compile(r'^[A-Z0-9]+_\d+$')
+_COLUMN = re.compile(r'^[A-Z0-9]+$')
+
+# How a PLICRIn_0 criterion is valued: ('context', attribute) or ('table', table, column)
+Criterion = Tuple[str, ...]
+
+
+def _column_name(field: str) -> Optional[str]:
+    """SPRICCONF FLD_i value as a column name, None when it is not a plain field"""
+    field = (field or '').strip().upper()
+    if _INDEXED_COLUMN.match(field):
+        return field
+    if _COLUMN.match(field):
+        return f"{field}_0"
+    return None
+
+
+class CriteriaResolver:
+    """
+    Values of the SPRICCONF criteria (FIL_i, FLD_i) of pricing contexts, for one sync generation
+
+    Each criterion of the active pricing rules is compiled once: SPRICLINK fields and
+    the key columns of CRITERIA_TABLES come from the context, other columns of these
+    tables are read from the master data row of the customer or item. The criteria
+    columns of every row are read with one projection query per table when the
+    resolver is built, so resolving never reads the database and the resolver is
+    not modified afterwards. Criteria on other tables are left empty and so not
+    filtered, as before.
+    """
+
+    def __init__(self, generation: int, configs: List[Dict[str, Any]], connection: sqlite3.Connection):
+        """
+        Args:
+            generation: Sync generation the criteria are resolved at
+            configs: Active pricing configurations
+            connection: Connection the referenced columns are read from, inside the rule set snapshot
+        """
+        self.generation = generation
+        self._rows: Dict[str, Dict[Any, Dict[str, Any]]] = {}
+        self._columns: Dict[str, List[str]] = {}
+        self._criteria: Dict[str, List[Tuple[str, Criterion]]] = {}
+
+        existing = {}
+        for table in CRITERIA_TABLES:
+            try:
+                existing[table] = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            except sqlite3.Error:
+                existing[table] = set()
+
+        for config in configs:
+            self._criteria.setdefault(config['PLI_0'], self._compile(config, existing))
+
+        for table in self._columns:
+            self._rows[table] = self._load(connection, table)
+
+        logger.info(f"Compiled pricing criteria of {len(self._criteria)} rules, reading {self._columns} "
+                    f"of {sum(len(rows) for rows in self._rows.values())} rows (sync generation {generation})")
+
+    def _compile(self, config: Dict[str, Any], existing: Dict[str, Set[str]]) -> List[Tuple[str, Criterion]]:
+        """How each criterion of a pricing rule is valued"""
+        criteria = []
+        for i in range(5):  # Up to 5 criteria fields (PLICRI1_0 to PLICRI5_0)
+            field = config.get(f'FLD_{i}')
+            if not field:
+                continue
+            table = (config.get(f'FIL_{i}') or '').strip().upper()
+            field_name = f'PLICRI{i + 1}_0'
+            column = _column_name(field)
+
+            if table == 'SPRICLINK' and field.strip().upper() in CONTEXT_CRITERIA:
+                criteria.append((field_name, ('context', CONTEXT_CRITERIA[field.strip().upper()])))
+            elif table in CRITERIA_TABLES and column == CRITERIA_TABLES[table][0]:
+                criteria.append((field_name, ('context', CRITERIA_TABLES[table][1])))
+            elif table in CRITERIA_TABLES and column in existing.get(table, set()):
+                columns = self._columns.setdefault(table, [])
+                if column not in columns:
+                    columns.append(column)
+                criteria.append((field_name, ('table', table, column)))
+            else:
+                logger.warning(f"Pricing rule {config['PLI_0']}: criterion {table}.{field} is not supported, left empty")
+                criteria.append((field_name, ('empty',)))
+        return criteria
+
+    def _load(self, connection: sqlite3.Connection, table: str) -> Dict[Any, Dict[str, Any]]:
+        """Read the criteria columns of every row of a table, by key"""
+        key_column = CRITERIA_TABLES[table][0]
+        columns = self._columns[table]
+        rows: Dict[Any, Dict[str, Any]] = {}
+        for row in connection.execute(f"SELECT {key_column}, {', '.join(columns)} FROM {table}"):
+            # Same row as a "WHERE key = ?" lookup would return first
+            rows.setdefault(row[0], dict(zip(columns, row[1:])))
+        return rows
+
+    def criteria(self, context: Any, config: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Criteria values of a context for a pricing rule
+
+        Args:
+            context: Pricing context
+            config: Pricing configuration
+
+        Returns:
+            Dictionary of criteria values by PLICRIn_0 field
+        """
+        compiled = self._criteria.get(config['PLI_0'])
+        if compiled is None:
+            compiled = self._compile(config, {table: set(columns) for table, columns in self._columns.items()})
+
+        values = {}
+        for field_name, criterion in compiled:
+            kind = criterion[0]
+            if kind == 'context':
+                values[field_name] = getattr(context, criterion[1])
+            elif kind == 'table':
+                table, column = criterion[1], criterion[2]
+                key = getattr(context, CRITERIA_TABLES[table][1])
+                value = self._rows[table].get(key, {}).get(column)
+                values[field_name] = '' if value is None else value
+            else:
+                values[field_name] = ''
+        return values
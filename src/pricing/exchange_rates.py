@@ -0,0 +1,109 @@
+import sqlite3
+import logging
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# TABCHANGE rate type used for sales prices (Taux du jour)
+SALES_RATE_TYPE = '1'
+
+
+@dataclass
+class ExchangeRateTable:
+    """
+    TABCHANGE rates for one sync generation
+
+    Rates are kept per (CUR_0, CURDEN_0) pair with their start dates sorted, so
+    the rate effective on an order date is a bisect away. One CUR_0 is worth
+    CHGRAT_0 CURDEN_0 from CHGSTRDAT_0 until the next start date of the pair.
+    """
+    generation: int
+    rates: Dict[Tuple[str, str], Tuple[List[str], List[Decimal]]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, connection: sqlite3.Connection, generation: int) -> 'ExchangeRateTable':
+        """
+        Read the exchange rates from the TABCHANGE table
+
+        Args:
+            connection: Open connection using sqlite3.Row as row factory
+            generation: Sync generation the rates are read at
+
+        Returns:
+            ExchangeRateTable for the given generation
+        """
+        try:
+            rows = connection.execute("""
+            SELECT * FROM TABCHANGE
+            ORDER BY CUR_0, CURDEN_0, CHGSTRDAT_0
+            """).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.warning(f"No exchange rates loaded: {e}")
+            rows = []
+
+        by_pair: Dict[Tuple[str, str], Dict[str, Decimal]] = {}
+        for row in rows:
+            row = dict(row)
+            if row.get('CHGTYP_0', SALES_RATE_TYPE) != SALES_RATE_TYPE:
+                continue
+            if not row.get('CUR_0') or not row.get('CURDEN_0') or row.get('CHGSTRDAT_0') is None:
+                continue
+            rate = Decimal(str(row.get('CHGRAT_0') or '0'))
+            if rate <= 0:
+                continue
+            by_pair.setdefault((row['CUR_0'], row['CURDEN_0']), {})[str(row['CHGSTRDAT_0'])] = rate
+
+        rates = {}
+        for pair, starts in by_pair.items():
+            dates = sorted(starts)
+            rates[pair] = (dates, [starts[date] for date in dates])
+
+        logger.info(f"Loaded exchange rates of {len(rates)} currency pairs (sync generation {generation})")
+        return cls(generation=generation, rates=rates)
+
+    def _effective(self, pair: Tuple[str, str], order_date: str) -> Optional[Decimal]:
+        """Rate of a pair started last on or before the order date"""
+        pair_rates = self.rates.get(pair)
+        if pair_rates is None:
+            return None
+        dates, rates = pair_rates
+        position = bisect_right(dates, order_date)
+        return rates[position - 1] if position > 0 else None
+
+    def rate(self, source: str, target: str, order_date: str) -> Optional[Decimal]:
+        """
+        Rate converting an amount in the source currency into the target currency
+
+        The direct pair is used when it has a rate on the order date, the inverse of
+        the reverse pair otherwise.
+
+        Args:
+            source: Currency of the amount
+            target: Currency to convert to
+            order_date: Order date formatted as '%Y-%m-%d %H:%M:%S'
+
+        Returns:
+            Conversion rate, None when no rate is effective on the order date
+        """
+        if source == target:
+            return Decimal('1')
+        rate = self._effective((source, target), order_date)
+        if rate is not None:
+            return rate
+        rate = self._effective((target, source), order_date)
+        if rate is not None:
+            return Decimal('1') / rate
+        return None
+
+    def sources(self, target: str) -> List[str]:
+        """Currencies with a rate into the target currency, in code order"""
+        currencies = set()
+        for source, destination in self.rates:
+            if destination == target:
+                currencies.add(source)
+            elif source == target:
+                currencies.add(destination)
+        return sorted(currencies)
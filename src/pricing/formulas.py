@@ -0,0 +1,152 @@
+import ast
+import operator
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# SPRICCONF column holding the price formula of the Calculation treatment (PRIPRO_0 = 3)
+FORMULA_FIELD = 'PRIFRM_0'
+
+# Names a formula can use besides the pricing line fields
+QUANTITY_NAME = 'QTY'
+BASE_PRICE_NAME = 'BASPRI'
+
+Variables = Callable[[str], Decimal]
+Evaluator = Callable[[Variables], Decimal]
+
+
+class FormulaError(ValueError):
+    """A price formula uses syntax outside of the supported arithmetic"""
+
+
+def _round(value: Decimal, digits: Decimal = Decimal('0')) -> Decimal:
+    return value.quantize(Decimal(1).scaleb(-int(digits)), rounding=ROUND_HALF_UP)
+
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+_FUNCTIONS: Dict[str, Callable[..., Decimal]] = {
+    'MIN': min,
+    'MAX': max,
+    'ABS': abs,
+    'ROUND': _round,
+}
+
+
+def _compile_node(node: ast.AST) -> Evaluator:
+    """Turn a node of the formula into a closure evaluating it on Decimal values"""
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        constant = Decimal(str(node.value))
+        return lambda variables: constant
+
+    if isinstance(node, ast.Name):
+        name = node.id.upper()
+        return lambda variables: variables(name)
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        binary = _BINARY_OPERATORS[type(node.op)]
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda variables: binary(left(variables), right(variables))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        unary = _UNARY_OPERATORS[type(node.op)]
+        operand = _compile_node(node.operand)
+        return lambda variables: unary(operand(variables))
+
+    if isinstance(node, ast.Compare) and all(type(op) in _COMPARISONS for op in node.ops):
+        comparisons = [_COMPARISONS[type(op)] for op in node.ops]
+        operands = [_compile_node(node.left)] + [_compile_node(comparator) for comparator in node.comparators]
+
+        def compare(variables: Variables) -> Decimal:
+            values = [evaluate(variables) for evaluate in operands]
+            return Decimal(int(all(
+                comparison(values[i], values[i + 1]) for i, comparison in enumerate(comparisons)
+            )))
+        return compare
+
+    if isinstance(node, ast.IfExp):
+        test, body, orelse = _compile_node(node.test), _compile_node(node.body), _compile_node(node.orelse)
+        return lambda variables: body(variables) if test(variables) else orelse(variables)
+
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords
+            and node.func.id.upper() in _FUNCTIONS):
+        function = _FUNCTIONS[node.func.id.upper()]
+        arguments = [_compile_node(argument) for argument in node.args]
+        return lambda variables: function(*(argument(variables) for argument in arguments))
+
+    raise FormulaError(f"Unsupported formula element: {ast.dump(node)[:80]}")
+
+
+@lru_cache(maxsize=1024)
+def compile_formula(formula: str) -> Evaluator:
+    """
+    Compile a price formula once, later calls with the same text reuse it
+
+    Formulas are arithmetic on Decimal values: + - * /, parentheses, comparisons,
+    'a if condition else b' and the MIN, MAX, ABS and ROUND functions. Names are
+    QTY, BASPRI (item base price) or pricing line fields, without their _0 suffix.
+    Anything else, attribute access or other calls included, is rejected.
+
+    Args:
+        formula: Formula text
+
+    Returns:
+        Function evaluating the formula from a variable lookup
+
+    Raises:
+        FormulaError: When the formula is not valid or uses unsupported syntax
+    """
+    try:
+        tree = ast.parse(formula.strip(), mode='eval')
+    except SyntaxError as e:
+        raise FormulaError(f"Invalid formula {formula!r}: {e.msg}") from e
+    return _compile_node(tree)
+
+
+def line_variables(line: Dict[str, Any], quantity: Decimal, base_price: Callable[[], Decimal]) -> Variables:
+    """
+    Variable lookup of a formula evaluated on a pricing line
+
+    Args:
+        line: Pricing line dictionary
+        quantity: Ordered quantity
+        base_price: Base price of the item, only read when the formula uses BASPRI
+
+    Returns:
+        Function giving the Decimal value of a name
+    """
+    def variables(name: str) -> Decimal:
+        if name == QUANTITY_NAME:
+            return quantity
+        if name == BASE_PRICE_NAME:
+            return base_price()
+        for field in (f'{name}_0', name):
+            if line.get(field) is not None:
+                return Decimal(str(line[field]).strip() or '0')
+        raise FormulaError(f"Unknown formula name {name}")
+    return variables
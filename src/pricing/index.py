@@ -0,0 +1,311 @@
+import re
+import sqlite3
+import logging
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+CRITERIA_FIELDS = [f'PLICRI{i}_0' for i in range(1, 6)]
+WILDCARD_FIELDS = [f'PLICRI{i}_W' for i in range(1, 6)]
+
+_REAL_PREFIX = re.compile(r'\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?')
+
+
+def sql_real(value: Any) -> Optional[float]:
+    """
+    Convert a value the way SQLite's CAST(value AS REAL) does
+
+    NULL stays None, text is read up to its longest numeric prefix and
+    falls back to 0.0 when it has none.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', errors='ignore')
+    match = _REAL_PREFIX.match(str(value))
+    return float(match.group(0)) if match else 0.0
+
+
+def sql_sort_key(value: Any) -> Tuple:
+    """
+    Key ordering values like SQLite compares them across storage classes:
+    NULL < numbers < text < blob
+    """
+    if value is None:
+        return (0,)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, bytes(value))
+
+
+def is_wildcard(value: Any) -> bool:
+    """Sage X3 wildcard criterion, matched in SQL by LIKE '%~%'"""
+    return isinstance(value, str) and '~' in value
+
+
+def _bounds(breakpoints: List[Any], position: int, is_bound: bool) -> Tuple[Any, Any]:
+    """Breakpoints around a bisect_left position, the breakpoint itself when the value is one"""
+    if is_bound:
+        return breakpoints[position], breakpoints[position]
+    return (breakpoints[position - 1] if position > 0 else None,
+            breakpoints[position] if position < len(breakpoints) else None)
+
+
+class _CompiledLine:
+    """SPRICLIST line with its comparison values computed once"""
+    __slots__ = ('seq', 'start', 'end', 'min_qty', 'max_qty', 'criteria', 'wildcards', 'line')
+
+    def __init__(self, seq: int, line: Dict[str, Any]):
+        self.seq = seq
+        self.criteria = tuple(line.get(field) for field in CRITERIA_FIELDS)
+        if 'MINQTY_N' in line:
+            # Row of SPRICLIST_TYPED, already converted during sync
+            self.start = sql_sort_key(line['PLISTRDAT_D'])
+            self.end = sql_sort_key(line['PLIENDDAT_D'])
+            self.min_qty = line['MINQTY_N']
+            self.max_qty = line['MAXQTY_N']
+            self.wildcards = tuple(bool(line[field]) for field in WILDCARD_FIELDS)
+        else:
+            self.start = sql_sort_key(line.get('PLISTRDAT_0'))
+            self.end = sql_sort_key(line.get('PLIENDDAT_0'))
+            self.min_qty = sql_real(line.get('MINQTY_0'))
+            self.max_qty = sql_real(line.get('MAXQTY_0'))
+            self.wildcards = tuple(is_wildcard(value) for value in self.criteria)
+        self.line = line
+
+    def matches_quantity(self, quantity: float) -> bool:
+        """(MINQTY <= q OR MINQTY = 0) AND (MAXQTY >= q OR MAXQTY = 0)"""
+        if self.min_qty is None or self.max_qty is None:
+            return False
+        if not (self.min_qty <= quantity or self.min_qty == 0):
+            return False
+        return self.max_qty >= quantity or self.max_qty == 0
+
+
+class _DateBucket:
+    """Lines sorted by start date, so the lines already started are a bisect away"""
+    __slots__ = ('starts', 'lines')
+
+    def __init__(self, lines: List[_CompiledLine]):
+        lines = sorted(lines, key=lambda compiled: compiled.start)
+        self.starts = [compiled.start for compiled in lines]
+        self.lines = lines
+
+    def started(self, date_key: Tuple) -> List[_CompiledLine]:
+        """Lines with PLISTRDAT_0 <= date"""
+        return self.lines[:bisect_right(self.starts, date_key)]
+
+
+class _PriceLineGroup:
+    """Lines of one pricing rule sharing a currency and unit of measure"""
+
+    def __init__(self, lines: List[_CompiledLine]):
+        self.lines = lines
+        self.all = _DateBucket(lines)
+        # Per criterion position: value -> lines, and the wildcard lines
+        self._by_criterion: Dict[int, Tuple[Dict[Any, _DateBucket], _DateBucket]] = {}
+
+    def _criterion_buckets(self, position: int) -> Tuple[Dict[Any, _DateBucket], _DateBucket]:
+        buckets = self._by_criterion.get(position)
+        if buckets is None:
+            by_value: Dict[Any, List[_CompiledLine]] = {}
+            wildcards = []
+            for compiled in self.lines:
+                if compiled.wildcards[position]:
+                    wildcards.append(compiled)
+                elif compiled.criteria[position] is not None:
+                    by_value.setdefault(compiled.criteria[position], []).append(compiled)
+            buckets = ({value: _DateBucket(lines) for value, lines in by_value.items()}, _DateBucket(wildcards))
+            self._by_criterion[position] = buckets
+        return buckets
+
+    def candidates(self, criteria: List[Tuple[int, Any]], date_key: Tuple) -> List[_CompiledLine]:
+        """Lines already started and matching the first criterion (exact value or wildcard)"""
+        if not criteria:
+            return self.all.started(date_key)
+        position, value = criteria[0]
+        by_value, wildcards = self._criterion_buckets(position)
+        exact = by_value.get(value)
+        started = wildcards.started(date_key)
+        if exact is not None:
+            started = started + exact.started(date_key)
+        return started
+
+
+class PriceLineIndex:
+    """
+    Compiled SPRICLIST lines of one pricing rule (PLI_0)
+
+    Lines are grouped by currency and unit of measure, hashed on their criteria
+    values with a separate bucket for wildcard ('~') criteria, and sorted by start
+    date. Matching gives the same lines, in the same PLILIN_0 order, as the SQL
+    query of SageX3PricingEngine.query_applicable_pricing_lines.
+    """
+
+    def __init__(self, pricing_rule_code: str, generation: int, lines: Iterable[Dict[str, Any]]):
+        """
+        Args:
+            pricing_rule_code: PLI_0 of the lines
+            generation: Sync generation the lines were read at
+            lines: SPRICLIST lines ordered by PLILIN_0
+        """
+        self.pricing_rule_code = pricing_rule_code
+        self.generation = generation
+        grouped: Dict[Tuple[Any, Any], List[_CompiledLine]] = {}
+        count = 0
+        for seq, line in enumerate(lines):
+            count += 1
+            if line.get('PLISTRDAT_0') is None or line.get('PLIENDDAT_0') is None:
+                continue  # NULL dates never match the date range
+            grouped.setdefault((line.get('CUR_0'), line.get('UOM_0')), []).append(_CompiledLine(seq, line))
+        self._groups = {key: _PriceLineGroup(compiled) for key, compiled in grouped.items()}
+        self.line_count = count
+        self._breakpoints: Optional[Tuple[List[Tuple], List[float]]] = None
+
+    @classmethod
+    def load(cls, connection: sqlite3.Connection, pricing_rule_code: str, generation: int,
+             table: str = 'SPRICLIST') -> 'PriceLineIndex':
+        """
+        Read and compile all the SPRICLIST lines of a pricing rule
+
+        Args:
+            connection: Open connection using sqlite3.Row as row factory
+            pricing_rule_code: PLI_0 to load
+            generation: Sync generation the lines are read at
+            table: SPRICLIST or its typed copy SPRICLIST_TYPED
+
+        Returns:
+            PriceLineIndex of the pricing rule
+        """
+        cursor = connection.cursor()
+        cursor.execute(f"""
+        SELECT * FROM {table}
+        WHERE PLI_0 = ?
+        ORDER BY PLILIN_0 ASC
+        """, (pricing_rule_code,))
+        index = cls(pricing_rule_code, generation, (dict(row) for row in cursor.fetchall()))
+        logger.info(f"Compiled {index.line_count} pricing lines for rule {pricing_rule_code}")
+        return index
+
+    def _get_breakpoints(self) -> Tuple[List[Tuple], List[float]]:
+        """Sorted dates and quantities the date range and quantity bounds of the lines compare against"""
+        breakpoints = self._breakpoints
+        if breakpoints is None:
+            dates: Set[Tuple] = set()
+            quantities: Set[float] = set()
+            for group in self._groups.values():
+                for compiled in group.lines:
+                    dates.update((compiled.start, compiled.end))
+                    quantities.update(q for q in (compiled.min_qty, compiled.max_qty) if q is not None)
+            breakpoints = (sorted(dates), sorted(quantities))
+            self._breakpoints = breakpoints
+        return breakpoints
+
+    def bracket(self, order_date: str, quantity: float) -> Tuple[int, bool, int, bool]:
+        """
+        Position of an order date and quantity among the dates and quantities of the lines
+
+        Two contexts in the same bracket compare the same way to every line bound,
+        so they match the same lines given the same criteria, currency and unit.
+
+        Args:
+            order_date: Order date formatted as '%Y-%m-%d %H:%M:%S'
+            quantity: Ordered quantity
+
+        Returns:
+            (date position, date is a bound, quantity position, quantity is a bound)
+        """
+        dates, quantities = self._get_breakpoints()
+        date_key = sql_sort_key(order_date)
+        date_position = bisect_left(dates, date_key)
+        quantity_position = bisect_left(quantities, quantity)
+        return (
+            date_position,
+            date_position < len(dates) and dates[date_position] == date_key,
+            quantity_position,
+            quantity_position < len(quantities) and quantities[quantity_position] == quantity,
+        )
+
+    def bracket_bounds(self, order_date: str, quantity: float) -> Tuple[Tuple[Any, Any], Tuple[Any, Any]]:
+        """
+        Dates and quantities delimiting the bracket of an order date and quantity
+
+        A bound is None on an open side. When the value is itself a line bound the
+        bracket holds that value only and both bounds equal it, otherwise the bounds
+        are excluded.
+
+        Args:
+            order_date: Order date formatted as '%Y-%m-%d %H:%M:%S'
+            quantity: Ordered quantity
+
+        Returns:
+            ((low date key, high date key), (low quantity, high quantity))
+        """
+        dates, quantities = self._get_breakpoints()
+        date_position, date_is_bound, quantity_position, quantity_is_bound = self.bracket(order_date, quantity)
+        return _bounds(dates, date_position, date_is_bound), _bounds(quantities, quantity_position, quantity_is_bound)
+
+    def find(self, criteria: Dict[str, str], order_date: str, quantity: float,
+             currency: str, unit_of_measure: str) -> List[Dict[str, Any]]:
+        """
+        Find the lines matching a pricing context
+
+        Args:
+            criteria: Criteria values by PLICRIn_0 field, empty values are not filtered
+            order_date: Order date formatted as '%Y-%m-%d %H:%M:%S'
+            quantity: Ordered quantity
+            currency: Currency code
+            unit_of_measure: Unit of measure code
+
+        Returns:
+            Matching pricing lines ordered by PLILIN_0
+        """
+        return [
+            compiled.line
+            for compiled in self.find_candidates(criteria, order_date, currency, unit_of_measure)
+            if compiled.matches_quantity(quantity)
+        ]
+
+    def find_candidates(self, criteria: Dict[str, str], order_date: str,
+                        currency: str, unit_of_measure: str) -> List[_CompiledLine]:
+        """
+        Find the lines matching a pricing context whatever the quantity
+
+        The quantity bounds of the returned lines are checked with matches_quantity,
+        so that several quantities are matched against one lookup.
+
+        Args:
+            criteria: Criteria values by PLICRIn_0 field, empty values are not filtered
+            order_date: Order date formatted as '%Y-%m-%d %H:%M:%S'
+            currency: Currency code
+            unit_of_measure: Unit of measure code
+
+        Returns:
+            Compiled lines ordered by PLILIN_0
+        """
+        group = self._groups.get((currency, unit_of_measure))
+        if group is None:
+            return []
+
+        filters = [
+            (position, criteria[field])
+            for position, field in enumerate(CRITERIA_FIELDS)
+            if criteria.get(field)
+        ]
+        date_key = sql_sort_key(order_date)
+
+        matching = []
+        for compiled in group.candidates(filters, date_key):
+            if not compiled.end >= date_key:
+                continue
+            if all(compiled.wildcards[position] or compiled.criteria[position] == value
+                   for position, value in filters[1:]):
+                matching.append(compiled)
+
+        matching.sort(key=lambda compiled: compiled.seq)
+        return matching
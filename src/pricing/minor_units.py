@@ -0,0 +1,156 @@
+from decimal import Decimal
+from functools import lru_cache
+from operator import attrgetter
+from typing import List, Optional, Tuple
+
+# Prices are rounded to 0.01 with ROUND_HALF_UP
+PRICE_DECIMALS = 2
+
+# Default Decimal context precision: past 28 significant digits Decimal rounds
+# intermediate results, and the integer path gives way to it
+_MAX_COEFFICIENT = 10 ** 28
+
+_by_index = attrgetter('index')
+
+
+@lru_cache(maxsize=4096)
+def _scaled(value: Decimal) -> Tuple[int, int]:
+    """Decimal as (integer, scale) with value = integer / 10**scale"""
+    exponent = value.as_tuple().exponent
+    if exponent >= 0:  # type: ignore
+        return int(value), 0
+    return int(value.scaleb(-exponent)), -exponent  # type: ignore
+
+
+def _fit(value: int, scale: int) -> Optional[Tuple[int, int]]:
+    """Drop trailing zeros of a value too long for Decimal, None when it still does not fit"""
+    if -_MAX_COEFFICIENT < value < _MAX_COEFFICIENT:
+        return value, scale
+    while scale > 0 and value % 10 == 0:
+        value //= 10
+        scale -= 1
+    if -_MAX_COEFFICIENT < value < _MAX_COEFFICIENT:
+        return value, scale
+    return None
+
+
+def _divide(value: int, scale: int, divisor: int, divisor_scale: int) -> Optional[Tuple[int, int]]:
+    """Exact value / (divisor / 10**divisor_scale), None when the quotient is not a finite decimal"""
+    numerator = value * 10 ** divisor_scale
+    odd_part = divisor
+    for factor in (2, 5):
+        while odd_part % factor == 0:
+            odd_part //= factor
+    if numerator % odd_part != 0:
+        return None
+    for _ in range(29):
+        quotient, remainder = divmod(numerator, divisor)
+        if remainder == 0:
+            return _fit(quotient, scale)
+        numerator *= 10
+        scale += 1
+    return None
+
+
+def apply_adjustments_minor_units(base_price: Decimal, adjustments: List, quantity: Decimal) -> Optional[Decimal]:
+    """
+    Apply Sage X3 adjustments with scaled integers
+
+    Same steps as SageX3PricingEngine.apply_decimal_adjustments, computed exactly
+    in integers and rounded once to 0.01 with ROUND_HALF_UP. Whenever the Decimal
+    path would itself round (a non terminating division by the quantity, or more
+    than 28 significant digits) None is returned so the caller falls back to it.
+
+    Args:
+        base_price: The original unit price before adjustments
+        adjustments: PriceAdjustment objects
+        quantity: Ordered quantity
+
+    Returns:
+        Final unit price, or None when the Decimal path has to be used
+    """
+    if not adjustments or base_price == 0:
+        return base_price
+
+    q, q_scale = _scaled(quantity)
+    if q <= 0:
+        return None
+
+    unit, unit_scale = _scaled(base_price)
+    original_unit, original_unit_scale = unit, unit_scale
+    line, line_scale = unit * q, unit_scale + q_scale
+    if not -_MAX_COEFFICIENT < line < _MAX_COEFFICIENT:
+        fitted = _fit(line, line_scale)
+        if fitted is None:
+            return None
+        line, line_scale = fitted
+    original_line, original_line_scale = line, line_scale
+
+    for adjustment in sorted(adjustments, key=_by_index):
+        value, value_scale = _scaled(adjustment.value)
+        calculation_type = adjustment.calculation_type
+        basis = adjustment.calculation_basis
+
+        if basis == 'unit':  # CLCRUL=1 - Par Unité
+            current, current_scale = unit, unit_scale
+        elif basis == 'line':  # CLCRUL=2 - Par Ligne
+            current, current_scale = line, line_scale
+        else:
+            continue  # CLCRUL=3 - Par Document, applied on the cart total
+
+        if calculation_type == 'amount':
+            amount, amount_scale = value, value_scale
+        elif calculation_type == 'percentage_cumulative':
+            amount, amount_scale = current * value, current_scale + value_scale + 2
+        elif calculation_type == 'percentage_cascading':
+            if basis == 'unit':
+                amount, amount_scale = original_unit * value, original_unit_scale + value_scale + 2
+            else:
+                amount, amount_scale = original_line * value, original_line_scale + value_scale + 2
+        else:
+            amount, amount_scale = 0, 0
+        if not -_MAX_COEFFICIENT < amount < _MAX_COEFFICIENT and _fit(amount, amount_scale) is None:
+            return None
+
+        if adjustment.adjustment_type == 'discount':
+            amount = -amount
+        if current_scale > amount_scale:
+            current += amount * 10 ** (current_scale - amount_scale)
+        else:
+            current = current * 10 ** (amount_scale - current_scale) + amount
+            current_scale = amount_scale
+        if not -_MAX_COEFFICIENT < current < _MAX_COEFFICIENT:
+            fitted = _fit(current, current_scale)
+            if fitted is None:
+                return None
+            current, current_scale = fitted
+
+        if basis == 'unit':
+            # Update line total to reflect unit price change
+            unit, unit_scale = current, current_scale
+            line, line_scale = unit * q, unit_scale + q_scale
+            if not -_MAX_COEFFICIENT < line < _MAX_COEFFICIENT:
+                fitted = _fit(line, line_scale)
+                if fitted is None:
+                    return None
+                line, line_scale = fitted
+        else:
+            # Update unit price to reflect line total change
+            line, line_scale = current, current_scale
+            fitted = _divide(line, line_scale, q, q_scale)
+            if fitted is None:
+                return None
+            unit, unit_scale = fitted
+
+    if unit < 0:
+        return Decimal(0).scaleb(-PRICE_DECIMALS)
+
+    # ROUND_HALF_UP to 0.01
+    if unit_scale <= PRICE_DECIMALS:
+        cents = unit * 10 ** (PRICE_DECIMALS - unit_scale)
+    else:
+        step = 10 ** (unit_scale - PRICE_DECIMALS)
+        cents, remainder = divmod(unit, step)
+        if 2 * remainder >= step:
+            cents += 1
+    return Decimal(cents).scaleb(-PRICE_DECIMALS)
@@ -1,5 +1,5 @@
 from typing import Any, Dict, List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 
@@ -9,7 +9,7 @@ class PricingInput(BaseModel):
     quantity: str
     currency: str
     unit_of_measure: str
-    order_date: datetime = datetime.now()
+    order_date: datetime = Field(default_factory=datetime.now)  # Time of the request, not of the import
 
 
 class PricingOutput(BaseModel):
@@ -17,4 +17,79 @@ class PricingOutput(BaseModel):
     prix_brut: float
     prix_net: float
     gratuit: Optional[List[Dict[str, Any]]]=None
-    total_HT: float
\ No newline at end of file
+    total_HT: float
+
+class PricingLadderInput(BaseModel):
+    customer_code: str
+    item_code: str
+    quantities: List[str]
+    currency: str
+    unit_of_measure: str
+    order_date: datetime = Field(default_factory=datetime.now)  # Time of the request, not of the import
+
+
+class PricingLadderStep(BaseModel):
+    quantity: str
+    prix_brut: float
+    prix_net: float
+    gratuit: Optional[List[Dict[str, Any]]]=None
+    total_HT: float
+
+
+class PricingLadderOutput(BaseModel):
+    customer_code: str
+    item_code: str
+    currency: str
+    unit_of_measure: str
+    ladder: List[PricingLadderStep]
+
+class PricingTaxedCartInput(BaseModel):
+    regime_taxe: Optional[str]=None
+    groupe_societe: Optional[str]=None
+    lines: List[PricingInput]
+
+
+class PricingTaxedLine(BaseModel):
+    item_code: str
+    quantity: str
+    prix_brut: float
+    prix_net_ht: float
+    prix_net_ttc: Optional[float]=None
+    code_taxe: Optional[str]=None
+    taux: Optional[float]=None
+    total_HT: float
+    total_TTC: Optional[float]=None
+    gratuit: Optional[List[Dict[str, Any]]]=None
+    erreur: Optional[str]=None  # The line could not be taxed, its TTC amounts are not set
+
+
+class PricingTaxedCartOutput(BaseModel):
+    regime_taxe: str
+    total_ht: float
+    total_ttc: Optional[float]=None  # Not set when a line could not be taxed
+    valo_ht: float
+    valo_ttc: Optional[float]=None
+    lines: List[PricingTaxedLine]
+
+class PricingExplainLine(BaseModel):
+    output: PricingOutput
+    trace: Dict[str, Any]
+
+
+class PricingExplainOutput(BaseModel):
+    lines: List[PricingExplainLine]
+    document: List[Dict[str, Any]]
+
+
+class PriceBookOutput(BaseModel):
+    item_code: str
+    unit_of_measure: str
+    currency: str
+    pricing_rule: Optional[str]=None
+    prix_brut: float
+    prix_net: float
+    valid_from: Optional[str]=None
+    valid_to: Optional[str]=None
+    quantity_min: Optional[float]=None
+    quantity_max: Optional[float]=None
+    updated: str
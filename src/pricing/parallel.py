@@ -0,0 +1,86 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from database.sync_data import adopt_sync_generation
+
+logger = logging.getLogger(__name__)
+
+# Carts from this many lines are priced across worker processes
+PARALLEL_MIN_LINES = 2000
+
+# Worker processes of the pricing pool
+PARALLEL_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Warm engine of each database, with and without the price book, inside a worker process
+_worker_engines: Dict[Tuple[str, bool], object] = {}
+
+
+class SnapshotMismatch(RuntimeError):
+    """A worker could not build the rule set the parent prices with"""
+
+
+def get_pricing_pool(workers: int = PARALLEL_WORKERS) -> ProcessPoolExecutor:
+    """Get the pricing process pool, starting it with the given number of workers on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked, the server process runs threads
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            logger.info(f"Started pricing pool with {workers} workers")
+        return _pool
+
+
+def reset_pricing_pool():
+    """Drop the pricing pool, a new one is started on next use"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def price_shard(db_path: str, generation: int, snapshot: Tuple, contexts: List, use_price_book: bool = True) -> List:
+    """
+    Price a shard of cart lines inside a worker process
+
+    The worker keeps one engine per database on a read-only connection and follows
+    the sync generation of the parent, so its caches are rebuilt after each sync.
+    The worker prices only with a rule set read at the same commits as the one of
+    the parent: on a different snapshot it builds its set again, and raises
+    SnapshotMismatch when the database has moved on since the parent built its own.
+
+    Args:
+        db_path: Path to the SQLite database file
+        generation: Sync generation of the parent process
+        snapshot: Snapshot key of the rule set of the parent, see PricingRuleSet.snapshot_key
+        contexts: Pricing contexts of the shard
+        use_price_book: Price booked customers from the price book, off while its refresh is pending
+
+    Returns:
+        PricingResult of every context, in the same order
+    """
+    from ..pricing.service import SageX3PricingEngine
+
+    adopt_sync_generation(generation)
+    engine = _worker_engines.get((db_path, use_price_book))
+    if engine is None:
+        engine = SageX3PricingEngine(db_path, read_only=True, use_price_book=use_price_book)
+        _worker_engines[(db_path, use_price_book)] = engine
+    engine.warm_up()  # type: ignore
+    if engine.get_rule_set().snapshot_key(use_price_book) != snapshot:  # type: ignore
+        engine.swap_rule_set(engine.build_rule_set(generation))  # type: ignore
+        if engine.get_rule_set().snapshot_key(use_price_book) != snapshot:  # type: ignore
+            raise SnapshotMismatch(f"Worker rule set of generation {generation} was read at other commits")
+    return engine.price_cart_lines(contexts)  # type: ignore
+
+
+def shard(contexts: List, shards: int) -> List[List]:
+    """Split contexts into contiguous shards of about the same size"""
+    size = -(-len(contexts) // shards)
+    return [contexts[start:start + size] for start in range(0, len(contexts), size)]
@@ -0,0 +1,418 @@
+import json
+import sqlite3
+import logging
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from ..pricing.formulas import FORMULA_FIELD
+from ..pricing.index import is_wildcard
+from database.sync_data import clear_synced_rows, has_synced_rows, read_snapshot, stamp_snapshot, synced_rows, \
+    watch_synced_tables
+
+logger = logging.getLogger(__name__)
+
+# Precomputed prices of the customer assortments
+PRICE_BOOK_TABLE = "SPRICEBOOK"
+
+# Synced tables whose rows can change a price book entry
+PRICE_BOOK_SOURCES = ('SPRICLIST', 'SPRICCONF', 'PRICSTRUCT', 'BPCUSTOMER', 'ITMMASTER', 'SORDER', 'SORDERP')
+
+watch_synced_tables(PRICE_BOOK_SOURCES)
+
+# Changes to these tables can move any entry
+_GLOBAL_SOURCES = ('SPRICCONF', 'PRICSTRUCT')
+
+# Pricing line fields read by the free goods calculation
+_FREE_GOODS_FIELDS = ('PLI_0', 'PLICRD_0', 'PLILIN_0', 'UOM_0', 'PRI_0', 'FOCQTYMIN_0', 'FOCAMTMIN_0',
+                      'FOCQTYBKT_0', 'FOCAMTBKT_0', 'FOCITMREF_0', 'FOCQTY_0')
+
+# Entries are priced for one unit, the quantity bracket they hold for is stored with them
+REFERENCE_QUANTITY = Decimal('1')
+
+Pair = Tuple[str, str, str, str]  # (customer, item, unit of measure, currency)
+
+
+def price_book_exists(conn: sqlite3.Connection) -> bool:
+    """Check whether the price book table has been built"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (PRICE_BOOK_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+def _within(value: Any, low: Any, high: Any) -> bool:
+    """Whether a value is inside a bracket, a single value when both bounds are equal"""
+    if low is not None and low == high:
+        return value == low
+    return (low is None or value > low) and (high is None or value < high)
+
+
+@dataclass
+class PriceBook:
+    """
+    Price book entries of one sync generation
+
+    The entries are read with the rest of the rule set, pricing a line of a booked
+    customer is a lookup in memory. Other customers go through rule resolution.
+    """
+    generation: int
+    entries: Dict[Pair, Dict[str, Any]] = field(default_factory=dict)
+    customers: Set[str] = field(default_factory=set)
+    stale: bool = False  # Synced rows are waiting for the refresh, the book is not served
+    snapshot: Optional[str] = None  # Token of the refresh the entries were read at
+
+    @classmethod
+    def load(cls, connection: sqlite3.Connection, generation: int) -> 'PriceBook':
+        """
+        Read the entries of the price book
+
+        Args:
+            connection: Open connection using sqlite3.Row as row factory
+            generation: Sync generation the price book is read at
+
+        Returns:
+            PriceBook for the given generation, empty and stale while a refresh is pending
+        """
+        if has_synced_rows(PRICE_BOOK_SOURCES):
+            logger.info(f"Price book not loaded, its refresh is pending (sync generation {generation})")
+            return cls(generation=generation, stale=True)
+        entries: Dict[Pair, Dict[str, Any]] = {}
+        snapshot = read_snapshot(connection, PRICE_BOOK_TABLE)
+        if price_book_exists(connection):
+            for row in connection.execute(f"SELECT * FROM {PRICE_BOOK_TABLE}"):
+                entry = dict(row)
+                entry['ADJUSTMENTS_0'] = json.loads(entry['ADJUSTMENTS_0'])
+                entry['FOCLINES_0'] = json.loads(entry['FOCLINES_0'])
+                entries[(entry['BPCNUM_0'], entry['ITMREF_0'], entry['UOM_0'], entry['CUR_0'])] = entry
+        customers = {pair[0] for pair in entries}
+        logger.info(f"Loaded price book of {len(customers)} customers, {len(entries)} entries "
+                    f"(sync generation {generation})")
+        return cls(generation=generation, entries=entries, customers=customers, snapshot=snapshot)
+
+    def lookup(self, context: Any) -> Optional[Dict[str, Any]]:
+        """
+        Get the entry pricing a context
+
+        Args:
+            context: PricingContext to price
+
+        Returns:
+            Entry with its adjustments and free goods lines decoded, shared and not to be
+            modified. None when the pair is not booked or the order date or quantity falls
+            outside the entry bracket
+        """
+        if context.customer_code not in self.customers:
+            return None
+        entry = self.entries.get((context.customer_code, context.item_code, context.unit_of_measure, context.currency))
+        if entry is None:
+            return None
+        if not _within(context.order_date.strftime('%Y-%m-%d %H:%M:%S'), entry['STRDAT_0'], entry['ENDDAT_0']):
+            return None
+        if not _within(float(context.quantity), entry['QTYMIN_0'], entry['QTYMAX_0']):
+            return None
+        return entry
+
+
+def create_price_book(conn: sqlite3.Connection):
+    """Create the price book table when missing"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {PRICE_BOOK_TABLE} (
+            BPCNUM_0 TEXT NOT NULL,
+            ITMREF_0 TEXT NOT NULL,
+            UOM_0 TEXT NOT NULL,
+            CUR_0 TEXT NOT NULL,
+            STRDAT_0 TEXT,  -- Order dates bracket, NULL when open
+            ENDDAT_0 TEXT,
+            QTYMIN_0 REAL,  -- Quantities bracket, NULL when open
+            QTYMAX_0 REAL,
+            PLI_0 TEXT,
+            PLISTC_0 TEXT,
+            BASPRI_0 TEXT,
+            NETPRI_0 TEXT,  -- Unit price of one unit, before document adjustments
+            COMCOE_0 TEXT,
+            ADJUSTMENTS_0 TEXT,  -- JSON list of adjustments
+            FOCLINES_0 TEXT,  -- JSON list of free goods pricing lines
+            UPDDAT_0 TEXT,
+            PRIMARY KEY (BPCNUM_0, ITMREF_0, UOM_0, CUR_0)
+        )
+    """)
+
+
+def load_assortments(conn: sqlite3.Connection) -> Set[Pair]:
+    """
+    Read the assortment of every customer from its order history
+
+    An item belongs to a customer assortment once it was ordered, priced in the
+    currency of the order and in the sales unit of the item.
+    """
+    try:
+        rows = conn.execute("""
+            SELECT DISTINCT
+                SORDER.BPCORD_0,
+                SORDERP.ITMREF_0,
+                COALESCE(NULLIF(TRIM(ITMMASTER.SAU_0), ''), 'UN'),
+                SORDER.CUR_0
+            FROM
+                SORDER
+                JOIN SORDERP ON SORDERP.SOHNUM_0 = SORDER.SOHNUM_0
+                LEFT JOIN ITMMASTER ON ITMMASTER.ITMREF_0 = SORDERP.ITMREF_0
+            WHERE
+                SORDER.BPCORD_0 IS NOT NULL
+                AND SORDERP.ITMREF_0 IS NOT NULL
+                AND SORDER.CUR_0 IS NOT NULL
+        """).fetchall()
+    except sqlite3.OperationalError as e:
+        logger.warning(f"No order history to build price books from: {e}")
+        return set()
+    return {(row[0], row[1], row[2], row[3]) for row in rows}
+
+
+def _criteria_positions(config: Dict[str, Any], table: str, column: str) -> List[str]:
+    """PLICRIn_0 fields of a pricing rule holding the given SPRICCONF criterion"""
+    return [
+        f'PLICRI{i + 1}_0' for i in range(5)
+        if config.get(f'FIL_{i}') == table and config.get(f'FLD_{i}') == column
+    ]
+
+
+def affected_scope(changes: Dict[str, List[Dict[str, Any]]],
+                   configs: List[Dict[str, Any]]) -> Optional[Tuple[Set[str], Set[str], Set[Tuple[str, str]]]]:
+    """
+    Customers, items and (customer, item) pairs whose entries synced rows can change
+
+    A pricing line restricted to a customer and an item only moves that pair, a line
+    restricted to one of them moves every entry of that customer or item.
+
+    Args:
+        changes: Synced rows by table, before and after their update
+        configs: Active pricing configurations
+
+    Returns:
+        (customers, items, pairs), None when every entry has to be recomputed
+    """
+    if any(changes.get(table) for table in _GLOBAL_SOURCES):
+        return None
+
+    customers = {row.get('BPCNUM_0') for row in changes.get('BPCUSTOMER', [])}
+    items = {row.get('ITMREF_0') for row in changes.get('ITMMASTER', [])}
+    pairs: Set[Tuple[str, str]] = set()
+
+    configs_by_code: Dict[str, Dict[str, Any]] = {}
+    for config in configs:
+        configs_by_code.setdefault(config['PLI_0'], config)
+
+    for line in changes.get('SPRICLIST', []):
+        config = configs_by_code.get(line.get('PLI_0'))  # type: ignore
+        if config is None:
+            continue  # Inactive pricing rule
+        scope = []
+        for table, column in (('BPCUSTOMER', 'BPCNUM'), ('ITMMASTER', 'ITMREF')):
+            values = [line.get(position) for position in _criteria_positions(config, table, column)]
+            values = [value for value in values if value and value.strip() and not is_wildcard(value)]
+            scope.append(values[0] if values else None)
+        customer, item = scope
+        if customer is None and item is None:
+            return None
+        if customer is not None and item is not None:
+            pairs.add((customer, item))
+        elif customer is not None:
+            customers.add(customer)
+        else:
+            items.add(item)  # type: ignore
+
+    return customers, items, pairs
+
+
+def _bracket(indexes: Iterable[Any], order_date: str, quantity: float) -> Optional[Tuple[Any, Any, Any, Any]]:
+    """
+    Intersect the brackets of an order date and quantity in every pricing rule
+
+    Returns:
+        (low date, high date, low quantity, high quantity), None when a date bound
+        is not a text date
+    """
+    date_low = date_high = quantity_low = quantity_high = None
+    for index in indexes:
+        (low, high), quantity_bounds = index.bracket_bounds(order_date, quantity)
+        if any(key is not None and key[0] != 2 for key in (low, high)):
+            return None
+        low, high = (low[1] if low is not None else None), (high[1] if high is not None else None)
+        if low is not None and (date_low is None or low > date_low):
+            date_low = low
+        if high is not None and (date_high is None or high < date_high):
+            date_high = high
+        low, high = quantity_bounds
+        if low is not None and (quantity_low is None or low > quantity_low):
+            quantity_low = low
+        if high is not None and (quantity_high is None or high < quantity_high):
+            quantity_high = high
+    return date_low, date_high, quantity_low, quantity_high
+
+
+def build_price_book_entry(engine: Any, pair: Pair, as_of: datetime) -> Optional[Tuple]:
+    """
+    Price one unit of an assortment pair
+
+    Args:
+        engine: SageX3PricingEngine not reading the price book
+        pair: (customer, item, unit of measure, currency)
+        as_of: Order date the entry is priced at
+
+    Returns:
+        Row of the price book, None when no pricing rule applies to the pair
+    """
+    from ..pricing.service import PricingContext
+
+    customer, item, unit_of_measure, currency = pair
+    context = PricingContext(customer_code=customer, item_code=item, quantity=REFERENCE_QUANTITY,
+                             currency=currency, unit_of_measure=unit_of_measure, order_date=as_of)
+    configs = engine.get_pricing_configurations()
+    resolved = engine.resolve_pricing_lines(context, configs)
+    if not resolved:
+        return None
+
+    bracket = _bracket((engine.get_price_line_index(config['PLI_0']) for config in configs),
+                       as_of.strftime('%Y-%m-%d %H:%M:%S'), float(REFERENCE_QUANTITY))
+    if bracket is None:
+        return None
+
+    result = engine.calculate_pricing(context, document_level=True)
+    if result.source_currency or result.source_unit_of_measure:
+        return None  # Converted at pricing time, the bracket is not the one of the converted lines
+    if any(config.get('PRIPRO_0') == '3' and (config.get(FORMULA_FIELD) or '').strip() for config, _ in resolved):
+        return None  # Formulas can depend on the ordered quantity, priced at order time
+    catalog = engine.get_rule_catalog()
+    free_goods_lines = [
+        {name: line.get(name) for name in _FREE_GOODS_FIELDS}
+        for _, line in resolved
+        if catalog.get_free_goods(line.get('PLI_0'))[0] not in ('', '1')
+    ]
+    adjustments = [asdict(adjustment) for adjustment in result.adjustments]
+
+    return (
+        customer, item, unit_of_measure, currency, *bracket,
+        result.pricing_rule_code, result.price_structure_code,
+        str(result.base_price), str(result.unit_price), str(result.commission_coefficient),
+        json.dumps(adjustments, default=str), json.dumps(free_goods_lines, default=str),
+        as_of.strftime('%Y-%m-%d %H:%M:%S'),
+    )
+
+
+def refresh_price_books(db_path: str, changes: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+    """
+    Recompute the price book entries a sync can have changed
+
+    Entries of new assortment pairs are always computed and entries of pairs that
+    left the assortments dropped. The other entries are recomputed when the synced
+    rows can change them, or all of them when changes is None. When the refresh
+    fails the price book is emptied so no stale price is served.
+
+    Args:
+        db_path: Path to the SQLite database file
+        changes: Synced rows of PRICE_BOOK_SOURCES by table, before and after their update
+    """
+    from ..pricing.service import SageX3PricingEngine
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    engine = SageX3PricingEngine(db_path, use_price_book=False)
+    try:
+        create_price_book(conn)
+        assortment = load_assortments(conn)
+        booked = {
+            (row[0], row[1], row[2], row[3])
+            for row in conn.execute(f"SELECT BPCNUM_0, ITMREF_0, UOM_0, CUR_0 FROM {PRICE_BOOK_TABLE}")
+        }
+
+        scope = None if changes is None else affected_scope(changes, engine.get_pricing_configurations())
+        if scope is None:
+            targets = assortment
+        else:
+            customers, items, pairs = scope
+            targets = {
+                pair for pair in assortment
+                if pair not in booked or pair[0] in customers or pair[1] in items or pair[:2] in pairs
+            }
+        stale = booked - assortment
+
+        as_of = datetime.now()
+        entries = [entry for entry in (build_price_book_entry(engine, pair, as_of) for pair in targets) if entry]
+
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(f"""
+                DELETE FROM {PRICE_BOOK_TABLE}
+                WHERE BPCNUM_0 = ? AND ITMREF_0 = ? AND UOM_0 = ? AND CUR_0 = ?
+            """, stale | targets)
+            conn.executemany(f"INSERT INTO {PRICE_BOOK_TABLE} VALUES ({', '.join('?' * 16)})", entries)
+            stamp_snapshot(conn, PRICE_BOOK_TABLE)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Price book refreshed: {len(entries)} entries computed, "
+                    f"{len(stale)} dropped, {len(assortment)} assortment pairs")
+    except Exception as e:
+        logger.error(f"Price book refresh failed, emptying it: {e}")
+        if price_book_exists(conn):
+            conn.execute("BEGIN")
+            conn.execute(f"DELETE FROM {PRICE_BOOK_TABLE}")
+            stamp_snapshot(conn, PRICE_BOOK_TABLE)
+            conn.execute("COMMIT")
+    finally:
+        engine.disconnect()
+        conn.close()
+
+
+def refresh_synced_price_books(db_path: str) -> bool:
+    """
+    Refresh the price book with the rows synced since the last refresh, once per sync
+
+    The rows are dropped once the refresh is committed, rule sets built meanwhile
+    still see the book as stale.
+
+    Args:
+        db_path: Path to the SQLite database file
+
+    Returns:
+        Whether synced rows were waiting and the book was refreshed
+    """
+    changes = synced_rows(PRICE_BOOK_SOURCES)
+    if not changes:
+        return False
+    refresh_price_books(db_path, changes)
+    clear_synced_rows(PRICE_BOOK_SOURCES)
+    return True
+
+
+def ensure_price_books(db_path: str):
+    """Build the price book if no sync has built it yet"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        exists = price_book_exists(conn)
+    finally:
+        conn.close()
+    if not exists:
+        refresh_price_books(db_path)
+
+
+def read_customer_price_book(connection: sqlite3.Connection, customer_code: str) -> List[Dict[str, Any]]:
+    """
+    Read every entry of a customer price book
+
+    Args:
+        connection: Open connection using sqlite3.Row as row factory
+        customer_code: BPCNUM_0 of the customer
+
+    Returns:
+        Entries ordered by item
+    """
+    if not price_book_exists(connection):
+        return []
+    cursor = connection.execute(f"""
+    SELECT * FROM {PRICE_BOOK_TABLE}
+    WHERE BPCNUM_0 = ?
+    ORDER BY ITMREF_0, UOM_0, CUR_0
+    """, (customer_code,))
+    return [dict(row) for row in cursor.fetchall()]
@@ -0,0 +1,126 @@
+import sqlite3
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from database.sync_data import read_snapshot
+from ..pricing.base_prices import ItemBasePrices
+from ..pricing.catalog import PricingRuleCatalog
+from ..pricing.criteria import CriteriaResolver
+from ..pricing.exchange_rates import ExchangeRateTable
+from ..pricing.index import PriceLineIndex
+from ..pricing.price_book import PriceBook
+from ..pricing.units import ItemUnitFactors
+
+logger = logging.getLogger(__name__)
+
+PriceStructure = Dict[int, Dict[str, str]]
+
+
+def load_price_structures(connection: sqlite3.Connection) -> Dict[str, PriceStructure]:
+    """
+    Read the configured discount/fee columns of every PRICSTRUCT price structure
+
+    Args:
+        connection: Open connection using sqlite3.Row as row factory
+
+    Returns:
+        Dictionary mapping each structure code to its columns, each column index (0-8)
+        mapped to its incdcr, valtyp, clcrul and description
+    """
+    structures: Dict[str, PriceStructure] = {}
+
+    for result in connection.execute("SELECT * FROM PRICSTRUCT").fetchall():
+        row_dict = dict(result)
+        structure_code = row_dict.get('PLISTC_0')
+        if structure_code in structures:
+            continue  # Same row as a "WHERE PLISTC_0 = ?" lookup would return first
+
+        structure_config = {}
+
+        # Process each of the 9 discount/fee columns (0-8)
+        for i in range(9):
+            incdcr = row_dict.get(f'INCDCR_{i}', '0')
+            valtyp = row_dict.get(f'VALTYP_{i}', '0')
+            clcrul = row_dict.get(f'CLCRUL_{i}', '0')
+            description = row_dict.get(f'LANDESSHO_{i}', f'Adjustment {i}')
+
+            # Only include columns that are actually configured (not '0')
+            if incdcr != '0' and valtyp != '0' and clcrul != '0':
+                structure_config[i] = {
+                    'incdcr': incdcr,
+                    'valtyp': valtyp,
+                    'clcrul': clcrul,
+                    'description': description
+                }
+
+                logger.debug(f"Structure {structure_code} column {i}: "
+                             f"INCDCR={incdcr}, VALTYP={valtyp}, CLCRUL={clcrul}")
+
+        structures[structure_code] = structure_config  # type: ignore
+
+    logger.info(f"Loaded {len(structures)} price structures")
+    return structures
+
+
+@dataclass
+class PricingRuleSet:
+    """
+    Everything pricing reads from the database for one sync generation
+
+    A rule set is built in full from one read transaction, so it reflects a single
+    committed state of SPRICCONF, SPRICLIST, PRICSTRUCT and the master data, and is
+    never modified afterwards, so threads share it without locking. The
+    engine swaps a new set in after a sync, requests keep the set they started with.
+    """
+    generation: int
+    catalog: PricingRuleCatalog
+    price_book: PriceBook
+    exchange_rates: ExchangeRateTable
+    unit_factors: ItemUnitFactors
+    base_prices: ItemBasePrices
+    criteria_resolver: CriteriaResolver
+    line_indexes: Dict[str, PriceLineIndex] = field(default_factory=dict)
+    price_structures: Dict[str, PriceStructure] = field(default_factory=dict)
+    snapshot: Optional[str] = None  # Token of the last commit the set was read at
+
+    def snapshot_key(self, use_price_book: bool) -> Tuple[Optional[str], Optional[str]]:
+        """Tokens of the commits pricing with this set depends on, the price book one only when it is used"""
+        return self.snapshot, self.price_book.snapshot if use_price_book else None
+
+    @classmethod
+    def build(cls, connection: sqlite3.Connection, generation: int) -> 'PricingRuleSet':
+        """
+        Load the rules, lines, structures, rates and master data of a sync generation
+
+        Args:
+            connection: Connection using sqlite3.Row as row factory, not in a transaction
+                and used by no other thread while the set is built
+            generation: Sync generation the set is built for
+
+        Returns:
+            PricingRuleSet for the given generation
+        """
+        connection.execute("BEGIN")  # One snapshot for every read below, syncs commit meanwhile
+        try:
+            catalog = PricingRuleCatalog.load(connection, generation)
+            rule_set = cls(
+                generation=generation,
+                catalog=catalog,
+                price_book=PriceBook.load(connection, generation),
+                exchange_rates=ExchangeRateTable.load(connection, generation),
+                unit_factors=ItemUnitFactors.load(connection, generation),
+                base_prices=ItemBasePrices.load(connection, generation),
+                criteria_resolver=CriteriaResolver(generation, catalog.configurations, connection),
+                price_structures=load_price_structures(connection),
+                snapshot=read_snapshot(connection),
+            )
+            # Every SPRICCONF rule, inactive ones included, so pricing never reads lines outside the snapshot
+            for pricing_rule_code in catalog.free_goods:
+                rule_set.line_indexes[pricing_rule_code] = PriceLineIndex.load(
+                    connection, pricing_rule_code, generation, catalog.pricing_lines_table
+                )
+        finally:
+            connection.rollback()
+
+        logger.info(f"Built pricing rule set of {len(rule_set.line_indexes)} rules (sync generation {generation})")
+        return rule_set
@@ -1,12 +1,36 @@
 import sqlite3
 import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from decimal import Decimal, ROUND_HALF_UP
-from ..pricing.model import PricingInput, PricingOutput
+from ..pricing.model import PricingInput, PricingOutput, PricingExplainLine, PricingExplainOutput, PriceBookOutput, \
+    PricingLadderInput, PricingLadderOutput, PricingLadderStep, PricingTaxedCartInput, \
+    PricingTaxedCartOutput, PricingTaxedLine
 from sqlalchemy.orm import Session
-from database.sync_data import get_db_file
+from database.sync_data import get_db_file, get_sync_generation
+from database.pricing_lines import ensure_typed_pricing_lines
+from ..pricing.catalog import PricingRuleCatalog
+from ..pricing.criteria import CriteriaResolver
+from ..pricing.exchange_rates import ExchangeRateTable
+from ..pricing.units import ItemUnitFactors
+from ..pricing.base_prices import ItemBasePrices
+from ..pricing.formulas import FORMULA_FIELD, FormulaError, compile_formula, line_variables
+from ..pricing.index import PriceLineIndex
+from ..pricing.trace import current_trace, pricing_trace
+from ..pricing.minor_units import PRICE_DECIMALS, apply_adjustments_minor_units
+from ..pricing.vectorized import VECTORIZE_MIN_LINES, apply_adjustments_vectorized, vectorized_available
+from ..pricing.parallel import PARALLEL_MIN_LINES, PARALLEL_WORKERS, SnapshotMismatch, get_pricing_pool, price_shard, \
+    reset_pricing_pool, shard
+from ..pricing.price_book import PriceBook, ensure_price_books, read_customer_price_book, refresh_synced_price_books
+from ..pricing.rule_set import PricingRuleSet
+from ..taxe.components.lot import DeterminationTaxeLot
+from ..taxe.table_decision import get_table_decision
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -61,12 +85,17 @@ class PricingResult:
     currency: str = ''
     unit_of_measure: str = ''
     price_structure_code: str = ''  # The structure code used
+    order_total_lines: List[Dict[str, Any]] = None # type: ignore # FOCPRO=4 lines left to the cart pass
+    source_currency: str = ''  # Currency of the pricing lines when converted to the order currency
+    source_unit_of_measure: str = ''  # Unit of the pricing lines when converted to the order unit
     
     def __post_init__(self):
         if self.adjustments is None:
             self.adjustments = []
         if self.free_items is None:
             self.free_items = []
+        if self.order_total_lines is None:
+            self.order_total_lines = []
     
     @property
     def discounts(self) -> List[PriceAdjustment]:
@@ -78,6 +107,20 @@ class PricingResult:
         """Get only fee adjustments"""
         return [adj for adj in self.adjustments if adj.adjustment_type == 'fee']
 
+def pins_rule_set(method):
+    """Run an engine method on one rule set, the one in use when the outermost pinned call started"""
+    @wraps(method)
+    def pinned(self, *args, **kwargs):
+        if getattr(self._local, 'rule_set', None) is not None:
+            return method(self, *args, **kwargs)
+        self._local.rule_set = self.get_rule_set()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._local.rule_set = None
+    return pinned
+
+
 class SageX3PricingEngine:
     """
     Complete Sage X3 Pricing Engine Implementation
@@ -87,33 +130,175 @@ class SageX3PricingEngine:
     interpretation of INCDCR, VALTYP, and CLCRUL fields.
     """
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, result_cache_size: int = 4096,
+                 vectorize_min_lines: int = VECTORIZE_MIN_LINES,
+                 parallel_min_lines: int = PARALLEL_MIN_LINES, parallel_workers: int = PARALLEL_WORKERS,
+                 read_only: bool = False, use_price_book: bool = True, use_minor_units: bool = False):
         """
         Initialize the pricing engine with database connection
         
         Args:
             db_path: Path to the SQLite database file
+            result_cache_size: Maximum number of resolved pricing contexts kept, 0 disables the cache
+            vectorize_min_lines: Cart size from which adjustments are applied with NumPy, when installed
+            parallel_min_lines: Cart size from which lines are priced across the process pool
+            parallel_workers: Worker processes of the pool, 1 prices every cart in process
+            read_only: Open the database read-only, as pricing worker processes do
+            use_price_book: Price the assortments of booked customers from SPRICEBOOK
+            use_minor_units: Apply adjustments with scaled integers (apply_adjustments_minor_units),
+                slower than Decimal on CPython, see benchmark.time_adjustment_paths
         """
         self.db_path = db_path
-        self.connection = None
-        self._price_structures_cache = {}  # Cache for price structures
-        
-    def connect(self):
-        """Establish database connection"""
+        self._local = threading.local()  # One connection per thread
+        self._cache_lock = threading.RLock()  # Serializes rule set builds and additions
+        self._rule_set: Optional[PricingRuleSet] = None  # Rules, lines and master data of the last sync
+        self._rebuilding = False  # A newer rule set is being built in the background
+        self._rebuild_lock = threading.Lock()
+        self._result_cache: OrderedDict = OrderedDict()  # LRU of resolved pricing lines by context key
+        self._result_cache_size = result_cache_size
+        self._result_cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.vectorize_min_lines = vectorize_min_lines
+        self.parallel_min_lines = parallel_min_lines
+        self.parallel_workers = parallel_workers
+        self.read_only = read_only
+        self.use_price_book = use_price_book
+        self.use_minor_units = use_minor_units
+    
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Database connection of the current thread, opened on first use"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.connect()
+            connection = self._local.connection
+        return connection
+        
+    def open_connection(self) -> sqlite3.Connection:
+        """Open a new connection to the database, read-only for read_only engines"""
         try:
-            self.connection = sqlite3.connect(self.db_path)
-            self.connection.row_factory = sqlite3.Row
+            if self.read_only:
+                connection = sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True)
+            else:
+                connection = sqlite3.connect(self.db_path)
+            connection.row_factory = sqlite3.Row
             logger.info(f"Connected to database: {self.db_path}")
+            return connection
         except Exception as e:
             logger.error(f"Failed to connect to database: {e}")
             raise
     
+    def connect(self):
+        """Establish database connection for the current thread"""
+        self._local.connection = self.open_connection()
+    
     def disconnect(self):
-        """Close database connection"""
-        if self.connection:
-            self.connection.close()
+        """Close database connection of the current thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection:
+            connection.close()
+            self._local.connection = None
             logger.info("Database connection closed")
     
+    def build_rule_set(self, generation: int) -> PricingRuleSet:
+        """
+        Build the rule set of a sync generation on a connection of its own
+        
+        Args:
+            generation: Sync generation the rule set is built for
+            
+        Returns:
+            PricingRuleSet read from one database snapshot
+        """
+        connection = self.open_connection()
+        try:
+            return PricingRuleSet.build(connection, generation)
+        finally:
+            connection.close()
+    
+    def swap_rule_set(self, rule_set: PricingRuleSet):
+        """Make a rule set the one new requests use, requests in flight keep theirs"""
+        self._rule_set = rule_set
+        with self._result_cache_lock:
+            self._result_cache.clear()
+        logger.info(f"Pricing rule set swapped in for sync generation {rule_set.generation}")
+    
+    def reload_price_book(self):
+        """
+        Read the price book again into the current rule set, after a refresh
+
+        The rest of the rule set is kept, so a price book refresh does not start a new
+        sync generation. A newer rule set swapped in meanwhile already read the book.
+        """
+        with self._cache_lock:
+            rule_set = self._rule_set
+            if rule_set is None:
+                return
+            connection = self.open_connection()
+            try:
+                price_book = PriceBook.load(connection, rule_set.generation)
+            finally:
+                connection.close()
+            if self._rule_set is rule_set:
+                self.swap_rule_set(replace(rule_set, price_book=price_book))
+    
+    def _rebuild_rule_set(self):
+        """Build rule sets in the background until one matches the current sync generation"""
+        try:
+            while True:
+                generation = get_sync_generation()
+                self.swap_rule_set(self.build_rule_set(generation))
+                if get_sync_generation() == generation:
+                    break
+        except Exception as e:
+            logger.error(f"Failed to rebuild the pricing rule set, keeping the previous one: {e}")
+        finally:
+            self._rebuilding = False
+    
+    def get_rule_set(self) -> PricingRuleSet:
+        """
+        Get the rule set new requests price with
+        
+        The first rule set is built in the calling thread. When a newer sync was
+        committed, its rule set is built in the background and the current one is
+        returned meanwhile, so requests never wait for a rebuild.
+        
+        Returns:
+            PricingRuleSet of the current sync generation, or of the previous one while rebuilding
+        """
+        rule_set = self._rule_set
+        if rule_set is not None and rule_set.generation == get_sync_generation():
+            return rule_set
+        
+        if rule_set is None:
+            with self._cache_lock:
+                if self._rule_set is None:
+                    self.swap_rule_set(self.build_rule_set(get_sync_generation()))
+                return self._rule_set  # type: ignore
+        
+        if not self._rebuilding:
+            with self._rebuild_lock:
+                if self._rebuilding:
+                    return rule_set
+                self._rebuilding = True
+            threading.Thread(target=self._rebuild_rule_set, name='pricing-rule-set', daemon=True).start()
+        return rule_set
+    
+    def _pinned_rule_set(self) -> PricingRuleSet:
+        """Rule set of the request running in the current thread, the current one outside of requests"""
+        return getattr(self._local, 'rule_set', None) or self.get_rule_set()
+    
+    def warm_up(self):
+        """Build the rule set of the current sync generation now, instead of in the background"""
+        generation = get_sync_generation()
+        rule_set = self._rule_set
+        if rule_set is None or rule_set.generation != generation:
+            with self._cache_lock:
+                rule_set = self._rule_set
+                if rule_set is None or rule_set.generation != generation:
+                    self.swap_rule_set(self.build_rule_set(generation))
+    
     def __enter__(self):
         self.connect()
         return self
@@ -123,10 +308,11 @@ class SageX3PricingEngine:
     
     def get_price_structure(self, structure_code: str) -> Dict[int, Dict[str, str]]:
         """
-        Get price structure configuration from PRICSTRUCT table
+        Get price structure configuration from the PRICSTRUCT rows of the rule set in use
         
         This method retrieves the configuration that determines how each discount/fee
-        column (DCGVAL_0 to DCGVAL_8) should be interpreted.
+        column (DCGVAL_0 to DCGVAL_8) should be interpreted. An unknown structure has
+        no configured column.
         
         Args:
             structure_code: The price structure code to look up
@@ -143,55 +329,52 @@ class SageX3PricingEngine:
                 ...
             }
         """
-        # Check cache first
-        if structure_code in self._price_structures_cache:
-            return self._price_structures_cache[structure_code]
-        
-        cursor = self.connection.cursor() # type: ignore
-        
-        # Query to get the price structure configuration
-        query = """
-        SELECT * FROM PRICSTRUCT 
-        WHERE PLISTC_0 = ?
+        return self._pinned_rule_set().price_structures.get(structure_code, {})
+    
+    def get_rule_catalog(self) -> PricingRuleCatalog:
         """
+        Get the prepared SPRICCONF rule catalog of the rule set in use
         
-        cursor.execute(query, (structure_code,))
-        result = cursor.fetchone()
+        Returns:
+            PricingRuleCatalog of the rule set
+        """
+        return self._pinned_rule_set().catalog
+    
+    def get_price_book(self) -> PriceBook:
+        """
+        Get the customers of the price book of the rule set in use
         
-        structure_config = {}
+        Returns:
+            PriceBook of the rule set
+        """
+        return self._pinned_rule_set().price_book
+    
+    def get_exchange_rates(self) -> ExchangeRateTable:
+        """
+        Get the TABCHANGE exchange rates of the rule set in use
         
-        if result:
-            row_dict = dict(result)
-            
-            # Process each of the 9 discount/fee columns (0-8)
-            for i in range(9):
-                incdcr_field = f'INCDCR_{i}'
-                valtyp_field = f'VALTYP_{i}'
-                clcrul_field = f'CLCRUL_{i}'
-                landessho_field = f'LANDESSHO_{i}'
-                
-                incdcr = row_dict.get(incdcr_field, '0')
-                valtyp = row_dict.get(valtyp_field, '0')
-                clcrul = row_dict.get(clcrul_field, '0')
-                description = row_dict.get(landessho_field, f'Adjustment {i}')
-                
-                # Only include columns that are actually configured (not '0')
-                if incdcr != '0' and valtyp != '0' and clcrul != '0':
-                    structure_config[i] = {
-                        'incdcr': incdcr,
-                        'valtyp': valtyp,
-                        'clcrul': clcrul,
-                        'description': description
-                    }
-                    
-                    logger.debug(f"Structure {structure_code} column {i}: "
-                               f"INCDCR={incdcr}, VALTYP={valtyp}, CLCRUL={clcrul}")
+        Returns:
+            ExchangeRateTable of the rule set
+        """
+        return self._pinned_rule_set().exchange_rates
+    
+    def get_unit_factors(self) -> ItemUnitFactors:
+        """
+        Get the ITMMASTER unit coefficients of the rule set in use
         
-        # Cache the result
-        self._price_structures_cache[structure_code] = structure_config
+        Returns:
+            ItemUnitFactors of the rule set
+        """
+        return self._pinned_rule_set().unit_factors
+    
+    def get_base_prices(self) -> ItemBasePrices:
+        """
+        Get the ITMMASTER base prices of the rule set in use
         
-        logger.info(f"Loaded price structure '{structure_code}' with {len(structure_config)} configured columns")
-        return structure_config
+        Returns:
+            ItemBasePrices of the rule set
+        """
+        return self._pinned_rule_set().base_prices
     
     def get_pricing_configurations(self) -> List[Dict[str, Any]]:
         """
@@ -200,29 +383,24 @@ class SageX3PricingEngine:
         Returns:
             List of pricing configuration dictionaries
         """
-        cursor = self.connection.cursor() # type: ignore
-        
-        query = """
-        SELECT * FROM SPRICCONF 
-        WHERE PLIENAFLG_0 = '2'  -- Active pricing rules
-        ORDER BY PIO_0 ASC  -- Priority order (ascending)
+        return self.get_rule_catalog().configurations
+    
+    def get_criteria_resolver(self) -> CriteriaResolver:
         """
+        Get the resolver of the SPRICCONF criteria of the rule set in use
         
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        configs = []
-        for row in results:
-            config = dict(row)
-            logger.debug(f"Found pricing config: {config['PLI_0']} with priority {config['PIO_0']}")
-            configs.append(config)
-        
-        return configs
+        Returns:
+            CriteriaResolver of the rule set
+        """
+        return self._pinned_rule_set().criteria_resolver
     
     def build_pricing_criteria(self, context: PricingContext, config: Dict[str, Any]) -> Dict[str, str]:
         """
         Build pricing criteria based on the context and configuration
         
+        Each FIL_i/FLD_i criterion of the configuration is valued from the context or
+        from the customer or item master data, see CriteriaResolver.
+        
         Args:
             context: Pricing context
             config: Pricing configuration
@@ -230,35 +408,82 @@ class SageX3PricingEngine:
         Returns:
             Dictionary of criteria values
         """
-        criteria = {}
+        return self.get_criteria_resolver().criteria(context, config)
+    
+    def get_price_line_index(self, pricing_rule_code: str) -> PriceLineIndex:
+        """
+        Get the compiled SPRICLIST lines of a pricing rule from the rule set in use
         
-        # Extract criteria fields from configuration
-        for i in range(5):  # Up to 5 criteria fields (PLICRI1_0 to PLICRI5_0)
-            field_name = f'FLD_{i}'
-            table_name = f'FIL_{i}'
+        The rule set compiles every SPRICCONF rule, a rule it does not know had no
+        line in its snapshot and gets an empty index, not kept with the set.
+        
+        Args:
+            pricing_rule_code: PLI_0 of the pricing rule
             
-            if field_name in config and config[field_name]:
-                table = config[table_name]
-                field = config[field_name]
-                
-                # Map the field to context value
-                if table == 'ITMMASTER' and field == 'ITMREF':
-                    criteria[f'PLICRI{i+1}_0'] = context.item_code
-                elif table == 'BPCUSTOMER' and field == 'BPCNUM':
-                    criteria[f'PLICRI{i+1}_0'] = context.customer_code
-                elif table == 'SPRICLINK' and field == 'CUR':
-                    criteria[f'PLICRI{i+1}_0'] = context.currency
-                elif table == 'SPRICLINK' and field == 'UOM':
-                    criteria[f'PLICRI{i+1}_0'] = context.unit_of_measure
-                else:
-                    criteria[f'PLICRI{i+1}_0'] = ''
+        Returns:
+            PriceLineIndex of the rule set
+        """
+        rule_set = self._pinned_rule_set()
+        index = rule_set.line_indexes.get(pricing_rule_code)
+        if index is None:
+            index = PriceLineIndex(pricing_rule_code, rule_set.generation, [])
+        return index
+    
+    def get_cart_line_indexes(self, contexts: List[PricingContext]) -> Dict[str, PriceLineIndex]:
+        """
+        Get the compiled pricing lines of every active pricing rule for a cart
         
-        return criteria
+        Args:
+            contexts: Pricing contexts of the cart lines
+            
+        Returns:
+            Dictionary mapping PLI_0 to its PriceLineIndex
+        """
+        return {
+            config['PLI_0']: self.get_price_line_index(config['PLI_0'])
+            for config in self.get_pricing_configurations()
+        }
     
-    def find_applicable_pricing_lines(self, context: PricingContext, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def find_applicable_pricing_lines(self, context: PricingContext, config: Dict[str, Any],
+                                      line_index: Optional[PriceLineIndex] = None,
+                                      criteria: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
         """
         Find all pricing lines that match the given context and configuration
         
+        Lines are resolved in memory from the compiled index of the pricing rule,
+        with the same results as query_applicable_pricing_lines.
+        
+        Args:
+            context: Pricing context
+            config: Pricing configuration
+            line_index: Compiled lines to use instead of the engine's index of the rule
+            criteria: Criteria values already built for the context and configuration
+            
+        Returns:
+            List of applicable pricing line dictionaries
+        """
+        if criteria is None:
+            criteria = self.build_pricing_criteria(context, config)
+        
+        if line_index is None:
+            line_index = self.get_price_line_index(config['PLI_0'])
+        
+        applicable_lines = line_index.find(
+            criteria,
+            context.order_date.strftime('%Y-%m-%d %H:%M:%S'),
+            float(context.quantity),
+            context.currency,
+            context.unit_of_measure
+        )
+        
+        return applicable_lines
+    
+    def query_applicable_pricing_lines(self, context: PricingContext, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Find all pricing lines that match the given context and configuration with a SQL query
+        
+        Reference implementation of find_applicable_pricing_lines.
+        
         Args:
             context: Pricing context
             config: Pricing configuration
@@ -271,6 +496,10 @@ class SageX3PricingEngine:
         # Build criteria for matching
         criteria = self.build_pricing_criteria(context, config)
         
+        # SPRICLIST_TYPED has numeric bounds, ISO dates and wildcard flags usable by its indexes
+        table = self.get_rule_catalog().pricing_lines_table
+        typed = table != 'SPRICLIST'
+        
         # Build the WHERE clause based on criteria
         where_conditions = []
         params = []
@@ -281,8 +510,12 @@ class SageX3PricingEngine:
         
         # Match date range
         current_date = context.order_date.strftime('%Y-%m-%d %H:%M:%S')
-        where_conditions.append("PLISTRDAT_0 <= ?")
-        where_conditions.append("PLIENDDAT_0 >= ?")
+        if typed:
+            where_conditions.append("PLISTRDAT_D <= ?")
+            where_conditions.append("PLIENDDAT_D >= ?")
+        else:
+            where_conditions.append("PLISTRDAT_0 <= ?")
+            where_conditions.append("PLIENDDAT_0 >= ?")
         params.extend([current_date, current_date])
         
         # Match criteria fields
@@ -290,12 +523,19 @@ class SageX3PricingEngine:
             criteria_field = f'PLICRI{i}_0'
             if criteria_field in criteria and criteria[criteria_field]:
                 # Handle wildcard matching (~ characters in Sage X3)
-                where_conditions.append(f"({criteria_field} = ? OR {criteria_field} LIKE '%~%')")
+                if typed:
+                    where_conditions.append(f"({criteria_field} = ? OR PLICRI{i}_W = 1)")
+                else:
+                    where_conditions.append(f"({criteria_field} = ? OR {criteria_field} LIKE '%~%')")
                 params.append(criteria[criteria_field])
         
         # Match quantity range
-        where_conditions.append("(CAST(MINQTY_0 AS REAL) <= ? OR CAST(MINQTY_0 AS REAL) = 0)")
-        where_conditions.append("(CAST(MAXQTY_0 AS REAL) >= ? OR CAST(MAXQTY_0 AS REAL) = 0)")
+        if typed:
+            where_conditions.append("(MINQTY_N <= ? OR MINQTY_N = 0)")
+            where_conditions.append("(MAXQTY_N >= ? OR MAXQTY_N = 0)")
+        else:
+            where_conditions.append("(CAST(MINQTY_0 AS REAL) <= ? OR CAST(MINQTY_0 AS REAL) = 0)")
+            where_conditions.append("(CAST(MAXQTY_0 AS REAL) >= ? OR CAST(MAXQTY_0 AS REAL) = 0)")
         params.extend([float(context.quantity), float(context.quantity)])
         
         # Match currency
@@ -305,21 +545,16 @@ class SageX3PricingEngine:
         # Match unit of measure
         where_conditions.append("UOM_0 = ?")
         params.append(context.unit_of_measure)
-
-        # print("Where conditions,", where_conditions)
         
         query = f"""
-        SELECT * FROM SPRICLIST 
+        SELECT * FROM {table} 
         WHERE {' AND '.join(where_conditions)}
         ORDER BY PLILIN_0 ASC
         """
-        # print(f"Executing pricing query: {query}")
-        # print(f"Query parameters: {params}")
         logger.debug(f"Executing pricing query: {query}")
         logger.debug(f"Query parameters: {params}")
         
         cursor.execute(query, params)
-        # print(f"Applicable pricing query: {query} with params: {params}")
         results = cursor.fetchall()
         
         applicable_lines = []
@@ -351,22 +586,27 @@ class SageX3PricingEngine:
             # Get base price field
             base_price_field = config.get('PRIFLD_0', '')
             if base_price_field:
-                # This would require fetching from the referenced table/field
-                # For now, using a default base price
                 base_price = self.get_base_price(context.item_code)
                 coefficient = Decimal(str(line.get('PRI_0', '1')))
                 return base_price * coefficient
             
         elif price_treatment == '3':  # Calculation
-            # This would require parsing and evaluating the formula
-            # For now, return the direct price
+            formula = (config.get(FORMULA_FIELD) or '').strip()
+            if formula:
+                try:
+                    evaluate = compile_formula(formula)
+                    return evaluate(line_variables(line, context.quantity,
+                                                   lambda: self.get_base_price(context.item_code)))
+                except (FormulaError, ArithmeticError) as e:
+                    logger.warning(f"Pricing rule {config['PLI_0']}: formula {formula!r} not evaluated, "
+                                   f"using the line price: {e}")
             return Decimal(str(line.get('PRI_0', '0')))
         
         return Decimal('0')
     
     def get_base_price(self, item_code: str) -> Decimal:
         """
-        Get the base price for an item from ITMMASTER table
+        Get the base price for an item from the ITMMASTER base prices of the current sync
         
         Args:
             item_code: Item reference code
@@ -374,16 +614,7 @@ class SageX3PricingEngine:
         Returns:
             Base price as Decimal
         """
-        cursor = self.connection.cursor() # type: ignore
-        
-        query = "SELECT BASPRI_0 FROM ITMMASTER WHERE ITMREF_0 = ?"
-        cursor.execute(query, (item_code,))
-        result = cursor.fetchone()
-        
-        if result:
-            return Decimal(str(result['BASPRI_0']))
-        
-        return Decimal('0')
+        return self.get_base_prices().get(item_code)
     
     def calculate_adjustments(self, context: PricingContext, line: Dict[str, Any], 
                             price_structure: Dict[int, Dict[str, str]]) -> List[PriceAdjustment]:
@@ -460,11 +691,11 @@ class SageX3PricingEngine:
                         
                         adjustments.append(adjustment)
                         
-                        logger.debug(f"Column {i}: {adjustment_type} {adjustment_value} "
-                                   f"({calculation_type}, {calculation_basis}) - "
-                                   f"INCDCR={incdcr}, VALTYP={valtyp}, CLCRUL={clcrul}")
+                        logger.debug("Column %s: %s %s (%s, %s) - INCDCR=%s, VALTYP=%s, CLCRUL=%s",
+                                     i, adjustment_type, adjustment_value, calculation_type, calculation_basis,
+                                     incdcr, valtyp, clcrul)
                     else:
-                        logger.debug(f"Column {i} has value {adjustment_value} but no structure configuration")
+                        logger.debug("Column %s has value %s but no structure configuration", i, adjustment_value)
         
         return adjustments
     
@@ -487,13 +718,7 @@ class SageX3PricingEngine:
         Returns:
             List of free item dictionaries
         """
-        cursor = self.connection.cursor() # type: ignore
-
-        query = f"""SELECT FOCPRO_0, FOCTYP_0 FROM SPRICCONF WHERE PLI_0 = ?"""
-        cursor.execute(query, (line.get('PLI_0'),))
-        logger.info(f" Line =====> {line} ")
-        result = cursor.fetchone()
-        print( "configurations for free items", result['FOCPRO_0'] )
+        focpro, foctyp = self.get_rule_catalog().get_free_goods(line.get('PLI_0')) # type: ignore
         free_items = []
 
         # Get free item configuration from the pricing line
@@ -524,11 +749,8 @@ class SageX3PricingEngine:
         
         # Get free item configuration from the pricing line
         # focpro = line.get('FOCPRO_0', '0')  # Free item mechanism type
-        focpro = result['FOCPRO_0']
         # print("lines = = = = >", line)
-        print("Free items ====>", line.get('FOCPRO_0'))
         # foctyp = line.get('FOCTYP_0', '0')  # Attribution type (threshold vs multiple)
-        foctyp = result['FOCTYP_0']
         focqtymin = Decimal(str(line.get('FOCQTYMIN_0', '0')))  # Quantity threshold
         focamtmin = Decimal(str(line.get('FOCAMTMIN_0', '0')))  # Amount threshold  
         focqtybkt = Decimal(str(line.get('FOCQTYBKT_0', '0')))  # Quantity bucket/tranche
@@ -536,25 +758,32 @@ class SageX3PricingEngine:
         focitmref = line.get('FOCITMREF_0', '').strip()  # Free item reference
         focqty = Decimal(str(line.get('FOCQTY_0', '0')))  # Free quantity per trigger
         
+        trace = current_trace()
+        
         if focpro == '1' or focpro == '' or focqty <= 1:
             logger.debug("No free item configuration found or invalid")
             return free_items
+        
+        if focpro == '4':
+            # Total Commande is evaluated on the cart totals, see apply_order_total_free_items
+            logger.debug("Order total free goods of %s left to the cart pass", line.get('PLICRD_0'))
+            return free_items
             
-        logger.info(f"Processing free items: FOCPRO={focpro}, FOCTYP={foctyp}")
-        logger.debug(f"Thresholds: QtyMin={focqtymin}, AmtMin={focamtmin}")
-        logger.debug(f"Buckets: QtyBkt={focqtybkt}, AmtBkt={focamtbkt}")
-        logger.debug(f"Free item: {focitmref}, Free qty: {focqty}")
+        logger.debug("Processing free items: FOCPRO=%s, FOCTYP=%s, QtyMin=%s, AmtMin=%s, QtyBkt=%s, AmtBkt=%s, "
+                     "free item: %s, free qty: %s",
+                     focpro, foctyp, focqtymin, focamtmin, focqtybkt, focamtbkt, focitmref, focqty)
         
         # Calculate line amount for threshold checks
         line_amount = context.quantity * self.get_current_unit_price_for_free_calc(context, line)
         
-        print(f"\n=== FREE ITEMS CALCULATION ===")
-        print(f"Free item mechanism: {self.get_focpro_description(focpro)}")
-        print(f"Attribution type: {self.get_foctyp_description(foctyp)}")
-        print(f"Ordered quantity: {context.quantity}")
-        print(f"Line amount: {line_amount} {context.currency}")
-        print(f"Quantity threshold: {focqtymin}")
-        print(f"Amount threshold: {focamtmin} {context.currency}")
+        if trace is not None:
+            trace.step('free_goods', pricing_line=line.get('PLICRD_0'),
+                       mechanism=self.get_focpro_description(focpro),
+                       attribution=self.get_foctyp_description(foctyp),
+                       quantity=context.quantity, line_amount=line_amount,
+                       quantity_threshold=focqtymin, amount_threshold=focamtmin,
+                       quantity_bucket=focqtybkt, amount_bucket=focamtbkt,
+                       free_item=focitmref, free_quantity=focqty)
         
         if focpro == '2':  # N pour M (same item free)
             free_items = self.calculate_n_for_m_free_items(
@@ -570,22 +799,9 @@ class SageX3PricingEngine:
                 context, foctyp, focqtymin, focqtybkt, focitmref, focqty, 
                 line_amount, focamtmin, focamtbkt
             )
-            
-        elif focpro == '4':  # Total Commande (order total based)
-            # This would require full order context, approximating with current line
-            logger.warning("FOCPRO=4 (Total Commande) approximated as single line")
-            free_items = self.calculate_order_total_free_items(
-                context, foctyp, focqtymin, focqtybkt, focitmref, focqty,
-                line_amount, focamtmin, focamtbkt
-            )
         
-        if free_items:
-            print(f"FREE ITEMS AWARDED:")
-            for item in free_items:
-                print(f"  * {item['item_code']}: {item['quantity']} {item['unit_of_measure']}")
-        else:
-            print("No free items awarded (threshold not met)")
-        print("=" * 40)
+        if trace is not None:
+            trace.step('free_goods_awarded', free_items=free_items)
         
         return free_items
     
@@ -623,54 +839,49 @@ class SageX3PricingEngine:
         """
         free_items = []
         free_quantity = Decimal('0')
+        trace = current_trace()
         
         # Determine if we use quantity or amount based threshold
         use_quantity_threshold = focqtymin > 0
         use_amount_threshold = focamtmin > 0
         
         if use_quantity_threshold:
-            print(f"Using QUANTITY threshold logic:")
-            print(f"  Threshold: {focqtymin} units")
-            
             if context.quantity >= focqtymin:
                 if foctyp == '1':  # Seuil (threshold - one time)
                     free_quantity = focqty
-                    print(f"  Threshold reached  {focqty} free items awarded (one-time)")
                     
                 elif foctyp == '2':  # Multiple (by buckets)
                     if focqtybkt > 0:
                         excess_qty = context.quantity - focqtymin
                         buckets = (excess_qty / focqtybkt).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
                         free_quantity = buckets * focqty
-                        print(f"  Excess quantity: {excess_qty}")
-                        print(f"  Buckets of {focqtybkt}: {buckets}")
-                        print(f"  Free items: {buckets} × {focqty} = {free_quantity}")
+                        if trace is not None:
+                            trace.step('free_goods_buckets', basis='quantity', excess=excess_qty,
+                                       bucket=focqtybkt, buckets=buckets, free_quantity=free_quantity)
                     else:
                         logger.warning("FOCTYP=2 but FOCQTYBKT=0, cannot calculate buckets")
-            else:
-                print(f"  Quantity {context.quantity} < threshold {focqtymin}, no free items")
+            elif trace is not None:
+                trace.step('free_goods_threshold', basis='quantity', value=context.quantity,
+                           threshold=focqtymin, reached=False)
         
         elif use_amount_threshold:
-            print(f"Using AMOUNT threshold logic:")  
-            print(f"  Threshold: {focamtmin} {context.currency}")
-            
             if line_amount >= focamtmin:
                 if foctyp == '1':  # Seuil (threshold - one time)
                     free_quantity = focqty
-                    print(f"  Threshold reached  {focqty} free items awarded (one-time)")
                     
                 elif foctyp == '2':  # Multiple (by buckets)
                     if focamtbkt > 0:
                         excess_amt = line_amount - focamtmin
                         buckets = (excess_amt / focamtbkt).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
                         free_quantity = buckets * focqty
-                        print(f"  Excess amount: {excess_amt} {context.currency}")
-                        print(f"  Buckets of {focamtbkt}: {buckets}")
-                        print(f"  Free items: {buckets} × {focqty} = {free_quantity}")
+                        if trace is not None:
+                            trace.step('free_goods_buckets', basis='amount', excess=excess_amt,
+                                       bucket=focamtbkt, buckets=buckets, free_quantity=free_quantity)
                     else:
                         logger.warning("FOCTYP=2 but FOCAMTBKT=0, cannot calculate buckets")
-            else:
-                print(f"  Amount {line_amount} < threshold {focamtmin}, no free items")
+            elif trace is not None:
+                trace.step('free_goods_threshold', basis='amount', value=line_amount,
+                           threshold=focamtmin, reached=False)
         
         if free_quantity > 0:
             free_items.append({
@@ -690,46 +901,47 @@ class SageX3PricingEngine:
         """
         free_items = []
         free_quantity = Decimal('0')
+        trace = current_trace()
         
         # Determine if we use quantity or amount based threshold
         use_quantity_threshold = focqtymin > 0
         use_amount_threshold = focamtmin > 0
         
         if use_quantity_threshold:
-            print(f"Using QUANTITY threshold for other item ({focitmref}):")
-            print(f"  Threshold: {focqtymin} units")
-            
             if context.quantity >= focqtymin:
                 if foctyp == '1':  # Seuil (threshold - one time)
                     free_quantity = focqty
-                    print(f"  Threshold reached  {focqty} of {focitmref} awarded (one-time)")
                     
                 elif foctyp == '2':  # Multiple (by buckets)
                     if focqtybkt > 0:
                         buckets = (context.quantity / focqtybkt).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
                         free_quantity = buckets * focqty
-                        print(f"  Buckets of {focqtybkt}: {buckets}")
-                        print(f"  Free items: {buckets} × {focqty} = {free_quantity} of {focitmref}")
+                        if trace is not None:
+                            trace.step('free_goods_buckets', basis='quantity', excess=context.quantity,
+                                       bucket=focqtybkt, buckets=buckets, free_quantity=free_quantity)
                     else:
                         logger.warning("FOCTYP=2 but FOCQTYBKT=0, cannot calculate buckets")
+            elif trace is not None:
+                trace.step('free_goods_threshold', basis='quantity', value=context.quantity,
+                           threshold=focqtymin, reached=False)
         
         elif use_amount_threshold:
-            print(f"Using AMOUNT threshold for other item ({focitmref}):")
-            print(f"  Threshold: {focamtmin} {context.currency}")
-            
             if line_amount >= focamtmin:
                 if foctyp == '1':  # Seuil (threshold - one time)  
                     free_quantity = focqty
-                    print(f"  Threshold reached  {focqty} of {focitmref} awarded (one-time)")
                     
                 elif foctyp == '2':  # Multiple (by buckets)
                     if focamtbkt > 0:
                         buckets = (line_amount / focamtbkt).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
                         free_quantity = buckets * focqty
-                        print(f"  Buckets of {focamtbkt}: {buckets}")
-                        print(f"  Free items: {buckets} × {focqty} = {free_quantity} of {focitmref}")
+                        if trace is not None:
+                            trace.step('free_goods_buckets', basis='amount', excess=line_amount,
+                                       bucket=focamtbkt, buckets=buckets, free_quantity=free_quantity)
                     else:
                         logger.warning("FOCTYP=2 but FOCAMTBKT=0, cannot calculate buckets")
+            elif trace is not None:
+                trace.step('free_goods_threshold', basis='amount', value=line_amount,
+                           threshold=focamtmin, reached=False)
         
         if free_quantity > 0:
             free_items.append({
@@ -746,16 +958,10 @@ class SageX3PricingEngine:
                                        line_amount: Decimal, focamtmin: Decimal, focamtbkt: Decimal) -> List[Dict[str, Any]]:
         """
         Calculate free items for "Total Commande" (order total based) scenario
-        Note: This is approximated for single line context
+        The context quantity and line_amount are the order totals, see apply_order_total_free_items
         """
         free_items = []
         
-        # In a real implementation, this would need full order context
-        # For now, we approximate using the current line totals
-        logger.warning("Order total free items approximated using current line only")
-        
-        print(f"Using ORDER TOTAL logic (approximated as line total):")
-        
         # Use the "Autre Article" logic but with order total context
         if focitmref:
             free_items = self.calculate_other_item_free_items(
@@ -771,11 +977,121 @@ class SageX3PricingEngine:
             
         # Mark as order total type
         for item in free_items:
-            item['free_type'] = 'Total Commande (approximated)'
+            item['free_type'] = 'Total Commande'
             
         return free_items
     
-    def calculate_pricing(self, context: PricingContext) -> PricingResult:
+    def get_result_cache_stats(self) -> Dict[str, int]:
+        """Get the hit/miss counters and the size of the pricing result cache"""
+        with self._result_cache_lock:
+            return {
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'size': len(self._result_cache),
+                'max_size': self._result_cache_size,
+            }
+    
+    def _result_cache_key(self, context: PricingContext, line_indexes: List[PriceLineIndex],
+                          criteria: List[Dict[str, str]], order_date: str) -> Optional[Tuple]:
+        """
+        Normalized key of a pricing context
+        
+        The customer and item are replaced by the criteria values they resolve to, and
+        the order date and quantity by their bracket in each pricing rule, so contexts
+        sharing criteria share their resolution.
+        """
+        quantity = float(context.quantity)
+        return (
+            context.currency, context.unit_of_measure,
+            tuple(tuple(values.items()) for values in criteria),
+            tuple(index.bracket(order_date, quantity) for index in line_indexes),
+        )
+    
+    def resolve_pricing_lines(self, context: PricingContext, configs: List[Dict[str, Any]],
+                              line_indexes: Optional[Dict[str, PriceLineIndex]] = None) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Resolve the pricing line retained for each pricing configuration
+        
+        For each configuration by priority the first applicable line (by PLILIN_0) is
+        retained, stopping after the first one for grouped pricing (PLITYP_0 = '2').
+        Resolutions are kept in an LRU cache keyed by the normalized context, only the
+        price arithmetic is redone on a hit.
+        
+        Args:
+            context: Pricing context
+            configs: Pricing configurations ordered by priority
+            line_indexes: Compiled pricing lines by PLI_0, as returned by get_cart_line_indexes
+            
+        Returns:
+            List of (configuration, pricing line) tuples
+        """
+        generation = self._pinned_rule_set().generation
+        indexes = [
+            (line_indexes or {}).get(config['PLI_0']) or self.get_price_line_index(config['PLI_0'])
+            for config in configs
+        ]
+        order_date = context.order_date.strftime('%Y-%m-%d %H:%M:%S')
+        criteria = [self.build_pricing_criteria(context, config) for config in configs]
+        
+        key = None
+        if self._result_cache_size > 0:
+            key = self._result_cache_key(context, indexes, criteria, order_date)
+        if key is not None:
+            with self._result_cache_lock:
+                cached = self._result_cache.get(key)
+                if cached is not None and cached[0] == generation:
+                    self._result_cache.move_to_end(key)
+                    self.cache_hits += 1
+                    self._trace_resolution(cached[1], cached=True)
+                    return cached[1]
+                self.cache_misses += 1
+        
+        resolved = []
+        for config, line_index, config_criteria in zip(configs, indexes, criteria):
+            logger.debug("Processing pricing config: %s (priority: %s)", config['PLI_0'], config['PIO_0'])
+            
+            # Find applicable pricing lines
+            applicable_lines = self.find_applicable_pricing_lines(context, config, line_index, config_criteria)
+            
+            if not applicable_lines:
+                logger.debug("No applicable lines found for config: %s", config['PLI_0'])
+                continue
+            
+            # Retain the first applicable line (they are ordered by PLILIN_0)
+            resolved.append((config, applicable_lines[0]))
+            
+            # For normal pricing (PLITYP_0 = '1'), we can apply multiple rules
+            # For grouped pricing (PLITYP_0 = '2'), we stop at the first applicable rule
+            if config.get('PLITYP_0') == '2':  # Grouped pricing
+                logger.debug("Grouped pricing applied, stopping rule processing")
+                break
+        
+        if key is not None:
+            with self._result_cache_lock:
+                self._result_cache[key] = (generation, resolved)
+                self._result_cache.move_to_end(key)
+                while len(self._result_cache) > self._result_cache_size:
+                    self._result_cache.popitem(last=False)
+        
+        self._trace_resolution(resolved, cached=False)
+        return resolved
+    
+    def _trace_resolution(self, resolved: List[Tuple[Dict[str, Any], Dict[str, Any]]], cached: bool):
+        """Record the retained configurations and pricing lines in the active trace"""
+        trace = current_trace()
+        if trace is None:
+            return
+        trace.step('resolution', cached=cached, pricing_rules=[config['PLI_0'] for config, _ in resolved])
+        for config, line in resolved:
+            trace.step('pricing_line', configuration={
+                'PLI_0': config.get('PLI_0'), 'PIO_0': config.get('PIO_0'), 'PLITYP_0': config.get('PLITYP_0'),
+                'PRIPRO_0': config.get('PRIPRO_0'), 'PLISTC_0': config.get('PLISTC_0'),
+            }, line=line)
+    
+    @pins_rule_set
+    def calculate_pricing(self, context: PricingContext,
+                          line_indexes: Optional[Dict[str, PriceLineIndex]] = None,
+                          document_level: bool = False, apply_adjustments: bool = True) -> PricingResult:
         """
         Main pricing calculation method with complete Sage X3 semantics
         
@@ -786,13 +1102,36 @@ class SageX3PricingEngine:
         4. Use PRICSTRUCT to interpret discount/fee columns correctly
         5. Apply adjustments in the correct order with proper calculation types
         
+        Document adjustments (CLCRUL=3) and order total free goods (FOCPRO=4) are
+        applied by the cart pass, on the line alone unless document_level is set.
+        
         Args:
             context: Pricing context containing all necessary information
+            line_indexes: Compiled pricing lines by PLI_0, as returned by get_cart_line_indexes
+            document_level: Leave document adjustments (CLCRUL=3) and order total free
+                goods (FOCPRO=4) to the cart pass of calculate_pricing_batch
+            apply_adjustments: False to leave the unit price at the base price, when the
+                adjustments of a whole cart are applied by apply_adjustments_batch
             
         Returns:
             PricingResult object with calculated pricing information
         """
-        logger.info(f"Starting pricing calculation for item: {context.item_code}, customer: {context.customer_code}")
+        if not document_level:
+            # A single line is priced as a one line cart of calculate_pricing_batch
+            result = self.calculate_pricing(context, line_indexes, document_level=True,
+                                            apply_adjustments=apply_adjustments)
+            self.apply_document_pass([context], [result])
+            return result
+        
+        logger.debug("Starting pricing calculation for item: %s, customer: %s", context.item_code, context.customer_code)
+        
+        trace = current_trace()
+        if trace is not None:
+            trace.begin_line(context)
+        if self.use_price_book:
+            result = self.price_from_book(context, document_level, apply_adjustments)
+            if result is not None:
+                return result
         
         result = PricingResult()
         result.currency = context.currency
@@ -805,22 +1144,94 @@ class SageX3PricingEngine:
             logger.warning("No pricing configurations found")
             return result
         
-        # Process each configuration by priority
-        for config in configs:
-            logger.debug(f"Processing pricing config: {config['PLI_0']} (priority: {config['PIO_0']})")
-            print(f"Processing pricing config: {config['PLI_0']} (priority: {config['PIO_0']})")
-            
-            # Find applicable pricing lines
-            applicable_lines = self.find_applicable_pricing_lines(context, config)
+        resolved = self.resolve_pricing_lines(context, configs, line_indexes)
+        pricing_context = context
+        if not resolved:
+            resolved = self.resolve_in_other_currency(result, context, configs)
+        if not resolved:
+            resolved, pricing_context = self.resolve_in_other_unit(result, context, configs)
+        self.apply_pricing_lines(result, pricing_context, resolved, document_level)
+        
+        return self.finish_pricing(result, context, document_level, apply_adjustments)
+    
+    def resolve_in_other_currency(self, result: PricingResult, context: PricingContext,
+                                  configs: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Resolve the pricing lines of a context in another currency
+        
+        Used when no line is priced in the order currency. The currencies with an
+        exchange rate into the order currency on the order date are tried in code
+        order, the first one with applicable lines is kept in result.currency and
+        converted by apply_currency_conversion.
+        
+        Args:
+            result: Result being priced, its currency is updated
+            context: Pricing context
+            configs: Pricing configurations ordered by priority
             
-            if not applicable_lines:
-                logger.debug(f"No applicable lines found for config: {config['PLI_0']}")
+        Returns:
+            List of (configuration, pricing line) tuples, empty when no currency has lines
+        """
+        exchange_rates = self.get_exchange_rates()
+        order_date = context.order_date.strftime('%Y-%m-%d %H:%M:%S')
+        for currency in exchange_rates.sources(context.currency):
+            if exchange_rates.rate(currency, context.currency, order_date) is None:
                 continue
+            resolved = self.resolve_pricing_lines(replace(context, currency=currency), configs)
+            if resolved:
+                logger.debug("No pricing line in %s, using the lines in %s", context.currency, currency)
+                result.currency = currency
+                return resolved
+        return []
+    
+    def resolve_in_other_unit(self, result: PricingResult, context: PricingContext,
+                              configs: List[Dict[str, Any]]) -> Tuple[List[Tuple[Dict[str, Any], Dict[str, Any]]], PricingContext]:
+        """
+        Resolve the pricing lines of a context in another unit of the item
+        
+        Used when no line is priced in the ordered unit. The sales, stock and purchase
+        units of the item are tried in that order with the quantity converted with the
+        ITMMASTER coefficients, the first one with applicable lines is kept in
+        result.unit_of_measure and converted by apply_unit_conversion.
+        
+        Args:
+            result: Result being priced, its unit of measure is updated
+            context: Pricing context
+            configs: Pricing configurations ordered by priority
             
-            # Process the first applicable line (they are ordered by PLILIN_0)
-            line = applicable_lines[0]
-            
-            logger.info(f"Applying pricing line: {line['PLICRD_0']} from config: {config['PLI_0']}")
+        Returns:
+            (configuration, pricing line) tuples, empty when no unit has lines, and the
+            context in the unit of the lines
+        """
+        unit_factors = self.get_unit_factors()
+        for unit in unit_factors.units(context.item_code):
+            ratio = unit_factors.ratio(context.item_code, context.unit_of_measure, unit)
+            if unit == context.unit_of_measure or ratio is None:
+                continue
+            unit_context = replace(context, unit_of_measure=unit, quantity=context.quantity * ratio)
+            resolved = self.resolve_pricing_lines(unit_context, configs)
+            if resolved:
+                logger.debug("No pricing line in %s, using the lines in %s", context.unit_of_measure, unit)
+                result.unit_of_measure = unit
+                return resolved, unit_context
+        return [], context
+    
+    def apply_pricing_lines(self, result: PricingResult, context: PricingContext,
+                            resolved: List[Tuple[Dict[str, Any], Dict[str, Any]]], document_level: bool = False):
+        """
+        Set the base price, adjustments and free items of the retained pricing lines
+        
+        Args:
+            result: Result to fill, updated in place
+            context: Pricing context
+            resolved: (configuration, pricing line) tuples, as returned by resolve_pricing_lines
+            document_level: See calculate_pricing
+        """
+        trace = current_trace()
+        
+        # Process the pricing line retained for each configuration, by priority
+        for config, line in resolved:
+            logger.debug("Applying pricing line: %s from config: %s", line['PLICRD_0'], config['PLI_0'])
             
             # Calculate base price
             base_price = self.calculate_price_from_line(context, line, config)
@@ -831,7 +1242,11 @@ class SageX3PricingEngine:
                 result.reason_code = config.get('PLISTC_0', '')
                 result.price_structure_code = config.get('PLISTC_0', '')
                 
-                logger.debug(f"Base price calculated: {base_price}")
+                logger.debug("Base price calculated: %s", base_price)
+            
+            if trace is not None:
+                trace.step('base_price', pricing_rule=config['PLI_0'], price_treatment=config.get('PRIPRO_0'),
+                           base_price=base_price)
             
             # Get the price structure configuration for this pricing rule
             structure_code = config.get('PLISTC_0', '')
@@ -839,40 +1254,474 @@ class SageX3PricingEngine:
             
             if structure_code:
                 price_structure = self.get_price_structure(structure_code)
-                logger.debug(f"Using price structure: {structure_code}")
+                logger.debug("Using price structure: %s", structure_code)
+                if trace is not None:
+                    trace.step('price_structure', code=structure_code, columns=price_structure)
             
             # Calculate adjustments using the price structure
             adjustments = self.calculate_adjustments(context, line, price_structure)
             result.adjustments.extend(adjustments)
             
             # Calculate free items (gratuitÃ©)
-            free_items = self.calculate_free_items(context, line)
-            result.free_items.extend(free_items)
+            if document_level and self.get_rule_catalog().get_free_goods(line.get('PLI_0'))[0] == '4': # type: ignore
+                # Order total free goods are evaluated once on the cart totals
+                result.order_total_lines.append(line)
+            else:
+                free_items = self.calculate_free_items(context, line)
+                result.free_items.extend(free_items)
             
             # Commission coefficient
             if line.get('COMCOE_0'):
                 result.commission_coefficient = Decimal(str(line['COMCOE_0']))
+    
+    def resolve_price_ladder(self, context: PricingContext, configs: List[Dict[str, Any]],
+                             quantities: List[Decimal]) -> List[List[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+        """
+        Resolve the pricing lines retained for several quantities of one context
+        
+        The candidate lines of every configuration are looked up once for the
+        customer, item, currency, unit and order date, then each quantity is
+        matched against their quantity bounds in memory with the same retention
+        rules as resolve_pricing_lines.
+        
+        Args:
+            context: Pricing context, its quantity is not used
+            configs: Pricing configurations ordered by priority
+            quantities: Quantities to resolve
             
-            # For normal pricing (PLITYP_0 = '1'), we can apply multiple rules
-            # For grouped pricing (PLITYP_0 = '2'), we stop at the first applicable rule
-            if config.get('PLITYP_0') == '2':  # Grouped pricing
-                logger.info("Grouped pricing applied, stopping rule processing")
-                break
+        Returns:
+            List of (configuration, pricing line) tuples for every quantity, in the same order
+        """
+        order_date = context.order_date.strftime('%Y-%m-%d %H:%M:%S')
+        candidates = [
+            (config, self.get_price_line_index(config['PLI_0']).find_candidates(
+                self.build_pricing_criteria(context, config), order_date, context.currency, context.unit_of_measure))
+            for config in configs
+        ]
         
-        # Apply all adjustments using proper Sage X3 calculation methods
-        result.unit_price = self.apply_sage_x3_adjustments(result.base_price, result.adjustments, context)
+        ladder = []
+        for quantity in quantities:
+            value = float(quantity)
+            resolved = []
+            for config, lines in candidates:
+                line = next((compiled.line for compiled in lines if compiled.matches_quantity(value)), None)
+                if line is None:
+                    continue
+                resolved.append((config, line))
+                if config.get('PLITYP_0') == '2':  # Grouped pricing
+                    break
+            ladder.append(resolved)
+        return ladder
+    
+    @pins_rule_set
+    def calculate_price_ladder(self, context: PricingContext, quantities: List[Decimal]) -> List[PricingResult]:
+        """
+        Price one customer and item at several quantities
         
-        # Apply currency conversion if needed
-        result = self.apply_currency_conversion(result, context)
+        Pricing lines are resolved once for all the quantities by resolve_price_ladder,
+        every quantity is then priced as a one line cart of calculate_pricing_batch,
+        its document adjustments and order total free goods included.
+        
+        Args:
+            context: Pricing context, its quantity is not used
+            quantities: Quantities to price
+            
+        Returns:
+            PricingResult of every quantity, in the same order
+        """
+        configs = self.get_pricing_configurations()
+        if not configs:
+            logger.warning("No pricing configurations found")
+            return [PricingResult(currency=context.currency, unit_of_measure=context.unit_of_measure)
+                    for _ in quantities]
+        
+        results = []
+        for quantity, resolved in zip(quantities, self.resolve_price_ladder(context, configs, quantities)):
+            step_context = replace(context, quantity=quantity)
+            result = PricingResult(currency=context.currency, unit_of_measure=context.unit_of_measure)
+            pricing_context = step_context
+            if not resolved:
+                resolved = self.resolve_in_other_currency(result, step_context, configs)
+            if not resolved:
+                resolved, pricing_context = self.resolve_in_other_unit(result, step_context, configs)
+            self.apply_pricing_lines(result, pricing_context, resolved, document_level=True)
+            result = self.finish_pricing(result, step_context, document_level=True)
+            self.apply_document_pass([step_context], [result])
+            results.append(result)
+        return results
+    
+    def price_from_book(self, context: PricingContext, document_level: bool = False,
+                        apply_adjustments: bool = True) -> Optional[PricingResult]:
+        """
+        Price a line from the precomputed price book of its customer
+        
+        The entry holds the resolved pricing rule, base price, adjustments and free goods
+        lines for the order dates and quantities it was computed for. The adjustments
+        and free goods are then applied to the ordered quantity as calculate_pricing does.
+        
+        Args:
+            context: Pricing context
+            document_level: See calculate_pricing
+            apply_adjustments: See calculate_pricing
+            
+        Returns:
+            PricingResult, None when the line is not in the price book
+        """
+        entry = self.get_price_book().lookup(context)
+        if entry is None:
+            return None
+        
+        base_price = Decimal(entry['BASPRI_0'])
+        result = PricingResult(
+            unit_price=base_price,
+            base_price=base_price,
+            adjustments=[
+                PriceAdjustment(**{**adjustment, 'value': Decimal(adjustment['value'])})
+                for adjustment in entry['ADJUSTMENTS_0']
+            ],
+            commission_coefficient=Decimal(entry['COMCOE_0']),
+            pricing_rule_code=entry['PLI_0'],
+            reason_code=entry['PLISTC_0'],
+            currency=context.currency,
+            unit_of_measure=context.unit_of_measure,
+            price_structure_code=entry['PLISTC_0'],
+        )
+        
+        trace = current_trace()
+        if trace is not None:
+            trace.step('price_book', pricing_rule=entry['PLI_0'], price_structure=entry['PLISTC_0'],
+                       base_price=base_price, adjustments=[adj.index for adj in result.adjustments],
+                       free_goods_lines=[line.get('PLICRD_0') for line in entry['FOCLINES_0']])
+        
+        for line in entry['FOCLINES_0']:
+            if document_level and self.get_rule_catalog().get_free_goods(line.get('PLI_0'))[0] == '4':
+                result.order_total_lines.append(line)
+            else:
+                result.free_items.extend(self.calculate_free_items(context, line))
+        
+        logger.debug("Priced item %s for customer %s from the price book", context.item_code, context.customer_code)
+        return self.finish_pricing(result, context, document_level, apply_adjustments)
+    
+    def finish_pricing(self, result: PricingResult, context: PricingContext,
+                       document_level: bool = False, apply_adjustments: bool = True) -> PricingResult:
+        """
+        Apply the adjustments and conversions of a line whose pricing lines were retained
+        
+        Args:
+            result: Result holding the base price, adjustments and free items
+            context: Pricing context
+            document_level: See calculate_pricing
+            apply_adjustments: See calculate_pricing
+            
+        Returns:
+            PricingResult with its final unit price
+        """
+        trace = current_trace()
         
-        # Apply unit conversion if needed
+        # Convert prices and amounts resolved in another currency or unit before the adjustments
+        result = self.apply_currency_conversion(result, context)
         result = self.apply_unit_conversion(result, context)
         
-        logger.info(f"Pricing calculation completed. Base price: {result.base_price}, "
-                   f"Final price after adjustments: {result.unit_price} {result.currency}")
+        # Apply all adjustments using proper Sage X3 calculation methods
+        if apply_adjustments:
+            adjustments = result.adjustments
+            if document_level:
+                # Document adjustments are applied once to the cart total
+                adjustments = [adj for adj in adjustments if adj.calculation_basis != 'document']
+            result.unit_price = self.apply_sage_x3_adjustments(result.base_price, adjustments, context)
+        
+        logger.debug("Pricing calculation completed. Base price: %s, Final price after adjustments: %s %s",
+                     result.base_price, result.unit_price, result.currency)
+        
+        if trace is not None and apply_adjustments:
+            self.trace_result(result, document_level)
         
         return result
     
+    def trace_result(self, result: PricingResult, document_level: bool = False):
+        """Record a priced line in the active trace"""
+        current_trace().step( # type: ignore
+            'result', pricing_rule=result.pricing_rule_code, base_price=result.base_price,
+            unit_price=result.unit_price, free_items=result.free_items,
+            deferred_to_document=[adj.index for adj in result.adjustments if adj.calculation_basis == 'document']
+            if document_level else []
+        )
+    
+    @pins_rule_set
+    def calculate_pricing_batch(self, contexts: List[PricingContext]) -> List[PricingResult]:
+        """
+        Price a whole cart
+        
+        The lines are priced up to their line total by price_cart_lines, across the
+        process pool from parallel_min_lines lines. Document adjustments (CLCRUL=3)
+        and order total free goods (FOCPRO=4) are then evaluated once on the cart
+        totals and split back across the lines.
+        
+        Args:
+            contexts: Pricing contexts of the cart lines
+            
+        Returns:
+            PricingResult of every context, in the same order
+        """
+        if not contexts:
+            return []
+        
+        trace = current_trace()
+        parallel = len(contexts) >= self.parallel_min_lines and self.parallel_workers > 1
+        results = None
+        if parallel and trace is None:
+            results = self.price_cart_lines_parallel(contexts)
+        if results is None:
+            results = self.price_cart_lines(contexts)
+        
+        if trace is not None:
+            trace.begin_document()
+            if parallel:
+                # Worker processes do not record steps, the same lines were priced here instead
+                trace.step('execution', production_path='process_pool', traced_path='in_process',
+                           workers=self.parallel_workers, lines=len(contexts))
+        
+        self.apply_document_pass(contexts, results)
+        
+        return results
+    
+    def apply_document_pass(self, contexts: List[PricingContext], results: List[PricingResult]):
+        """
+        Apply the document adjustments and order total free goods of a cart priced up to its line totals
+        
+        Args:
+            contexts: Pricing contexts of the cart lines
+            results: Results priced with document_level=True, updated in place
+        """
+        self.apply_document_adjustments(contexts, results)
+        self.apply_order_total_free_items(contexts, results)
+    
+    @pins_rule_set
+    def price_cart_lines(self, contexts: List[PricingContext]) -> List[PricingResult]:
+        """
+        Price the lines of a cart up to their line total
+        
+        The candidate pricing lines of every rule are fetched once for all the cart
+        lines, each line is then matched in memory. Document adjustments and order
+        total free goods are left to the cart pass. From vectorize_min_lines lines the
+        unit and line adjustments are applied at once with NumPy.
+        
+        Args:
+            contexts: Pricing contexts of the cart lines
+            
+        Returns:
+            PricingResult of every context, in the same order
+        """
+        line_indexes = self.get_cart_line_indexes(contexts)
+        
+        vectorize = len(contexts) >= self.vectorize_min_lines and vectorized_available()
+        
+        results = [
+            self.calculate_pricing(context, line_indexes, document_level=True, apply_adjustments=not vectorize)
+            for context in contexts
+        ]
+        
+        if vectorize:
+            self.apply_adjustments_batch(contexts, results)
+        
+        return results
+    
+    def price_cart_lines_parallel(self, contexts: List[PricingContext]) -> Optional[List[PricingResult]]:
+        """
+        Price the lines of a cart across the process pool, see price_cart_lines
+        
+        The cart is split in one contiguous shard per worker, every shard carrying the
+        sync generation and snapshot key of the pinned rule set, and the shards are
+        merged back in input order.
+        
+        Args:
+            contexts: Pricing contexts of the cart lines
+            
+        Returns:
+            PricingResult of every context in the same order, None when the pool failed
+            or a worker could not price with the snapshot of the pinned rule set
+        """
+        rule_set = self._pinned_rule_set()
+        # Workers do not see the synced rows of this process, they skip a book waiting for its refresh
+        use_price_book = self.use_price_book and not rule_set.price_book.stale
+        shards = shard(contexts, self.parallel_workers)
+        try:
+            pool = get_pricing_pool(self.parallel_workers)
+            futures = [pool.submit(price_shard, self.db_path, rule_set.generation,
+                                   rule_set.snapshot_key(use_price_book), lines, use_price_book)
+                       for lines in shards]
+            results = [result for future in futures for result in future.result()]
+        except SnapshotMismatch as e:
+            logger.warning(f"Pricing {len(contexts)} lines in process: {e}")
+            return None
+        except BrokenProcessPool as e:
+            logger.error(f"Pricing pool failed, pricing {len(contexts)} lines in process: {e}")
+            reset_pricing_pool()
+            return None
+        
+        logger.info(f"Priced {len(contexts)} lines across {len(shards)} worker processes")
+        return results
+    
+    def apply_adjustments_batch(self, contexts: List[PricingContext], results: List[PricingResult]):
+        """
+        Apply the unit and line adjustments of a whole cart with the vectorized kernel
+        
+        Lines the kernel leaves aside (no adjustments, or a price too close to a half
+        cent for float rounding) are priced by apply_sage_x3_adjustments. Traced steps
+        go to the sections the cart lines started, see trace_kernel_adjustments.
+        
+        Args:
+            contexts: Pricing contexts of the cart lines
+            results: Results priced with apply_adjustments=False, updated in place
+        """
+        line_adjustments = [
+            [adj for adj in result.adjustments if adj.calculation_basis != 'document'] for result in results
+        ]
+        prices = apply_adjustments_vectorized(
+            [result.base_price for result in results],
+            [context.quantity for context in contexts],
+            line_adjustments
+        )
+        trace = current_trace()
+        first_line = len(trace.lines) - len(results) if trace is not None else 0
+        for position, (context, result, adjustments, price) in enumerate(
+                zip(contexts, results, line_adjustments, prices)):
+            if trace is not None:
+                trace.resume_line(first_line + position)
+            if price is None:
+                price = self.apply_sage_x3_adjustments(result.base_price, adjustments, context)
+            elif trace is not None:
+                self.trace_kernel_adjustments('vectorized', result.base_price, adjustments, context, price)
+            result.unit_price = price
+            if trace is not None:
+                self.trace_result(result, document_level=True)
+    
+    def apply_document_adjustments(self, contexts: List[PricingContext], results: List[PricingResult]):
+        """
+        Apply the document adjustments (CLCRUL=3) of a cart once, on the document total
+        
+        Lines carrying the same adjustment (same column, type and value) share it: a
+        percentage is computed on the sum of their line totals and a fixed amount is
+        taken once, then the adjustment is split back pro rata to the line totals.
+        Document adjustments come after the unit and line adjustments, in column order.
+        
+        Args:
+            contexts: Pricing contexts of the cart lines
+            results: Results priced with document_level=True, updated in place
+        """
+        # Adjustment -> lines carrying it, a line may carry it once per pricing rule
+        shared: Dict[Tuple, List[int]] = {}
+        for position, result in enumerate(results):
+            occurrences: Dict[Tuple, int] = {}
+            for adj in result.adjustments:
+                if adj.calculation_basis != 'document':
+                    continue
+                key = (adj.index, adj.adjustment_type, adj.calculation_type, adj.value)
+                occurrences[key] = occurrences.get(key, 0) + 1
+                shared.setdefault(key + (occurrences[key],), []).append(position)
+        
+        if not shared:
+            return
+        
+        original_totals = [result.unit_price * context.quantity for context, result in zip(contexts, results)]
+        line_totals = list(original_totals)
+        
+        for key in sorted(shared, key=lambda key: (key[0], key[4])):
+            index, adjustment_type, calculation_type, value, _ = key
+            positions = shared[key]
+            
+            if calculation_type == 'percentage_cascading':
+                # Percentage of the original document total
+                weights = [original_totals[position] for position in positions]
+                adjustment_amount = (sum(weights) * value) / Decimal('100')
+            else:
+                # Fixed amount for the whole document, or percentage of its current total
+                weights = [line_totals[position] for position in positions]
+                if calculation_type == 'amount':
+                    adjustment_amount = value
+                else:
+                    adjustment_amount = (sum(weights) * value) / Decimal('100')
+            
+            document_total = sum(weights)
+            if document_total == 0:
+                logger.warning(f"Document adjustment on column {index} skipped, document total is 0")
+                continue
+            
+            logger.debug("Document %s on column %s: %s over %s lines totalling %s",
+                         adjustment_type, index, adjustment_amount, len(positions), document_total)
+            trace = current_trace()
+            if trace is not None:
+                trace.step('document_adjustment', column=index, type=adjustment_type,
+                           calculation_type=calculation_type, value=value, amount=adjustment_amount,
+                           document_total=document_total,
+                           lines=[contexts[position].item_code for position in positions])
+            
+            for position, weight in zip(positions, weights):
+                share = adjustment_amount * weight / document_total
+                if adjustment_type == 'discount':
+                    line_totals[position] -= share
+                else:  # fee
+                    line_totals[position] += share
+        
+        for position in {position for positions in shared.values() for position in positions}:
+            unit_price = line_totals[position] / contexts[position].quantity
+            if unit_price < 0:
+                logger.warning(f"Price calculation resulted in negative value: {unit_price}, setting to 0")
+                unit_price = Decimal('0')
+            results[position].unit_price = unit_price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    
+    def apply_order_total_free_items(self, contexts: List[PricingContext], results: List[PricingResult]):
+        """
+        Evaluate the order total free goods (FOCPRO=4) of a cart once, on the cart totals
+        
+        Each pricing line is evaluated once against the total quantity and the total
+        amount (before adjustments) of the cart, and its free items are given to the
+        first cart line it matched.
+        
+        Args:
+            contexts: Pricing contexts of the cart lines
+            results: Results priced with document_level=True, updated in place
+        """
+        pending: Dict[Tuple, Tuple[int, Dict[str, Any]]] = {}
+        for position, result in enumerate(results):
+            for line in result.order_total_lines:
+                pending.setdefault((line.get('PLI_0'), line.get('PLICRD_0'), line.get('PLILIN_0')), (position, line))
+        
+        if not pending:
+            return
+        
+        total_quantity = sum((context.quantity for context in contexts), Decimal('0'))
+        total_amount = sum((result.base_price * context.quantity for context, result in zip(contexts, results)), Decimal('0'))
+        
+        for position, line in pending.values():
+            foctyp = self.get_rule_catalog().get_free_goods(line.get('PLI_0'))[1] # type: ignore
+            focqtymin = Decimal(str(line.get('FOCQTYMIN_0', '0')))  # Quantity threshold
+            focamtmin = Decimal(str(line.get('FOCAMTMIN_0', '0')))  # Amount threshold
+            focqtybkt = Decimal(str(line.get('FOCQTYBKT_0', '0')))  # Quantity bucket/tranche
+            focamtbkt = Decimal(str(line.get('FOCAMTBKT_0', '0')))  # Amount bucket/tranche
+            focitmref = line.get('FOCITMREF_0', '').strip()  # Free item reference
+            focqty = Decimal(str(line.get('FOCQTY_0', '0')))  # Free quantity per trigger
+            
+            if focqty <= 1:
+                logger.debug("No free item configuration found or invalid")
+                continue
+            
+            logger.debug("Processing order total free items of %s: cart quantity %s, cart amount %s",
+                         line.get('PLICRD_0'), total_quantity, total_amount)
+            
+            order_context = replace(contexts[position], quantity=total_quantity)
+            free_items = self.calculate_order_total_free_items(
+                order_context, foctyp, focqtymin, focqtybkt, focitmref, focqty,
+                total_amount, focamtmin, focamtbkt
+            )
+            results[position].free_items.extend(free_items)
+            trace = current_trace()
+            if trace is not None:
+                trace.step('order_total_free_goods', pricing_line=line.get('PLICRD_0'),
+                           cart_quantity=total_quantity, cart_amount=total_amount,
+                           quantity_threshold=focqtymin, amount_threshold=focamtmin,
+                           awarded_to=contexts[position].item_code, free_items=free_items)
+    
     def apply_sage_x3_adjustments(self, base_price: Decimal, adjustments: List[PriceAdjustment], 
                                   context: PricingContext) -> Decimal:
         """
@@ -881,13 +1730,61 @@ class SageX3PricingEngine:
         This method handles the different calculation bases correctly:
         - Par Unité (CLCRUL=1): Applied directly to unit price
         - Par Ligne (CLCRUL=2): Applied to line total, then distributed back to unit price  
-        - Par Document (CLCRUL=3): Applied to document total (approximated as line total)
+        - Par Document (CLCRUL=3): Left to apply_document_adjustments, on the document total
         
         And the different percentage calculation types correctly:
         - Cumulative percentages are applied to the running total
         - Cascading percentages are always applied to the original base price/total
         - Fixed amounts are applied directly
         
+        Engines created with use_minor_units compute them with scaled integers
+        (apply_adjustments_minor_units), falling back to apply_decimal_adjustments
+        whenever the integer result would not be exact.
+        
+        Args:
+            base_price: The original unit price before adjustments
+            adjustments: List of PriceAdjustment objects
+            context: Pricing context for line/document calculations
+            
+        Returns:
+            Final unit price after all adjustments have been applied
+        """
+        if not adjustments or base_price == 0:
+            return base_price
+        
+        if self.use_minor_units:
+            final_price = apply_adjustments_minor_units(base_price, adjustments, context.quantity)
+            if final_price is not None:
+                if current_trace() is not None:
+                    self.trace_kernel_adjustments('minor_units', base_price, adjustments, context, final_price)
+                return final_price
+        
+        return self.apply_decimal_adjustments(base_price, adjustments, context)
+    
+    def trace_kernel_adjustments(self, path: str, base_price: Decimal, adjustments: List[PriceAdjustment],
+                                 context: PricingContext, unit_price: Decimal):
+        """
+        Record the adjustments of a line priced by the scaled integer or vectorized kernel
+        
+        The kernels keep no intermediate values, the column steps are those of
+        apply_decimal_adjustments. The price returned by the kernel is the one kept.
+        
+        Args:
+            path: 'minor_units' or 'vectorized'
+            base_price: The original unit price before adjustments
+            adjustments: Adjustments applied by the kernel
+            context: Pricing context
+            unit_price: Unit price computed by the kernel
+        """
+        decimal_price = self.apply_decimal_adjustments(base_price, adjustments, context)
+        current_trace().step('adjustment_path', path=path, unit_price=unit_price, # type: ignore
+                             decimal_unit_price=decimal_price)
+    
+    def apply_decimal_adjustments(self, base_price: Decimal, adjustments: List[PriceAdjustment],
+                                  context: PricingContext) -> Decimal:
+        """
+        Apply all adjustments with Decimal arithmetic, see apply_sage_x3_adjustments
+        
         Args:
             base_price: The original unit price before adjustments
             adjustments: List of PriceAdjustment objects
@@ -899,8 +1796,10 @@ class SageX3PricingEngine:
         if not adjustments or base_price == 0:
             return base_price
         
-        # Sort adjustments by index to ensure consistent application order
-        sorted_adjustments = sorted(adjustments, key=lambda adj: adj.index)
+        # Sort adjustments by index to ensure consistent application order, document
+        # adjustments are applied on the cart total by apply_document_adjustments
+        sorted_adjustments = sorted((adj for adj in adjustments if adj.calculation_basis != 'document'),
+                                    key=lambda adj: adj.index)
         
         current_unit_price = base_price
         original_base_price = base_price
@@ -912,127 +1811,72 @@ class SageX3PricingEngine:
         total_line_discounts = Decimal('0')
         total_line_fees = Decimal('0')
         
-        print(f"\n=== SAGE X3 ADJUSTMENT CALCULATION DETAILS ===")
-        print(f"Base unit price: {base_price} {context.currency}")
-        print(f"Quantity: {context.quantity}")
-        print(f"Original line total: {original_line_total} {context.currency}")
-        print(f"Processing {len(sorted_adjustments)} adjustments in order:\n")
-
-        
+        trace = current_trace()
         
-        logger.debug(f"Applying {len(sorted_adjustments)} adjustments to base price: {base_price}")
-        logger.debug(f"Quantity: {context.quantity}, Original line total: {original_line_total}")
+        logger.debug("Applying %s adjustments to base price: %s, quantity: %s, original line total: %s",
+                     len(sorted_adjustments), base_price, context.quantity, original_line_total)
         
-        for i, adjustment in enumerate(sorted_adjustments):
-            print(f"--- Adjustment {i+1}: Column {adjustment.index} ---")
-            print(f"Type: {adjustment.adjustment_type.upper()}")
-            print(f"Description: {adjustment.description}")
-            print(f"Value: {adjustment.value}")
-            print(f"Calculation Type: {adjustment.calculation_type}")
-            print(f"Calculation Basis: {adjustment.calculation_basis}")
-            print(f"Flags: INCDCR={adjustment.incdcr_flag}, VALTYP={adjustment.valtyp_flag}, CLCRUL={adjustment.clcrul_flag}")
-            
+        for adjustment in sorted_adjustments:
             adjustment_amount = Decimal('0')
             
             # Calculate adjustment amount based on basis (CLCRUL)
             if adjustment.calculation_basis == 'unit':  # CLCRUL=1 - Par Unité
-                print(f"Applying to UNIT PRICE:")
-                
                 if adjustment.calculation_type == 'amount':
                     # Fixed amount per unit
                     adjustment_amount = adjustment.value
-                    print(f"  Fixed amount per unit: {adjustment_amount} {context.currency}")
                     
                 elif adjustment.calculation_type == 'percentage_cumulative':
                     # Percentage of current unit price
                     adjustment_amount = (current_unit_price * adjustment.value) / Decimal('100')
-                    print(f"  Cumulative %: {current_unit_price} × {adjustment.value}% = {adjustment_amount} {context.currency}")
                     
                 elif adjustment.calculation_type == 'percentage_cascading':
                     # Percentage of original unit price
                     adjustment_amount = (original_base_price * adjustment.value) / Decimal('100')
-                    print(f"  Cascading %: {original_base_price} × {adjustment.value}% = {adjustment_amount} {context.currency}")
                 
                 # Apply to unit price
                 if adjustment.adjustment_type == 'discount':
                     current_unit_price -= adjustment_amount
                     total_unit_discounts += adjustment_amount
-                    print(f"  Unit price after discount: {current_unit_price} {context.currency}")
                 else:  # fee
                     current_unit_price += adjustment_amount
                     total_unit_fees += adjustment_amount
-                    print(f"  Unit price after fee: {current_unit_price} {context.currency}")
                 
                 # Update line total to reflect unit price change
                 current_line_total = current_unit_price * context.quantity
-                print(f"  New line total: {current_line_total} {context.currency}")
                 
             elif adjustment.calculation_basis == 'line':  # CLCRUL=2 - Par Ligne
-                print(f"Applying to LINE TOTAL:")
-                
                 if adjustment.calculation_type == 'amount':
                     # Fixed amount for entire line (not per unit!)
                     adjustment_amount = adjustment.value
-                    print(f"  Fixed amount for entire line: {adjustment_amount} {context.currency}")
                     
                 elif adjustment.calculation_type == 'percentage_cumulative':
                     # Percentage of current line total
                     adjustment_amount = (current_line_total * adjustment.value) / Decimal('100')
-                    print(f"  Cumulative %: {current_line_total} × {adjustment.value}% = {adjustment_amount} {context.currency}")
                     
                 elif adjustment.calculation_type == 'percentage_cascading':
                     # Percentage of original line total (ALWAYS original, not current)
                     adjustment_amount = (original_line_total * adjustment.value) / Decimal('100')
-                    print(f"  Cascading %: {original_line_total} × {adjustment.value}% = {adjustment_amount} {context.currency}")
                 
                 # Apply to line total
                 if adjustment.adjustment_type == 'discount':
                     current_line_total -= adjustment_amount
                     total_line_discounts += adjustment_amount
-                    print(f"  Line total after discount: {current_line_total} {context.currency}")
                 else:  # fee
                     current_line_total += adjustment_amount
                     total_line_fees += adjustment_amount
-                    print(f"  Line total after fee: {current_line_total} {context.currency}")
                 
                 # Update unit price to reflect line total change
                 current_unit_price = current_line_total / context.quantity
-                print(f"  Impact on unit price: {current_line_total} ÷ {context.quantity} = {current_unit_price} {context.currency}")
-                
-            elif adjustment.calculation_basis == 'document':  # CLCRUL=3 - Par Document
-                print(f"Applying to DOCUMENT TOTAL (approximated as line total):")
-                logger.warning("Document-level calculation approximated as line-level (single line context)")
-                
-                if adjustment.calculation_type == 'amount':
-                    # Fixed amount for entire document
-                    adjustment_amount = adjustment.value
-                    print(f"  Fixed amount for entire document: {adjustment_amount} {context.currency}")
-                    
-                elif adjustment.calculation_type == 'percentage_cumulative':
-                    # In real Sage X3, this would be % of current document total
-                    adjustment_amount = (current_line_total * adjustment.value) / Decimal('100')
-                    print(f"  Cumulative % (approx): {current_line_total} × {adjustment.value}% = {adjustment_amount} {context.currency}")
-                    
-                elif adjustment.calculation_type == 'percentage_cascading':
-                    # In real Sage X3, this would be % of original document total
-                    adjustment_amount = (original_line_total * adjustment.value) / Decimal('100')
-                    print(f"  Cascading % (approx): {original_line_total} × {adjustment.value}% = {adjustment_amount} {context.currency}")
-                
-                # Apply to line total (approximating document total)
-                if adjustment.adjustment_type == 'discount':
-                    current_line_total -= adjustment_amount
-                    total_line_discounts += adjustment_amount
-                    print(f"  Line total after discount: {current_line_total} {context.currency}")
-                else:  # fee
-                    current_line_total += adjustment_amount
-                    total_line_fees += adjustment_amount
-                    print(f"  Line total after fee: {current_line_total} {context.currency}")
                 
-                # Update unit price to reflect line total change
-                current_unit_price = current_line_total / context.quantity
-                print(f"  Impact on unit price: {current_line_total} ÷ {context.quantity} = {current_unit_price} {context.currency}")
-            
-            print()  # Blank line for readability
+            if trace is not None:
+                trace.step('adjustment', column=adjustment.index, description=adjustment.description,
+                           type=adjustment.adjustment_type, value=adjustment.value,
+                           calculation_type=adjustment.calculation_type,
+                           calculation_basis=adjustment.calculation_basis,
+                           flags={'INCDCR': adjustment.incdcr_flag, 'VALTYP': adjustment.valtyp_flag,
+                                  'CLCRUL': adjustment.clcrul_flag},
+                           amount=adjustment_amount, unit_price=current_unit_price,
+                           line_total=current_line_total)
         
         # Ensure price doesn't go negative
         if current_unit_price < 0:
@@ -1042,34 +1886,26 @@ class SageX3PricingEngine:
         # Round to appropriate decimal places (typically 2 for currency)
         final_price = current_unit_price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
         
-        # Summary
-        print("=== ADJUSTMENT SUMMARY ===")
-        print(f"Original unit price: {base_price} {context.currency}")
-        if total_unit_discounts > 0:
-            print(f"Total unit discounts: -{total_unit_discounts} {context.currency}")
-        if total_unit_fees > 0:
-            print(f"Total unit fees: +{total_unit_fees} {context.currency}")
-        if total_line_discounts > 0:
-            line_impact_per_unit = total_line_discounts / context.quantity
-            print(f"Total line discounts: -{total_line_discounts} {context.currency} (impact per unit: -{line_impact_per_unit} {context.currency})")
-        if total_line_fees > 0:
-            line_impact_per_unit = total_line_fees / context.quantity
-            print(f"Total line fees: +{total_line_fees} {context.currency} (impact per unit: +{line_impact_per_unit} {context.currency})")
-        print(f"Final unit price: {final_price} {context.currency}")
-        print(f"Final line total: {final_price * context.quantity} {context.currency}")
-        print("=" * 50)
-        
-        logger.info(f"Sage X3 adjustment summary: Base price: {base_price}, "
-                   f"Unit discounts: -{total_unit_discounts}, Unit fees: +{total_unit_fees}, "
-                   f"Line discounts: -{total_line_discounts}, Line fees: +{total_line_fees}, "
-                   f"Final unit price: {final_price}")
-        logger.info(f"Final line total: {final_price * context.quantity}")
+        logger.debug("Sage X3 adjustment summary: Base price: %s, Unit discounts: -%s, Unit fees: +%s, "
+                     "Line discounts: -%s, Line fees: +%s, Final unit price: %s",
+                     base_price, total_unit_discounts, total_unit_fees,
+                     total_line_discounts, total_line_fees, final_price)
+        
+        if trace is not None:
+            trace.step('adjustment_summary', base_price=base_price,
+                       unit_discounts=total_unit_discounts, unit_fees=total_unit_fees,
+                       line_discounts=total_line_discounts, line_fees=total_line_fees,
+                       unit_price=final_price, line_total=final_price * context.quantity)
         
         return final_price
     
     def apply_currency_conversion(self, result: PricingResult, context: PricingContext) -> PricingResult:
         """
-        Apply currency conversion if needed
+        Convert a result priced from lines in another currency to the order currency
+        
+        The base price and the amount adjustments are converted with the TABCHANGE
+        rate effective on the order date and rounded to the price precision, before
+        the adjustments are applied. Percentages are left unchanged.
         
         Args:
             result: Current pricing result
@@ -1078,13 +1914,40 @@ class SageX3PricingEngine:
         Returns:
             Updated pricing result
         """
-        # Currency conversion logic would go here
-        # For now, assuming no conversion is needed
+        if result.currency == context.currency:
+            return result
+        
+        rate = self.get_exchange_rates().rate(result.currency, context.currency,
+                                              context.order_date.strftime('%Y-%m-%d %H:%M:%S'))
+        if rate is None:
+            logger.warning(f"No exchange rate from {result.currency} to {context.currency}, price left unconverted")
+            return result
+        
+        step = Decimal(1).scaleb(-PRICE_DECIMALS)
+        result.base_price = (result.base_price * rate).quantize(step, rounding=ROUND_HALF_UP)
+        result.unit_price = (result.unit_price * rate).quantize(step, rounding=ROUND_HALF_UP)
+        result.adjustments = [
+            replace(adj, value=(adj.value * rate).quantize(step, rounding=ROUND_HALF_UP))
+            if adj.calculation_type == 'amount' else adj
+            for adj in result.adjustments
+        ]
+        result.source_currency = result.currency
+        result.currency = context.currency
+        
+        trace = current_trace()
+        if trace is not None:
+            trace.step('currency_conversion', source_currency=result.source_currency, currency=result.currency,
+                       rate=rate, base_price=result.base_price)
+        
         return result
     
     def apply_unit_conversion(self, result: PricingResult, context: PricingContext) -> PricingResult:
         """
-        Apply unit of measure conversion if needed
+        Convert a result priced from lines in another unit to the ordered unit
+        
+        The base price and the per unit amount adjustments are multiplied by the number
+        of line units in one ordered unit and rounded to the price precision, before
+        the adjustments are applied. Line and document amounts are left unchanged.
         
         Args:
             result: Current pricing result
@@ -1093,10 +1956,71 @@ class SageX3PricingEngine:
         Returns:
             Updated pricing result
         """
-        # Unit conversion logic would go here
-        # For now, assuming no conversion is needed
+        if result.unit_of_measure == context.unit_of_measure:
+            return result
+        
+        ratio = self.get_unit_factors().ratio(context.item_code, context.unit_of_measure, result.unit_of_measure)
+        if ratio is None:
+            logger.warning(f"No conversion from {result.unit_of_measure} to {context.unit_of_measure} "
+                           f"for item {context.item_code}, price left unconverted")
+            return result
+        
+        step = Decimal(1).scaleb(-PRICE_DECIMALS)
+        result.base_price = (result.base_price * ratio).quantize(step, rounding=ROUND_HALF_UP)
+        result.unit_price = (result.unit_price * ratio).quantize(step, rounding=ROUND_HALF_UP)
+        result.adjustments = [
+            replace(adj, value=(adj.value * ratio).quantize(step, rounding=ROUND_HALF_UP))
+            if adj.calculation_type == 'amount' and adj.calculation_basis == 'unit' else adj
+            for adj in result.adjustments
+        ]
+        result.source_unit_of_measure = result.unit_of_measure
+        result.unit_of_measure = context.unit_of_measure
+        
+        trace = current_trace()
+        if trace is not None:
+            trace.step('unit_conversion', source_unit=result.source_unit_of_measure, unit=result.unit_of_measure,
+                       ratio=ratio, base_price=result.base_price)
+        
         return result
 
+_shared_engines: Dict[str, SageX3PricingEngine] = {}
+_shared_engines_lock = threading.Lock()
+
+def get_pricing_engine(db_path: str) -> SageX3PricingEngine:
+    """
+    Get the process-wide pricing engine of a database
+    
+    The engine is shared by all request threads: each thread gets its own connection
+    while structure, rule and line caches are kept between requests until the next sync.
+    
+    Args:
+        db_path: Path to the SQLite database file
+        
+    Returns:
+        Shared SageX3PricingEngine
+    """
+    with _shared_engines_lock:
+        engine = _shared_engines.get(db_path)
+        if engine is None:
+            engine = SageX3PricingEngine(db_path)
+            _shared_engines[db_path] = engine
+        return engine
+
+def init_pricing_engine(db: Session):
+    """Create the shared pricing engine of the configured database and warm its caches"""
+    db_path = get_db_file(db)
+    if not db_path:
+        logger.warning("No database configured, pricing engine not warmed up")
+        return
+    ensure_typed_pricing_lines(db_path)
+    engine = get_pricing_engine(db_path)
+    if refresh_synced_price_books(db_path):
+        engine.warm_up()
+        engine.reload_price_book()  # The rule set of the sync was built before the refresh
+    else:
+        ensure_price_books(db_path)
+        engine.warm_up()
+
 # Utility functions for testing and demonstration
 def create_sample_context(input: PricingInput) -> PricingContext:
     """Create a sample pricing context for testing"""
@@ -1329,6 +2253,232 @@ def test_pricing_engine_complete(input_contexts: List[PricingInput], db: Session
         ))
         return output_result
 
+def build_pricing_output(context: PricingContext, result: PricingResult) -> PricingOutput:
+    """Build the API output of a priced line"""
+    line_total_before = result.base_price * context.quantity
+    line_total_after = result.unit_price * context.quantity
+    return PricingOutput(
+        item_code=context.item_code,
+        prix_brut=float(Decimal(line_total_before) / Decimal(context.quantity)),
+        prix_net=float(Decimal(line_total_after) / Decimal(context.quantity)),
+        total_HT=float(line_total_after),
+        gratuit=result.free_items # type: ignore
+    )
+
+def get_pricing_cache_stats(db: Session) -> Dict[str, int]:
+    """Get the result cache counters of the shared pricing engine"""
+    db_path = get_db_file(db)
+    return get_pricing_engine(db_path).get_result_cache_stats() # type: ignore
+
+def get_customer_price_book(customer_code: str, db: Session) -> List[PriceBookOutput]:
+    """
+    Get the precomputed prices of a customer assortment
+    
+    Args:
+        customer_code: BPCNUM_0 of the customer
+        db: Session on the configuration database
+        
+    Returns:
+        PriceBookOutput of every item of the assortment
+    """
+    db_path = get_db_file(db)
+    engine = get_pricing_engine(db_path) # type: ignore
+    return [
+        PriceBookOutput(
+            item_code=entry['ITMREF_0'],
+            unit_of_measure=entry['UOM_0'],
+            currency=entry['CUR_0'],
+            pricing_rule=entry['PLI_0'],
+            prix_brut=float(entry['BASPRI_0']),
+            prix_net=float(entry['NETPRI_0']),
+            valid_from=entry['STRDAT_0'],
+            valid_to=entry['ENDDAT_0'],
+            quantity_min=entry['QTYMIN_0'],
+            quantity_max=entry['QTYMAX_0'],
+            updated=entry['UPDDAT_0']
+        )
+        for entry in read_customer_price_book(engine.connection, customer_code)
+    ]
+
+def calculate_cart_pricing(input_contexts: List[PricingInput], db: Session) -> List[PricingOutput]:
+    """
+    Price all the lines of a cart in one batch
+    
+    Args:
+        input_contexts: Cart lines to price
+        db: Session on the configuration database
+        
+    Returns:
+        PricingOutput of every line, in input order
+    """
+    db_path = get_db_file(db)
+    contexts = [create_sample_context(input_context) for input_context in input_contexts]
+    
+    engine = get_pricing_engine(db_path) # type: ignore
+    results = engine.calculate_pricing_batch(contexts)
+    
+    return [build_pricing_output(context, result) for context, result in zip(contexts, results)]
+
+def calculate_taxed_cart_pricing(input_cart: PricingTaxedCartInput, db: Session) -> PricingTaxedCartOutput:
+    """
+    Price and tax all the lines of a cart in one pass
+    
+    Lines are priced in one batch by the shared engine, then taxed from the compiled
+    tax decision table at their order date. The tax regime defaults to the one of
+    the customer of the first line. Totals are those of CreateCommandRequest, the
+    valuation (valo_ht, valo_ttc) equals the line totals as no invoicing element
+    is added here. A line without tax code or rate, or of an unknown customer
+    regime, carries the reason in erreur and no TTC amount, and the cart has no
+    TTC total then.
+    
+    Args:
+        input_cart: Tax regime, company group and cart lines to price
+        db: Session on the configuration database
+        
+    Returns:
+        PricingTaxedCartOutput with HT and TTC amounts of every line, in input order
+    """
+    db_path = get_db_file(db)
+    contexts = [create_sample_context(input_context) for input_context in input_cart.lines]
+    
+    engine = get_pricing_engine(db_path) # type: ignore
+    results = engine.calculate_pricing_batch(contexts)
+    
+    regime_taxe = input_cart.regime_taxe
+    if regime_taxe is None and contexts:
+        row = engine.connection.execute(
+            "SELECT VACBPR_0 FROM BPCUSTOMER WHERE BPCNUM_0 = ?", (contexts[0].customer_code,)
+        ).fetchone()
+        regime_taxe = row[0] if row is not None else None
+    regime_erreur = None
+    if not regime_taxe and contexts:
+        regime_erreur = f"Régime de taxe du client {contexts[0].customer_code} inconnu"
+        logger.warning(f"{regime_erreur}, cart lines are not taxed")
+    regime_taxe = regime_taxe or ''
+    
+    determinateur = DeterminationTaxeLot(get_table_decision(db_path)) # type: ignore
+    legislation = determinateur.legislation(regime_taxe)
+    step = Decimal(1).scaleb(-PRICE_DECIMALS)
+    
+    lines = []
+    total_ht = Decimal('0')
+    total_ttc: Optional[Decimal] = Decimal('0')
+    for context, result in zip(contexts, results):
+        output = build_pricing_output(context, result)
+        line_ht = result.unit_price * context.quantity
+        total_ht += line_ht
+        line = PricingTaxedLine(
+            item_code=context.item_code,
+            quantity=str(context.quantity),
+            prix_brut=output.prix_brut,
+            prix_net_ht=output.prix_net,
+            total_HT=output.total_HT,
+            gratuit=output.gratuit
+        )
+        lines.append(line)
+        
+        taxe = {'erreur': regime_erreur} if regime_erreur else determinateur.determiner_code_taxe({
+            'regime_taxe_tiers': regime_taxe,
+            'niveau_taxe_article': determinateur.niveau_taxe_article(context.item_code),
+            'legislation': legislation,
+            'groupe_societe': input_cart.groupe_societe,
+            'date_commande': context.order_date
+        })
+        if 'erreur' in taxe:
+            line.erreur = taxe['erreur']
+            total_ttc = None
+            logger.warning(f"Cart line {context.item_code} not taxed: {line.erreur}")
+            continue
+        
+        taux = Decimal(str(taxe['taux'] or 0))
+        coefficient = 1 + taux / 100
+        line_ttc = (line_ht * coefficient).quantize(step, rounding=ROUND_HALF_UP)
+        line.prix_net_ttc = float((result.unit_price * coefficient).quantize(step, rounding=ROUND_HALF_UP))
+        line.code_taxe = taxe['code_taxe']
+        line.taux = float(taux)
+        line.total_TTC = float(line_ttc)
+        if total_ttc is not None:
+            total_ttc += line_ttc
+    
+    return PricingTaxedCartOutput(
+        regime_taxe=regime_taxe,
+        total_ht=float(total_ht),
+        total_ttc=None if total_ttc is None else float(total_ttc),
+        valo_ht=float(total_ht),
+        valo_ttc=None if total_ttc is None else float(total_ttc),
+        lines=lines
+    )
+
+def calculate_quantity_ladder(input_ladder: PricingLadderInput, db: Session) -> PricingLadderOutput:
+    """
+    Price one customer and item at every quantity of a ladder
+    
+    Args:
+        input_ladder: Customer, item and quantities to price
+        db: Session on the configuration database
+        
+    Returns:
+        PricingLadderOutput with one step per quantity, in input order
+    """
+    db_path = get_db_file(db)
+    context = PricingContext(
+        customer_code=input_ladder.customer_code,
+        item_code=input_ladder.item_code,
+        quantity=Decimal('1'),
+        currency=input_ladder.currency,
+        unit_of_measure=input_ladder.unit_of_measure,
+        order_date=input_ladder.order_date
+    )
+    quantities = [Decimal(quantity) for quantity in input_ladder.quantities]
+    
+    engine = get_pricing_engine(db_path) # type: ignore
+    results = engine.calculate_price_ladder(context, quantities)
+    
+    ladder = []
+    for quantity, result in zip(quantities, results):
+        output = build_pricing_output(replace(context, quantity=quantity), result)
+        ladder.append(PricingLadderStep(
+            quantity=str(quantity),
+            prix_brut=output.prix_brut,
+            prix_net=output.prix_net,
+            gratuit=output.gratuit,
+            total_HT=output.total_HT
+        ))
+    
+    return PricingLadderOutput(
+        customer_code=context.customer_code,
+        item_code=context.item_code,
+        currency=context.currency,
+        unit_of_measure=context.unit_of_measure,
+        ladder=ladder
+    )
+
+def explain_cart_pricing(input_contexts: List[PricingInput], db: Session) -> PricingExplainOutput:
+    """
+    Price a cart like calculate_cart_pricing and return the steps behind every price
+    
+    Args:
+        input_contexts: Cart lines to price
+        db: Session on the configuration database
+        
+    Returns:
+        PricingExplainOutput with the output and trace of every line, and the document steps
+    """
+    db_path = get_db_file(db)
+    contexts = [create_sample_context(input_context) for input_context in input_contexts]
+    
+    engine = get_pricing_engine(db_path) # type: ignore
+    with pricing_trace() as trace:
+        results = engine.calculate_pricing_batch(contexts)
+    
+    return PricingExplainOutput(
+        lines=[
+            PricingExplainLine(output=build_pricing_output(context, result), trace=line_trace)
+            for context, result, line_trace in zip(contexts, results, trace.lines)
+        ],
+        document=trace.document
+    )
+
 def explain_sage_x3_pricing_structure():
     """
     Explain how the Sage X3 pricing structure works
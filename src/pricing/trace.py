@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional
+
+
+def _jsonable(value: Any) -> Any:
+    """Convert trace values to JSON friendly types"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+class PricingTrace:
+    """
+    Steps of a pricing calculation, grouped by priced line
+
+    Steps recorded while pricing a line go to that line, the cart pass steps
+    (document adjustments, order total free goods) go to the document.
+    """
+
+    def __init__(self):
+        self.lines: List[Dict[str, Any]] = []
+        self.document: List[Dict[str, Any]] = []
+        self._steps: Optional[List[Dict[str, Any]]] = None
+
+    def begin_line(self, context: Any):
+        """Start the steps of a pricing context"""
+        section = {
+            'item_code': context.item_code,
+            'customer_code': context.customer_code,
+            'quantity': _jsonable(context.quantity),
+            'currency': context.currency,
+            'unit_of_measure': context.unit_of_measure,
+            'order_date': _jsonable(context.order_date),
+            'steps': [],
+        }
+        self.lines.append(section)
+        self._steps = section['steps']
+
+    def resume_line(self, position: int):
+        """Record the next steps in a line already started, by position"""
+        self._steps = self.lines[position]['steps']
+
+    def begin_document(self):
+        """Start the cart level steps"""
+        self._steps = self.document
+
+    def step(self, name: str, **data: Any):
+        """Record a step of the current line, or of the document outside of a line"""
+        steps = self._steps if self._steps is not None else self.document
+        steps.append({'step': name, **_jsonable(data)})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'lines': self.lines, 'document': self.document}
+
+
+_current_trace: ContextVar[Optional[PricingTrace]] = ContextVar('pricing_trace', default=None)
+
+
+def current_trace() -> Optional[PricingTrace]:
+    """Trace of the running request, None when tracing is off"""
+    return _current_trace.get()
+
+
+@contextmanager
+def pricing_trace() -> Iterator[PricingTrace]:
+    """Record the pricing steps of the calculations run inside the block"""
+    trace = PricingTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
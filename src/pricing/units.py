@@ -0,0 +1,84 @@
+import sqlite3
+import logging
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ITMMASTER units and their coefficient to the stock unit, in fallback order
+UNIT_FIELDS = (('SAU_0', 'SAUSTUCOE_0'), ('STU_0', None), ('PUU_0', 'PUUSTUCOE_0'))
+
+
+def _coefficient(value) -> Optional[Decimal]:
+    """Positive conversion coefficient, None when unset or invalid"""
+    try:
+        coefficient = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    return coefficient if coefficient > 0 else None
+
+
+@dataclass
+class ItemUnitFactors:
+    """
+    Units of every item with their coefficient to the stock unit, for one sync generation
+
+    Read from ITMMASTER: the stock unit (STU_0) counts for 1, the sales unit
+    (SAU_0) for SAUSTUCOE_0 and the purchase unit (PUU_0) for PUUSTUCOE_0.
+    """
+    generation: int
+    factors: Dict[str, Dict[str, Decimal]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, connection: sqlite3.Connection, generation: int) -> 'ItemUnitFactors':
+        """
+        Read the unit coefficients of every item from the ITMMASTER table
+
+        Args:
+            connection: Open connection using sqlite3.Row as row factory
+            generation: Sync generation the coefficients are read at
+
+        Returns:
+            ItemUnitFactors for the given generation
+        """
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(ITMMASTER)")}
+        wanted = ['ITMREF_0'] + [name for fields in UNIT_FIELDS for name in fields if name]
+        selected = [name for name in wanted if name in columns]
+
+        factors: Dict[str, Dict[str, Decimal]] = {}
+        if 'ITMREF_0' in columns and 'STU_0' in columns:
+            cursor = connection.execute(f"SELECT {', '.join(selected)} FROM ITMMASTER")
+            for row in cursor.fetchall():
+                row = dict(zip(selected, row))
+                units: Dict[str, Decimal] = {}
+                for unit_field, coefficient_field in UNIT_FIELDS:
+                    unit = (row.get(unit_field) or '').strip()
+                    coefficient = _coefficient(row.get(coefficient_field)) if coefficient_field else Decimal('1')
+                    if unit and coefficient is not None:
+                        units.setdefault(unit, coefficient)
+                if len(units) > 1:
+                    factors[row['ITMREF_0']] = units
+        else:
+            logger.warning("ITMMASTER has no stock unit, no unit conversion loaded")
+
+        logger.info(f"Loaded unit coefficients of {len(factors)} items (sync generation {generation})")
+        return cls(generation=generation, factors=factors)
+
+    def units(self, item_code: str) -> List[str]:
+        """Units of an item: sales, stock then purchase unit"""
+        return list(self.factors.get(item_code, {}))
+
+    def ratio(self, item_code: str, from_unit: str, to_unit: str) -> Optional[Decimal]:
+        """
+        Number of to_unit in one from_unit of an item
+
+        Returns:
+            Conversion ratio, None when the item does not know one of the units
+        """
+        if from_unit == to_unit:
+            return Decimal('1')
+        units = self.factors.get(item_code, {})
+        if from_unit not in units or to_unit not in units:
+            return None
+        return units[from_unit] / units[to_unit]
@@ -0,0 +1,108 @@
+import logging
+from decimal import Decimal
+from operator import attrgetter
+from typing import List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the scalar engine is used without it
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Carts from this many lines have their adjustments applied by the vectorized kernel
+VECTORIZE_MIN_LINES = 256
+
+# Lines closer than this to a half cent (in cents, relative to the price) are
+# left to the scalar engine, float rounding could land them on the wrong side
+TIE_EPSILON = 1e-9
+
+_CALCULATION_TYPES = {'amount': 1, 'percentage_cumulative': 2, 'percentage_cascading': 3}
+_BASES = {'unit': 1, 'line': 2}  # Document adjustments are applied on the cart total
+
+_by_index = attrgetter('index')
+
+_unavailable_logged = False
+
+
+def vectorized_available() -> bool:
+    """Whether NumPy can be imported, logged once when it cannot"""
+    global _unavailable_logged
+    if np is None and not _unavailable_logged:
+        _unavailable_logged = True
+        logger.warning("NumPy is not installed, large carts are priced without the vectorized kernel")
+    return np is not None
+
+
+def apply_adjustments_vectorized(base_prices: List[Decimal], quantities: List[Decimal],
+                                 adjustments: List[list]) -> List[Optional[Decimal]]:
+    """
+    Apply the adjustments of many lines at once
+
+    The adjustments of every line are sorted by column and laid out in slots, the
+    n-th slot holding the n-th adjustment of each line. Slots are applied one after
+    the other with array operations, following the steps of
+    SageX3PricingEngine.apply_decimal_adjustments in float64, then rounded to 0.01
+    half up. Lines the scalar engine has to price are returned as None: lines
+    without adjustments or base price, and lines whose price falls too close to a
+    half cent for float rounding to be trusted.
+
+    Args:
+        base_prices: Unit price before adjustments of every line
+        quantities: Quantity of every line
+        adjustments: PriceAdjustment objects of every line
+
+    Returns:
+        Final unit price of every line, None for the lines left to the scalar engine
+    """
+    count = len(base_prices)
+    rows = [i for i in range(count) if adjustments[i] and base_prices[i] != 0 and quantities[i] > 0]
+    prices: List[Optional[Decimal]] = [None] * count
+    if not rows:
+        return prices
+
+    slots = max(len(adjustments[i]) for i in rows)
+    values = np.zeros((slots, len(rows)))
+    signs = np.zeros((slots, len(rows)))
+    calculation_types = np.zeros((slots, len(rows)), dtype=np.int8)
+    bases = np.zeros((slots, len(rows)), dtype=np.int8)
+    for column, i in enumerate(rows):
+        for slot, adjustment in enumerate(sorted(adjustments[i], key=_by_index)):
+            values[slot, column] = float(adjustment.value)
+            signs[slot, column] = -1.0 if adjustment.adjustment_type == 'discount' else 1.0
+            calculation_types[slot, column] = _CALCULATION_TYPES.get(adjustment.calculation_type, 0)
+            bases[slot, column] = _BASES.get(adjustment.calculation_basis, 0)
+
+    quantity = np.array([float(quantities[i]) for i in rows])
+    unit = np.array([float(base_prices[i]) for i in rows])
+    line = unit * quantity
+    original_unit = unit.copy()
+    original_line = line.copy()
+
+    for slot in range(slots):
+        per_unit = bases[slot] == 1
+        per_line = bases[slot] == 2
+        current = np.where(per_unit, unit, line)
+        original = np.where(per_unit, original_unit, original_line)
+        calculation_type = calculation_types[slot]
+        amount = np.select(
+            [calculation_type == 1, calculation_type == 2, calculation_type == 3],
+            [values[slot], current * values[slot] / 100.0, original * values[slot] / 100.0],
+            0.0
+        ) * signs[slot]
+        adjusted = current + amount
+        unit = np.select([per_unit, per_line], [adjusted, adjusted / quantity], unit)
+        line = np.select([per_unit, per_line], [adjusted * quantity, adjusted], line)
+
+    cents = np.maximum(unit, 0.0) * 100.0
+    rounded = np.floor(cents + 0.5)
+    fraction = cents - np.floor(cents)
+    near_tie = np.abs(fraction - 0.5) <= TIE_EPSILON * np.maximum(cents, 1.0)
+
+    for column, i in enumerate(rows):
+        if not near_tie[column]:
+            prices[i] = Decimal(int(rounded[column])).scaleb(-2)
+
+    logger.debug("Vectorized adjustments of %s lines, %s left to the scalar engine",
+                 len(rows), int(near_tie.sum()))
+    return prices
@@ -1,5 +1,6 @@
 import sqlite3
 from typing import Dict
+from ..table_decision import compiler_critere_taxlink
 
 
 class DeterminationTaxe:
@@ -149,34 +150,7 @@ class DeterminationTaxe:
         """
         Évaluation d'un critère TAXLINK individuel
         """
-        champ = critere.get('CHAMP')
-        operateur = critere.get('OPERATEUR', '=')
-        valeur_attendue = critere.get('VALEUR')
-        valeur_contexte = contexte.get(champ)
-        
-        if not champ or valeur_attendue is None:
-            return True
-        
-        # Évaluation selon l'opérateur
-        if operateur == '=':
-            return valeur_contexte == valeur_attendue
-        elif operateur == '!=':
-            return valeur_contexte != valeur_attendue
-        elif operateur == '>':
-            return valeur_contexte and valeur_contexte > valeur_attendue
-        elif operateur == '<':
-            return valeur_contexte and valeur_contexte < valeur_attendue
-        elif operateur == '>=':
-            return valeur_contexte and valeur_contexte >= valeur_attendue
-        elif operateur == '<=':
-            return valeur_contexte and valeur_contexte <= valeur_attendue
-        elif operateur == 'LIKE':
-            return valeur_contexte and valeur_attendue in valeur_contexte
-        elif operateur == 'IN':
-            liste_valeurs = valeur_attendue.split(',')
-            return valeur_contexte in liste_valeurs
-        
-        return True
+        return compiler_critere_taxlink(critere)(contexte)
     
     def _verifier_coherence_legislation_groupe(self, regle: Dict):
         """
@@ -0,0 +1,60 @@
+import logging
+from datetime import date
+from typing import Optional
+
+from . import DeterminationTaxe
+from ..table_decision import TableDecisionTaxe
+
+logger = logging.getLogger(__name__)
+
+
+class DeterminationTaxeLot(DeterminationTaxe):
+    """
+    Détermination des codes taxe d'un lot de lignes sans accès à la base
+
+    Les règles, taux, législations et niveaux de taxe des articles viennent de la
+    table de décision compilée, chaque ligne est résolue en mémoire avec les mêmes
+    règles que DeterminationTaxe.
+    """
+
+    def __init__(self, table: TableDecisionTaxe):
+        super().__init__(None)
+        self.table = table
+        self.date_effet = date.today()
+
+    def determiner_code_taxe(self, donnees_vente):
+        """
+        Détermination du code taxe et du taux en vigueur à la date de la commande (date_commande, aujourd'hui par défaut)
+        """
+        self.date_effet = donnees_vente.get('date_commande') or date.today()
+        return super().determiner_code_taxe(donnees_vente)
+
+    def niveau_taxe_article(self, item_code: str) -> Optional[str]:
+        """Niveau de taxe (VACITM_0) d'un article, None quand il est inconnu"""
+        return self.table.niveaux_articles.get(item_code)
+
+    def legislation(self, regime_taxe_tiers: str) -> Optional[str]:
+        """Législation d'un régime de taxe tiers, None quand il est inconnu"""
+        return self.table.legislations.get(regime_taxe_tiers)
+
+    def _rechercher_regles_applicables(self, criteres):
+        """
+        Règles candidates de la table de décision selon l'ordre de priorité
+        """
+        return self.table.candidats(criteres['VACBPR_0'], criteres['VACITM_0'], criteres.get('LEG_0'))
+
+    def _appliquer_premiere_regle_valide(self, regles, donnees_contexte):
+        """
+        Code taxe de la première règle dont les critères TAXLINK sont satisfaits
+        """
+        for code_determination, code_taxe in regles:
+            if self.table.criteres_valides(code_determination, donnees_contexte):
+                return code_taxe
+        return None
+
+    def _recuperer_details_taxe(self, code_taxe):
+        """
+        Taux du code taxe en vigueur à la date de la commande
+        """
+        taux = self.table.taux_a_date(code_taxe, self.date_effet)
+        return None if taux is None else (taux,)
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel
 
@@ -18,4 +19,5 @@ class AppliedTaxInput(BaseModel):
     regime_taxe_tiers: str
     # niveau_taxe_article: str
     groupe_societe: Optional[str] = None
-    type_taxe: Optional[str] = None
\ No newline at end of file
+    type_taxe: Optional[str] = None
+    order_date: Optional[datetime] = None  # Date du document, aujourd'hui par défaut
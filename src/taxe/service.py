@@ -5,6 +5,7 @@ from typing import List
 from unittest import result
 from ..taxe.model import AppliedTaxInput, AppliedTaxResponse, TaxeResponse
 from database.sync_data import get_db_file
+from ..taxe.table_decision import get_table_decision
 import logging
 import sys
 
@@ -82,25 +83,34 @@ def get_legislation(regime_taxe_tiers: str, db: Session) -> str:
     sqlite3_conn.close()
     return legislation
 
+def init_tax_tables(db: Session):
+    """Compile the tax decision table of the configured database for the current sync generation."""
+    db_path = get_db_file(db)
+    if not db_path:
+        logger.warning("No database configured, tax decision table not compiled")
+        return
+    get_table_decision(db_path)
+
 def get_applied_tax(criterias: List[AppliedTaxInput], db: Session) -> List[AppliedTaxResponse]:
-    """Determine the applicable tax based on criteria."""
-    from .components import DeterminationTaxe
+    """Determine the applicable tax based on criteria, from the compiled tax decision table."""
+    from .components.lot import DeterminationTaxeLot
 
     results = []
 
     db_path = ""
     db_path = get_db_file(db)
-    sqlite3_conn = sqlite3.connect(db_path) # type: ignore
-    cursor = sqlite3_conn.cursor()
-    determinateur = DeterminationTaxe(cursor)
+    determinateur = DeterminationTaxeLot(get_table_decision(db_path)) # type: ignore
     for criteria in criterias:
-        niveau_taxe_article = get_niveau_taxe_article(criteria.item_code, db)
-        legislation = get_legislation(criteria.regime_taxe_tiers, db)
+        niveau_taxe_article = determinateur.niveau_taxe_article(criteria.item_code)
+        legislation = determinateur.legislation(criteria.regime_taxe_tiers)
+        if niveau_taxe_article is None or legislation is None:
+            logger.warning(f"Article {criteria.item_code} ou régime {criteria.regime_taxe_tiers} inconnu")
         code_taxe = determinateur.determiner_code_taxe({
             'regime_taxe_tiers':  criteria.regime_taxe_tiers,
             'niveau_taxe_article': niveau_taxe_article,
             'legislation': legislation,
-            'groupe_societe': criteria.groupe_societe
+            'groupe_societe': criteria.groupe_societe,
+            'date_commande': criteria.order_date
         })
         if not code_taxe:
             raise Exception("Aucun code taxe trouvé pour ces critères")
@@ -112,9 +122,4 @@ def get_applied_tax(criterias: List[AppliedTaxInput], db: Session) -> List[Appli
     )
         )
 
-    # details_taxe = determinateur._recuperer_details_taxe(code_taxe)
-    cursor.close()
-    sqlite3_conn.close()
-
-
     return results
\ No newline at end of file
@@ -0,0 +1,210 @@
+import sqlite3
+import logging
+import threading
+from bisect import bisect_right
+from datetime import date
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from database.sync_data import get_sync_generation
+
+logger = logging.getLogger(__name__)
+
+# Position du code taxe dans une ligne SELECT * FROM TABVAC
+INDEX_CODE_TAXE = 39
+
+Predicat = Callable[[Dict[str, Any]], bool]
+
+_COMPARAISONS = {
+    '>': lambda valeur, attendue: valeur > attendue,
+    '<': lambda valeur, attendue: valeur < attendue,
+    '>=': lambda valeur, attendue: valeur >= attendue,
+    '<=': lambda valeur, attendue: valeur <= attendue,
+    'LIKE': lambda valeur, attendue: attendue in valeur,
+}
+
+
+def compiler_critere_taxlink(critere: Dict[str, Any]) -> Predicat:
+    """
+    Compilation d'un critère TAXLINK en prédicat sur le contexte de vente
+
+    L'opérateur est interprété une fois, les listes IN découpées en ensemble.
+    Un critère sans champ ou sans valeur, ou d'opérateur inconnu, est toujours vrai.
+
+    Args:
+        critere: Ligne TAXLINK (CHAMP, OPERATEUR, VALEUR)
+
+    Returns:
+        Fonction indiquant si un contexte de vente satisfait le critère
+    """
+    champ = critere.get('CHAMP')
+    operateur = critere.get('OPERATEUR', '=')
+    valeur_attendue = critere.get('VALEUR')
+
+    if not champ or valeur_attendue is None:
+        return lambda contexte: True
+
+    if operateur == '=':
+        return lambda contexte: contexte.get(champ) == valeur_attendue
+    if operateur == '!=':
+        return lambda contexte: contexte.get(champ) != valeur_attendue
+    if operateur == 'IN':
+        valeurs = frozenset(valeur.strip() for valeur in valeur_attendue.split(','))
+        return lambda contexte: contexte.get(champ) in valeurs
+    if operateur in _COMPARAISONS:
+        comparaison = _COMPARAISONS[operateur]
+
+        def predicat(contexte: Dict[str, Any]) -> bool:
+            valeur_contexte = contexte.get(champ)
+            return bool(valeur_contexte) and comparaison(valeur_contexte, valeur_attendue)
+        return predicat
+
+    return lambda contexte: True
+
+
+@dataclass
+class TableDecisionTaxe:
+    """
+    Table de décision des codes taxe pour une génération de synchronisation
+
+    Compilée depuis TABVAC, TABVACBPR, TABRATVAT, TAXLINK et ITMMASTER: les règles
+    candidates (COD_0, code taxe) de chaque (régime tiers, niveau article,
+    législation) dans l'ordre d'application, les critères TAXLINK de chaque règle
+    en prédicats, l'historique des taux de chaque code taxe trié par date de début,
+    la législation de chaque régime et le niveau de taxe de chaque article. La
+    résolution d'une ligne n'est plus qu'une suite d'accès dictionnaire.
+    """
+    generation: int
+    codes: Dict[Tuple[str, str, str], List[Tuple[str, str]]] = field(default_factory=dict)
+    predicats: Dict[str, List[Predicat]] = field(default_factory=dict)
+    taux: Dict[str, Tuple[List[str], List[Any]]] = field(default_factory=dict)
+    legislations: Dict[str, str] = field(default_factory=dict)
+    niveaux_articles: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, connection: sqlite3.Connection, generation: int) -> 'TableDecisionTaxe':
+        """
+        Compilation de la table depuis la base
+
+        Args:
+            connection: Connexion ouverte
+            generation: Génération de synchronisation lue
+
+        Returns:
+            TableDecisionTaxe de la génération
+        """
+        cursor = connection.execute("""
+        SELECT * FROM TABVAC
+        WHERE ENAFLG_0 = 2
+        ORDER BY COD_0
+        """)
+        colonnes = [description[0] for description in cursor.description]
+        index_cle, index_regime, index_niveau, index_leg = (
+            colonnes.index(nom) for nom in ('COD_0', 'VACBPR_0', 'VACITM_0', 'LEG_0')
+        )
+
+        # Toutes législations confondues sous '', puis par législation de règle
+        codes: Dict[Tuple[str, str, str], List[Tuple[str, str]]] = {}
+        for regle in cursor.fetchall():
+            candidat = (regle[index_cle], regle[INDEX_CODE_TAXE] or '')
+            codes.setdefault((regle[index_regime], regle[index_niveau], ''), []).append(candidat)
+            if regle[index_leg]:
+                codes.setdefault((regle[index_regime], regle[index_niveau], regle[index_leg]), []).append(candidat)
+
+        predicats: Dict[str, List[Predicat]] = {}
+        try:
+            cursor = connection.execute("SELECT * FROM TAXLINK ORDER BY LIGNE")
+            colonnes_taxlink = [description[0] for description in cursor.description]
+            for ligne in cursor.fetchall():
+                critere = dict(zip(colonnes_taxlink, ligne))
+                predicats.setdefault(critere['CLE_0'], []).append(compiler_critere_taxlink(critere))
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Aucun critère TAXLINK chargé: {e}")
+
+        taux: Dict[str, Tuple[List[str], List[Any]]] = {}
+        for code_taxe, debut, valeur in connection.execute("""
+        SELECT VAT_0, STRDAT_0, VATRAT_0 FROM TABRATVAT
+        ORDER BY VAT_0, STRDAT_0
+        """).fetchall():
+            dates, valeurs = taux.setdefault(code_taxe, ([], []))
+            debut = str(debut or '')[:10]  # Date seule, comparée à date.isoformat()
+            if dates and dates[-1] == debut:
+                valeurs[-1] = valeur
+            else:
+                dates.append(debut)
+                valeurs.append(valeur)
+
+        legislations: Dict[str, str] = {}
+        for regime, legislation in connection.execute("SELECT VACBPR_0, LEG_0 FROM TABVACBPR").fetchall():
+            legislations.setdefault(regime, legislation)  # Première ligne, comme fetchone()
+
+        niveaux_articles: Dict[str, str] = {}
+        for item_code, niveau in connection.execute("SELECT ITMREF_0, VACITM_0 FROM ITMMASTER").fetchall():
+            niveaux_articles.setdefault(item_code, niveau)
+
+        logger.info(f"Table de décision des taxes compilée: {len(codes)} combinaisons, colonne code taxe "
+                    f"{colonnes[INDEX_CODE_TAXE]}, {len(predicats)} règles avec critères TAXLINK, "
+                    f"{len(taux)} codes taxe (génération {generation})")
+        return cls(generation=generation, codes=codes, predicats=predicats, taux=taux, legislations=legislations,
+                   niveaux_articles=niveaux_articles)
+
+    def candidats(self, regime_taxe_tiers: str, niveau_taxe_article: str,
+                  legislation: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        Règles candidates (COD_0, code taxe) dans l'ordre d'application
+
+        Sans législation toutes les règles du régime et du niveau s'appliquent, comme
+        dans DeterminationTaxe le groupe de sociétés ne restreint pas les règles.
+        """
+        return self.codes.get((regime_taxe_tiers, niveau_taxe_article, legislation or ''), [])
+
+    def criteres_valides(self, code_determination: str, contexte: Dict[str, Any]) -> bool:
+        """Indique si un contexte de vente satisfait tous les critères TAXLINK d'une règle"""
+        return all(predicat(contexte) for predicat in self.predicats.get(code_determination, ()))
+
+    def taux_a_date(self, code_taxe: str, date_effet: date) -> Optional[Any]:
+        """
+        Taux d'un code taxe en vigueur à une date
+
+        Args:
+            code_taxe: Code taxe (VAT_0)
+            date_effet: Date du document
+
+        Returns:
+            Taux de la dernière date de début (STRDAT_0) antérieure ou égale à la date,
+            None quand aucun taux n'est en vigueur
+        """
+        historique = self.taux.get(code_taxe)
+        if not historique:
+            return None
+        dates, valeurs = historique
+        position = bisect_right(dates, date_effet.isoformat()[:10])
+        return valeurs[position - 1] if position > 0 else None
+
+
+_tables: Dict[str, TableDecisionTaxe] = {}
+_tables_lock = threading.Lock()
+
+
+def get_table_decision(db_path: str) -> TableDecisionTaxe:
+    """
+    Table de décision d'une base, recompilée quand une nouvelle synchronisation a été validée
+
+    Args:
+        db_path: Chemin du fichier SQLite
+
+    Returns:
+        TableDecisionTaxe de la génération de synchronisation courante
+    """
+    generation = get_sync_generation()
+    table = _tables.get(db_path)
+    if table is None or table.generation != generation:
+        with _tables_lock:
+            table = _tables.get(db_path)
+            if table is None or table.generation != generation:
+                sqlite_conn = sqlite3.connect(db_path)
+                try:
+                    table = TableDecisionTaxe.load(sqlite_conn, generation)
+                finally:
+                    sqlite_conn.close()
+                _tables[db_path] = table
+    return table
@@ -0,0 +1,129 @@
+import os
+import sys
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.pricing_lines import rebuild_typed_pricing_lines  # noqa: E402
+from database.sync_data import _synced_rows  # noqa: E402
+
+
+def _columns(prefix: str, count: int) -> str:
+    return ", ".join(f"{prefix}_{i} TEXT" for i in range(count))
+
+
+SCHEMA = [
+    f"""CREATE TABLE SPRICCONF (PLI_0 TEXT, PLIENAFLG_0 TEXT, PIO_0 TEXT, PLISTC_0 TEXT, PLITYP_0 TEXT,
+        PRIPRO_0 TEXT, PRIFLD_0 TEXT, PRIFRM_0 TEXT, FOCPRO_0 TEXT, FOCTYP_0 TEXT, {_columns('FIL', 5)},
+        {_columns('FLD', 5)})""",
+    f"""CREATE TABLE SPRICLIST (AUUID_0 TEXT, PLI_0 TEXT, PLICRD_0 TEXT, PLILIN_0 TEXT, PLISTRDAT_0 TEXT,
+        PLIENDDAT_0 TEXT, PLICRI1_0 TEXT, PLICRI2_0 TEXT, PLICRI3_0 TEXT, PLICRI4_0 TEXT, PLICRI5_0 TEXT,
+        MINQTY_0 TEXT, MAXQTY_0 TEXT, CUR_0 TEXT, UOM_0 TEXT, PRI_0 TEXT, {_columns('DCGVAL', 9)},
+        FOCQTYMIN_0 TEXT, FOCAMTMIN_0 TEXT, FOCQTYBKT_0 TEXT, FOCAMTBKT_0 TEXT, FOCITMREF_0 TEXT,
+        FOCQTY_0 TEXT, COMCOE_0 TEXT)""",
+    f"""CREATE TABLE PRICSTRUCT (PLISTC_0 TEXT, {_columns('INCDCR', 9)}, {_columns('VALTYP', 9)},
+        {_columns('CLCRUL', 9)}, {_columns('LANDESSHO', 9)})""",
+    """CREATE TABLE ITMMASTER (ITMREF_0 TEXT, BASPRI_0 TEXT, TCLCOD_0 TEXT, SAU_0 TEXT, STU_0 TEXT,
+        SAUSTUCOE_0 TEXT, VACITM_0 TEXT, ITMDES1_0 TEXT)""",
+    "CREATE TABLE BPCUSTOMER (BPCNUM_0 TEXT, BCGCOD_0 TEXT, CUR_0 TEXT, VACBPR_0 TEXT)",
+    "CREATE TABLE TABCHANGE (CHGTYP_0 TEXT, CUR_0 TEXT, CURDEN_0 TEXT, CHGSTRDAT_0 TEXT, CHGRAT_0 TEXT)",
+]
+
+# SPRICLIST columns defaulting to 0 instead of ''
+NUMERIC_LINE_FIELDS = ('DCGVAL', 'FOCQTY', 'FOCAMT')
+
+# Pricing rule on the item and the customer, the default of build_pricing_database
+DEFAULT_RULE = {'PLI_0': 'R1', 'PLISTC_0': 'S1', 'PRIPRO_0': '2', 'FOCPRO_0': '1', 'FOCTYP_0': '1',
+                'criteria': [('ITMMASTER', 'ITMREF'), ('BPCUSTOMER', 'BPCNUM')]}
+
+
+def pricing_line(item: str, customer: str = 'C1', price: str = '100', discounts: Iterable[str] = (),
+                 **fields: Any) -> Dict[str, Any]:
+    """SPRICLIST line of rule R1 for an item and customer, DCGVAL_0.. set from discounts"""
+    line = {
+        'PLI_0': 'R1', 'PLISTRDAT_0': '2020-01-01 00:00:00', 'PLIENDDAT_0': '2099-12-31 00:00:00',
+        'PLICRI1_0': item, 'PLICRI2_0': customer, 'MINQTY_0': '0', 'MAXQTY_0': '0',
+        'CUR_0': 'EUR', 'UOM_0': 'UN', 'PRI_0': price, 'COMCOE_0': '1',
+    }
+    for i, value in enumerate(discounts):
+        line[f'DCGVAL_{i}'] = value
+    line.update(fields)
+    return line
+
+
+def build_pricing_database(path: str, lines: List[Dict[str, Any]],
+                           structures: Optional[Dict[str, List[Tuple[str, str, str]]]] = None,
+                           rules: Optional[List[Dict[str, Any]]] = None,
+                           items: Iterable[Tuple] = (('ITM1', '50', 'UN', 'UN', '1', 'NOR'),),
+                           customers: Iterable[Tuple] = (('C1', 'EUR', 'FRA'),),
+                           exchange_rates: Iterable[Tuple] = ()) -> str:
+    """
+    Create a small Sage X3 pricing database
+
+    Args:
+        path: SQLite file to create
+        lines: SPRICLIST lines, see pricing_line
+        structures: PLISTC_0 -> (INCDCR, VALTYP, CLCRUL) of the DCGVAL_0.. columns
+        rules: SPRICCONF rules, DEFAULT_RULE when omitted
+        items: (ITMREF_0, BASPRI_0, SAU_0, STU_0, SAUSTUCOE_0, VACITM_0) of every item
+        customers: (BPCNUM_0, CUR_0, VACBPR_0) of every customer
+        exchange_rates: (CUR_0, CURDEN_0, CHGSTRDAT_0, CHGRAT_0) sales rates
+
+    Returns:
+        Path of the database
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+    for priority, rule in enumerate(rules or [DEFAULT_RULE], start=1):
+        criteria = list(rule['criteria']) + [('', '')] * (5 - len(rule['criteria']))
+        conn.execute(f"INSERT INTO SPRICCONF VALUES ({', '.join('?' * 20)})", [
+            rule['PLI_0'], '2', str(priority), rule.get('PLISTC_0', ''), '1', rule.get('PRIPRO_0', '2'),
+            rule.get('PRIFLD_0', ''), rule.get('PRIFRM_0', ''), rule.get('FOCPRO_0', '1'), rule.get('FOCTYP_0', '1'),
+        ] + [table for table, _ in criteria] + [field for _, field in criteria])
+
+    for code, columns in (structures or {'S1': []}).items():
+        columns = list(columns) + [('0', '0', '0')] * (9 - len(columns))
+        conn.execute(
+            f"INSERT INTO PRICSTRUCT VALUES ({', '.join('?' * 37)})",
+            [code] + [c[0] for c in columns] + [c[1] for c in columns] + [c[2] for c in columns]
+            + [f"{code} column {i}" for i in range(9)]
+        )
+
+    for item in items:
+        conn.execute("INSERT INTO ITMMASTER VALUES (?, ?, 'A', ?, ?, ?, ?, ?)", tuple(item) + (item[0],))
+    for customer in customers:
+        conn.execute("INSERT INTO BPCUSTOMER VALUES (?, 'G1', ?, ?)", customer)
+    for rate in exchange_rates:
+        conn.execute("INSERT INTO TABCHANGE VALUES ('1', ?, ?, ?, ?)", rate)
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(SPRICLIST)")]
+    for number, line in enumerate(lines, start=1):
+        row = {'AUUID_0': f'U{number}', 'PLICRD_0': f'CRD{number}', 'PLILIN_0': str(number), **line}
+        conn.execute(f"INSERT INTO SPRICLIST VALUES ({', '.join('?' * len(columns))})",
+                     [row.get(column, '0' if column.startswith(NUMERIC_LINE_FIELDS) else '') for column in columns])
+
+    rebuild_typed_pricing_lines(conn)
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def make_pricing_db(tmp_path):
+    """Factory building a pricing database in the test directory, see build_pricing_database"""
+    counter = iter(range(1000))
+
+    def make(lines: List[Dict[str, Any]], **options: Any) -> str:
+        return build_pricing_database(str(tmp_path / f"pricing_{next(counter)}.db"), lines, **options)
+    return make
+
+
+@pytest.fixture(autouse=True)
+def forget_synced_rows():
+    """Rows recorded by a test sync are not left pending for the next tests"""
+    yield
+    _synced_rows.clear()
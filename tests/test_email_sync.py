@@ -0,0 +1,66 @@
+import sqlite3
+from types import SimpleNamespace
+
+from conftest import pricing_line
+from database import get_data_email
+from database.pricing_lines import refresh_typed_pricing_lines
+from database.sync_data import get_sync_generation, read_snapshot
+
+
+class FakeSession:
+    """Configuration session returning the same row for every model"""
+    def __init__(self, config):
+        self.config = config
+
+    def query(self, model):
+        return self
+
+    def first(self):
+        return self.config
+
+    def close(self):
+        pass
+
+
+def write_csv(path, rows):
+    path.write_text('\n'.join(','.join(row) for row in rows) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_a_sync_of_several_files_is_one_generation(make_pricing_db, tmp_path, monkeypatch):
+    db_path = make_pricing_db([pricing_line('ITM1')])
+    files = [
+        write_csv(tmp_path / 'items.csv', [('TABLE', 'AUUID_0', 'ITMREF_0', 'BASPRI_0'), ('ITMMASTER', 'A1', 'ITM2', '9')]),
+        write_csv(tmp_path / 'lines.csv', [('TABLE', 'AUUID_0', 'PLI_0', 'PRI_0'), ('SPRICLIST', 'U1', 'R1', '80')]),
+        write_csv(tmp_path / 'more_lines.csv', [('TABLE', 'AUUID_0', 'PLI_0', 'PRI_0'), ('SPRICLIST', 'U1', 'R1', '70')]),
+    ]
+    config = SimpleNamespace(server='imap', username='user', password='secret', path=db_path)
+    monkeypatch.setattr(get_data_email, 'SessionLocal', lambda: FakeSession(config))
+    monkeypatch.setattr(get_data_email.EmailCSVDownloader, 'download_csv_attachments',
+                        lambda downloader: [downloader.process_csv(path) for path in files])
+    rebuilds = []
+    monkeypatch.setattr(get_data_email, 'refresh_typed_pricing_lines',
+                        lambda path: rebuilds.append(refresh_typed_pricing_lines(path)))
+    monkeypatch.chdir(tmp_path)
+    generation = get_sync_generation()
+
+    get_data_email.sync_emails()
+
+    assert get_sync_generation() == generation + 1
+    assert len(rebuilds) == 1
+    conn = sqlite3.connect(db_path)
+    assert read_snapshot(conn) is not None  # Committed with the rows, for the pricing workers
+    assert conn.execute("SELECT PRI_0 FROM SPRICLIST_TYPED WHERE AUUID_0 = 'U1'").fetchone() == ('70',)
+    conn.close()
+
+
+def test_a_sync_without_rows_keeps_the_generation(make_pricing_db, tmp_path, monkeypatch):
+    config = SimpleNamespace(server='imap', username='user', password='secret', path=make_pricing_db([]))
+    monkeypatch.setattr(get_data_email, 'SessionLocal', lambda: FakeSession(config))
+    monkeypatch.setattr(get_data_email.EmailCSVDownloader, 'download_csv_attachments', lambda downloader: None)
+    monkeypatch.chdir(tmp_path)
+    generation = get_sync_generation()
+
+    get_data_email.sync_emails()
+
+    assert get_sync_generation() == generation
@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+import pytest
+
+from src.pricing.benchmark import check_minor_unit_parity
+from src.pricing.minor_units import apply_adjustments_minor_units
+from src.pricing.service import SageX3PricingEngine, PricingContext, PriceAdjustment
+
+
+def adjustment(value: str, adjustment_type: str = 'discount', calculation_type: str = 'percentage_cumulative',
+               calculation_basis: str = 'unit', index: int = 0) -> PriceAdjustment:
+    return PriceAdjustment(index=index, value=Decimal(value), adjustment_type=adjustment_type,
+                           calculation_type=calculation_type, calculation_basis=calculation_basis)
+
+
+def decimal_price(base_price: str, adjustments, quantity: str) -> Decimal:
+    engine = SageX3PricingEngine(':memory:')
+    context = PricingContext(customer_code='', item_code='', quantity=Decimal(quantity))
+    return engine.apply_decimal_adjustments(Decimal(base_price), adjustments, context)
+
+
+@pytest.mark.parametrize('base_price, adjustments, quantity, expected', [
+    # Exact half cents round up, where half even would round down
+    ('0.25', [adjustment('50')], '1', Decimal('0.13')),
+    ('2.665', [adjustment('0', 'fee', 'amount')], '1', Decimal('2.67')),
+    ('1.00', [adjustment('0.5')], '1', Decimal('1.00')),
+    # Just below and just above a half cent
+    ('0.124999', [adjustment('0', 'fee', 'amount')], '1', Decimal('0.12')),
+    ('0.125001', [adjustment('0', 'fee', 'amount')], '1', Decimal('0.13')),
+    # Half cent reached through a line amount split over the quantity
+    ('1.00', [adjustment('0.04', calculation_type='amount', calculation_basis='line')], '8', Decimal('1.00')),
+    ('1.00', [adjustment('0.12', calculation_type='amount', calculation_basis='line')], '8', Decimal('0.99')),
+    # Cascading percentages of the original price and fractional quantities
+    ('10.05', [adjustment('5', calculation_type='percentage_cascading'),
+               adjustment('10', calculation_type='percentage_cascading', index=1)], '0.25', Decimal('8.54')),
+    # Prices below zero are set to 0
+    ('5', [adjustment('7', calculation_type='amount')], '1', Decimal('0.00')),
+])
+def test_half_up_boundaries_match_decimal(base_price, adjustments, quantity, expected):
+    assert decimal_price(base_price, adjustments, quantity) == expected
+    minor_units = apply_adjustments_minor_units(Decimal(base_price), adjustments, Decimal(quantity))
+    assert minor_units == expected
+    assert str(minor_units) == str(expected)
+
+
+def test_inexact_division_falls_back_to_decimal():
+    adjustments = [adjustment('1', calculation_type='amount', calculation_basis='line')]
+    assert apply_adjustments_minor_units(Decimal('10'), adjustments, Decimal('3')) is None
+
+
+def test_random_adjustments_match_decimal():
+    parity = check_minor_unit_parity(3000, seed=7)
+    assert parity['mismatches'] == 0, parity['cases']
+    assert parity['fallbacks'] < parity['samples']
+
+
+def test_engine_prices_alike_with_minor_units():
+    adjustments = [adjustment('12.345', index=0), adjustment('2.5', 'fee', 'amount', 'line', index=1)]
+    context = PricingContext(customer_code='', item_code='', quantity=Decimal('4'), currency='XOF')
+    assert (SageX3PricingEngine(':memory:', use_minor_units=True).apply_sage_x3_adjustments(
+                Decimal('99.99'), adjustments, context)
+            == SageX3PricingEngine(':memory:').apply_sage_x3_adjustments(Decimal('99.99'), adjustments, context))
@@ -0,0 +1,109 @@
+import ast
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+from conftest import pricing_line
+from database.pricing_lines import rebuild_typed_pricing_lines
+from database.sync_data import clear_synced_rows, get_sync_generation, has_synced_rows, record_synced_rows, \
+    synced_rows
+from src.pricing.price_book import PRICE_BOOK_SOURCES, PriceBook, refresh_price_books
+from src.pricing.service import SageX3PricingEngine, PricingContext, get_pricing_engine, init_pricing_engine
+
+ITEMS = [('ITM1', '0', 'UN', 'UN', '1', 'NOR'), ('ITM2', '0', 'UN', 'UN', '1', 'NOR')]
+
+
+def make_booked_db(make_pricing_db) -> str:
+    db_path = make_pricing_db([pricing_line('ITM1', price='12.50'), pricing_line('ITM2', price='8')], items=ITEMS)
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE SORDER (SOHNUM_0 TEXT, BPCORD_0 TEXT, CUR_0 TEXT)")
+    conn.execute("CREATE TABLE SORDERP (SOHNUM_0 TEXT, ITMREF_0 TEXT)")
+    conn.execute("INSERT INTO SORDER VALUES ('SO1', 'C1', 'EUR')")
+    conn.executemany("INSERT INTO SORDERP VALUES ('SO1', ?)", [('ITM1',), ('ITM2',)])
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def context(item):
+    return PricingContext('C1', item, Decimal('1'), 'EUR', 'UN', order_date=datetime.now())
+
+
+class FakeSession:
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+
+def test_lookup_is_served_from_the_loaded_entries(make_pricing_db):
+    db_path = make_booked_db(make_pricing_db)
+    refresh_price_books(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    book = PriceBook.load(conn, 1)
+    conn.close()
+
+    entry = book.lookup(context('ITM1'))  # The connection is closed, no SQL is run
+
+    assert entry['NETPRI_0'] == '12.50'
+    assert entry['ADJUSTMENTS_0'] == []
+    assert book.lookup(PricingContext('C2', 'ITM1', Decimal('1'), 'EUR', 'UN', order_date=datetime.now())) is None
+
+
+def test_booked_lines_price_like_rule_resolution(make_pricing_db):
+    db_path = make_booked_db(make_pricing_db)
+    refresh_price_books(db_path)
+    booked = SageX3PricingEngine(db_path, parallel_workers=1)
+    resolved = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+
+    for item in ('ITM1', 'ITM2'):
+        assert booked.get_price_book().lookup(context(item)) is not None
+        assert booked.calculate_pricing(context(item)).unit_price == resolved.calculate_pricing(context(item)).unit_price
+
+
+def test_synced_rows_refresh_the_book_once_on_warm_up(make_pricing_db, monkeypatch):
+    db_path = make_booked_db(make_pricing_db)
+    refresh_price_books(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE SPRICLIST SET PRI_0 = '11' WHERE PLICRI1_0 = 'ITM1'")
+    conn.commit()
+    rebuild_typed_pricing_lines(conn)
+    conn.close()
+    refreshes = []
+    monkeypatch.setattr('src.pricing.service.get_db_file', lambda db: db.db_path)
+    monkeypatch.setattr('src.pricing.price_book.refresh_price_books',
+                        lambda path, changes: refreshes.append(changes) or refresh_price_books(path, changes))
+    clear_synced_rows(PRICE_BOOK_SOURCES)
+
+    record_synced_rows('SPRICLIST', [{'PLI_0': 'R1', 'PLICRI1_0': 'ITM1', 'PLICRI2_0': 'C1'}])
+    record_synced_rows('SPRICLIST', [{'PLI_0': 'R1', 'PLICRI1_0': 'ITM1', 'PLICRI2_0': 'C1', 'PRI_0': '11'}])
+    assert has_synced_rows(PRICE_BOOK_SOURCES)
+    engine = get_pricing_engine(db_path)
+    engine.warm_up()
+    assert engine.get_price_book().stale  # Not served until the refresh
+    generation = get_sync_generation()
+    init_pricing_engine(FakeSession(db_path))
+    init_pricing_engine(FakeSession(db_path))
+
+    assert len(refreshes) == 1
+    assert get_sync_generation() == generation  # Only the price book is read again
+    assert not has_synced_rows(PRICE_BOOK_SOURCES)
+    assert len(refreshes[0]['SPRICLIST']) == 2
+    book = engine.get_price_book()
+    assert not book.stale
+    assert book.lookup(context('ITM1'))['NETPRI_0'] == '11'
+
+
+def test_unwatched_tables_are_not_recorded():
+    record_synced_rows('BPADDRESS', [{'BPANUM_0': 'C1'}])
+
+    assert not synced_rows(['BPADDRESS'])
+
+
+def test_database_layer_does_not_import_pricing():
+    for path in (Path(__file__).parent.parent / 'database').glob('*.py'):
+        for node in ast.walk(ast.parse(path.read_text())):
+            if isinstance(node, ast.ImportFrom):
+                assert not (node.module or '').startswith('src'), path
+            elif isinstance(node, ast.Import):
+                assert not any(alias.name.startswith('src') for alias in node.names), path
@@ -0,0 +1,75 @@
+from datetime import datetime
+from decimal import Decimal
+
+from conftest import pricing_line
+from src.pricing.service import SageX3PricingEngine, PricingContext
+
+ORDER_DATE = datetime(2025, 3, 15)
+
+# Column 0: 10% cascading discount per unit, column 1: fixed fee per unit
+STRUCTURES = {'S1': [('2', '3', '1'), ('1', '1', '1')]}
+
+
+def engine_for(db_path: str) -> SageX3PricingEngine:
+    return SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+
+
+def test_price_in_other_currency_uses_rate_on_order_date(make_pricing_db):
+    db_path = make_pricing_db(
+        [pricing_line('ITM1', price='100', discounts=['10', '2'])],
+        structures=STRUCTURES,
+        exchange_rates=[('EUR', 'GBP', '2024-01-01 00:00:00', '0.85'), ('EUR', 'GBP', '2025-06-01 00:00:00', '0.9')],
+    )
+    engine = engine_for(db_path)
+
+    march = engine.calculate_pricing(PricingContext('C1', 'ITM1', Decimal('1'), 'GBP', 'UN', order_date=ORDER_DATE))
+    assert (march.source_currency, march.currency) == ('EUR', 'GBP')
+    assert march.base_price == Decimal('85.00')
+    # 85 - 10% + 2 EUR fee converted to 1.70 GBP
+    assert march.unit_price == Decimal('78.20')
+
+    july = engine.calculate_pricing(PricingContext('C1', 'ITM1', Decimal('1'), 'GBP', 'UN',
+                                                   order_date=datetime(2025, 7, 1)))
+    assert july.base_price == Decimal('90.00')
+
+
+def test_price_without_rate_is_not_converted(make_pricing_db):
+    db_path = make_pricing_db([pricing_line('ITM1', price='100')])
+    result = engine_for(db_path).calculate_pricing(
+        PricingContext('C1', 'ITM1', Decimal('1'), 'USD', 'UN', order_date=ORDER_DATE))
+    assert result.base_price == Decimal('0')
+    assert result.source_currency == ''
+
+
+def test_price_in_other_unit_uses_item_coefficient(make_pricing_db):
+    db_path = make_pricing_db(
+        [pricing_line('ITM1', price='4.5', discounts=['10', '0.5'])],
+        structures=STRUCTURES,
+        items=[('ITM1', '3', 'BX', 'UN', '6', 'NOR')],
+    )
+    engine = engine_for(db_path)
+
+    boxes = engine.calculate_pricing(PricingContext('C1', 'ITM1', Decimal('2'), 'EUR', 'BX', order_date=ORDER_DATE))
+    assert (boxes.source_unit_of_measure, boxes.unit_of_measure) == ('UN', 'BX')
+    assert boxes.base_price == Decimal('27.00')
+    # 27 - 10% + 6 x 0.50 per unit fee
+    assert boxes.unit_price == Decimal('27.30')
+
+
+def test_batch_converts_like_single_lines(make_pricing_db):
+    db_path = make_pricing_db(
+        [pricing_line('ITM1', price='4.5', discounts=['10', '0.5']), pricing_line('ITM2', price='19.99')],
+        structures=STRUCTURES,
+        items=[('ITM1', '3', 'BX', 'UN', '6', 'NOR'), ('ITM2', '7', 'UN', 'UN', '1', 'NOR')],
+        exchange_rates=[('EUR', 'GBP', '2024-01-01 00:00:00', '0.85')],
+    )
+    engine = engine_for(db_path)
+    contexts = [
+        PricingContext('C1', 'ITM1', Decimal('3'), 'EUR', 'BX', order_date=ORDER_DATE),
+        PricingContext('C1', 'ITM2', Decimal('5'), 'GBP', 'UN', order_date=ORDER_DATE),
+    ]
+    batch = engine.calculate_pricing_batch(contexts)
+    assert [result.unit_price for result in batch] == [
+        engine.calculate_pricing(context).unit_price for context in contexts
+    ]
+    assert batch[1].unit_price == Decimal('16.99')
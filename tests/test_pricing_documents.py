@@ -0,0 +1,83 @@
+from dataclasses import replace
+from datetime import datetime
+from decimal import Decimal
+
+from conftest import DEFAULT_RULE, pricing_line
+from src.pricing.service import SageX3PricingEngine, PricingContext
+
+ORDER_DATE = datetime(2025, 3, 15)
+
+# Column 0: cumulative percentage discount per document, column 1: fixed discount per document
+STRUCTURES = {'S1': [('2', '2', '3'), ('2', '1', '3')]}
+
+ITEMS = [('ITM1', '0', 'UN', 'UN', '1', 'NOR'), ('ITM2', '0', 'UN', 'UN', '1', 'NOR')]
+
+
+def cart(*lines):
+    return [PricingContext('C1', item, Decimal(quantity), 'EUR', 'UN', order_date=ORDER_DATE)
+            for item, quantity in lines]
+
+
+def test_document_adjustments_are_shared_by_the_cart_lines(make_pricing_db):
+    db_path = make_pricing_db(
+        [pricing_line('ITM1', price='100', discounts=['10', '30']),
+         pricing_line('ITM2', price='50', discounts=['10', '30'])],
+        structures=STRUCTURES, items=ITEMS,
+    )
+    engine = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+
+    results = engine.calculate_pricing_batch(cart(('ITM1', '2'), ('ITM2', '4')))
+
+    # 10% of the 400 total, then 30 taken once, split pro rata to the line totals
+    assert [result.unit_price for result in results] == [Decimal('82.50'), Decimal('41.25')]
+
+
+def test_document_adjustments_only_apply_to_the_lines_carrying_them(make_pricing_db):
+    db_path = make_pricing_db(
+        [pricing_line('ITM1', price='100', discounts=['10']), pricing_line('ITM2', price='50')],
+        structures=STRUCTURES, items=ITEMS,
+    )
+    engine = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+
+    results = engine.calculate_pricing_batch(cart(('ITM1', '2'), ('ITM2', '4')))
+
+    assert [result.unit_price for result in results] == [Decimal('90.00'), Decimal('50')]
+
+
+def test_single_line_is_priced_as_a_one_line_cart(make_pricing_db):
+    structures = {'S1': [('2', '3', '1'), ('2', '2', '3'), ('1', '1', '2'), ('2', '1', '3'), ('1', '3', '3')]}
+    lines = [
+        pricing_line(item, price=price, discounts=discounts)
+        for item, price, discounts in (
+            ('ITM1', '19.99', ['5', '2.5', '1.5', '4', '3']),
+            ('ITM2', '0.35', ['12.345', '33.33', '0.01', '0.5', '1']),
+            ('ITM3', '1250', ['0', '10', '25', '99.99', '0']),
+        )
+    ]
+    items = ITEMS + [('ITM3', '0', 'UN', 'UN', '1', 'NOR')]
+    db_path = make_pricing_db(lines, structures=structures, items=items)
+    engine = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+
+    for item in ('ITM1', 'ITM2', 'ITM3'):
+        for quantity in ('1', '3', '7', '0.25', '24', '150'):
+            [context] = cart((item, quantity))
+            [cart_line] = engine.calculate_pricing_batch([context])
+            single = engine.calculate_pricing(context)
+            assert single.unit_price == cart_line.unit_price, (item, quantity)
+            assert single.free_items == cart_line.free_items
+
+
+def test_order_total_free_goods_come_only_from_the_cart_pass(make_pricing_db):
+    rule = {**DEFAULT_RULE, 'FOCPRO_0': '4', 'FOCTYP_0': '1'}
+    lines = [pricing_line('ITM1', price='10', FOCQTYMIN_0='5', FOCQTY_0='2', FOCITMREF_0='ITM2'),
+             pricing_line('ITM2', price='10')]
+    db_path = make_pricing_db(lines, rules=[rule], items=ITEMS)
+    engine = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+    contexts = cart(('ITM1', '3'), ('ITM2', '3'))
+
+    results = engine.calculate_pricing_batch(contexts)
+
+    # Neither line reaches the threshold alone, the cart of 6 does once
+    assert [item['free_type'] for result in results for item in result.free_items] == ['Total Commande']
+    # A line over the threshold on its own is no order total either
+    assert engine.calculate_free_items(replace(contexts[0], quantity=Decimal('6')), lines[0]) == []
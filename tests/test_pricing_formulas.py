@@ -0,0 +1,61 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from conftest import DEFAULT_RULE, pricing_line
+from src.pricing.formulas import FormulaError, compile_formula, line_variables
+from src.pricing.service import SageX3PricingEngine, PricingContext
+
+
+def variables(quantity: str = '5', base_price: str = '7.5'):
+    return line_variables({'PRI_0': 10, 'DCGVAL_0': '2'}, Decimal(quantity), lambda: Decimal(base_price))
+
+
+@pytest.mark.parametrize('formula, expected', [
+    ('PRI*1.1', Decimal('11.0')),
+    ('BASPRI*(1+DCGVAL/100)', Decimal('7.65')),
+    ('max(PRI, BASPRI) - 1', Decimal('9')),
+    ('PRI if QTY >= 5 else BASPRI', Decimal('10')),
+    ('round(BASPRI/3, 2)', Decimal('2.50')),
+    ('-PRI', Decimal('-10')),
+])
+def test_formula_is_evaluated_in_decimal(formula, expected):
+    assert compile_formula(formula)(variables()) == expected
+
+
+@pytest.mark.parametrize('formula', ['__import__("os")', 'PRI.real', 'open(1)', '1 +', '"a"', 'PRI[0]'])
+def test_formula_outside_of_arithmetic_is_rejected(formula):
+    with pytest.raises(FormulaError):
+        compile_formula(formula)
+
+
+def test_unknown_name_is_rejected_on_evaluation():
+    with pytest.raises(FormulaError):
+        compile_formula('PRI + NOPE')(variables())
+
+
+def test_base_price_is_only_read_when_used():
+    def base_price():
+        raise AssertionError("BASPRI read")
+    assert compile_formula('PRI * QTY')(line_variables({'PRI_0': '2'}, Decimal('3'), base_price)) == Decimal('6')
+
+
+def test_calculation_treatment_prices_with_the_rule_formula(make_pricing_db):
+    rule = {**DEFAULT_RULE, 'PRIPRO_0': '3', 'PRIFRM_0': 'BASPRI + PRI * 2'}
+    db_path = make_pricing_db([pricing_line('ITM1', price='12.5')], rules=[rule])
+    engine = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+
+    result = engine.calculate_pricing(PricingContext('C1', 'ITM1', Decimal('1'), 'EUR', 'UN',
+                                                     order_date=datetime(2025, 3, 15)))
+    assert result.base_price == Decimal('75.0')
+
+
+def test_invalid_formula_falls_back_to_the_line_price(make_pricing_db):
+    rule = {**DEFAULT_RULE, 'PRIPRO_0': '3', 'PRIFRM_0': 'PRI.real'}
+    db_path = make_pricing_db([pricing_line('ITM1', price='12.5')], rules=[rule])
+    engine = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+
+    result = engine.calculate_pricing(PricingContext('C1', 'ITM1', Decimal('1'), 'EUR', 'UN',
+                                                     order_date=datetime(2025, 3, 15)))
+    assert result.base_price == Decimal('12.5')
@@ -0,0 +1,71 @@
+import random
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from conftest import pricing_line
+from src.pricing.index import sql_real
+from src.pricing.service import SageX3PricingEngine, PricingContext
+
+ITEMS = ['ITM1', 'ITM2', '~', '~ITM', '', None]
+CUSTOMERS = ['C1', 'C2', '~', '', None]
+# Text bounds read by CAST(... AS REAL): numeric prefixes, exponents, blanks and no number at all
+QUANTITIES = ['0', '', None, '5', '10', '10.5', '10abc', ' 7', '1e1', '-3', 'abc', '.5', '0.0', '24']
+DATES = ['2020-01-01 00:00:00', '2025-03-15 00:00:00', '2025-03-15 12:00:00', '2025-06-30 23:59:59',
+         '2099-12-31 00:00:00', '2025-03-15', '', None, 'never']
+
+ORDER_DATES = [datetime(2019, 5, 1), datetime(2025, 3, 15), datetime(2025, 3, 15, 12), datetime(2025, 7, 1)]
+ORDER_QUANTITIES = ['0.25', '1', '5', '7', '10', '10.5', '11', '24', '100']
+
+
+def make_lines(seed: int):
+    generator = random.Random(seed)
+    lines = []
+    for _ in range(160):
+        start, end = generator.choice(DATES), generator.choice(DATES)
+        lines.append(pricing_line(
+            generator.choice(ITEMS), customer=generator.choice(CUSTOMERS),
+            MINQTY_0=generator.choice(QUANTITIES), MAXQTY_0=generator.choice(QUANTITIES),
+            PLISTRDAT_0=start, PLIENDDAT_0=end,
+            CUR_0=generator.choice(['EUR', 'EUR', 'USD']), UOM_0=generator.choice(['UN', 'UN', 'BX']),
+        ))
+    return lines
+
+
+@pytest.mark.parametrize('typed', [True, False], ids=['SPRICLIST_TYPED', 'SPRICLIST'])
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_index_finds_the_lines_of_the_sql_query(make_pricing_db, typed, seed):
+    db_path = make_pricing_db(make_lines(seed), items=[(item, '0', 'UN', 'UN', '1', 'NOR') for item in ('ITM1', 'ITM2')],
+                              customers=[('C1', 'EUR', 'FRA'), ('C2', 'EUR', 'FRA')])
+    if not typed:
+        conn = sqlite3.connect(db_path)
+        conn.execute("DROP TABLE SPRICLIST_TYPED")
+        conn.commit()
+        conn.close()
+    engine = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+    assert (engine.get_rule_catalog().pricing_lines_table == 'SPRICLIST_TYPED') is typed
+    [config] = engine.get_pricing_configurations()
+
+    matched = 0
+    for item in ('ITM1', 'ITM2', 'ITM3'):
+        for customer in ('C1', 'C2'):
+            for currency, unit in (('EUR', 'UN'), ('USD', 'BX')):
+                for order_date in ORDER_DATES:
+                    for quantity in ORDER_QUANTITIES:
+                        context = PricingContext(customer, item, Decimal(quantity), currency, unit,
+                                                 order_date=order_date)
+                        expected = [line['PLICRD_0'] for line in engine.query_applicable_pricing_lines(context, config)]
+                        found = [line['PLICRD_0'] for line in engine.find_applicable_pricing_lines(context, config)]
+                        assert found == expected, (item, customer, currency, order_date, quantity)
+                        matched += bool(expected)
+    assert matched  # The dataset exercises matching lines, not only empty results
+
+
+@pytest.mark.parametrize('value', [None, '', '10', '10.5', '10abc', ' 7', '1e1', '1e', '-3', '+2', 'abc', '.5', '5.',
+                                   '0.0', 3, 2.5, b'12'])
+def test_sql_real_casts_like_sqlite(value):
+    [(expected,)] = sqlite3.connect(':memory:').execute("SELECT CAST(? AS REAL)", (value,)).fetchall()
+
+    assert sql_real(value) == expected
@@ -0,0 +1,32 @@
+from dataclasses import replace
+from datetime import datetime
+from decimal import Decimal
+
+from conftest import DEFAULT_RULE, pricing_line
+from src.pricing.service import SageX3PricingEngine, PricingContext
+
+# Unit cascading discount, line amount fee, document cumulative and fixed discounts
+STRUCTURES = {'S1': [('2', '3', '1'), ('1', '1', '2'), ('2', '2', '3'), ('2', '1', '3')]}
+
+QUANTITIES = [Decimal(quantity) for quantity in ('1', '3', '9.5', '10', '24', '60', '150')]
+
+
+def test_each_step_is_priced_as_a_one_line_cart(make_pricing_db):
+    rule = {**DEFAULT_RULE, 'FOCPRO_0': '4', 'FOCTYP_0': '1'}
+    db_path = make_pricing_db(
+        [pricing_line('ITM1', price='19.99', discounts=['5', '1.5', '2.5', '4'], MAXQTY_0='10',
+                      FOCQTYMIN_0='5', FOCQTY_0='2', FOCITMREF_0='ITM2'),
+         pricing_line('ITM1', price='17.35', discounts=['7', '3', '3.33', '10'], MINQTY_0='10',
+                      FOCQTYMIN_0='50', FOCQTY_0='6', FOCITMREF_0='ITM2')],
+        rules=[rule], structures=STRUCTURES,
+    )
+    engine = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+    context = PricingContext('C1', 'ITM1', Decimal('1'), 'EUR', 'UN', order_date=datetime(2025, 3, 15))
+
+    ladder = engine.calculate_price_ladder(context, QUANTITIES)
+
+    for quantity, step in zip(QUANTITIES, ladder):
+        [cart_line] = engine.calculate_pricing_batch([replace(context, quantity=quantity)])
+        assert (step.unit_price, step.free_items) == (cart_line.unit_price, cart_line.free_items), quantity
+    assert ladder[0].unit_price != ladder[-1].unit_price
+    assert ladder[-1].free_items
@@ -0,0 +1,17 @@
+from datetime import datetime
+
+import pytest
+
+from src.pricing.model import PricingInput, PricingLadderInput
+
+
+@pytest.mark.parametrize('model, fields', [
+    (PricingInput, {'quantity': '1'}),
+    (PricingLadderInput, {'quantities': ['1']}),
+])
+def test_order_date_defaults_to_the_request_time(model, fields):
+    before = datetime.now()
+    first = model(customer_code='C1', item_code='ITM1', currency='EUR', unit_of_measure='UN', **fields)
+    second = model(customer_code='C1', item_code='ITM1', currency='EUR', unit_of_measure='UN', **fields)
+
+    assert before <= first.order_date <= second.order_date <= datetime.now()
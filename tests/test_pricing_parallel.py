@@ -0,0 +1,59 @@
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+from conftest import pricing_line
+from database.pricing_lines import rebuild_typed_pricing_lines
+from database.sync_data import stamp_snapshot
+from src.pricing.service import SageX3PricingEngine, PricingContext
+
+STRUCTURES = {'S1': [('2', '2', '1'), ('1', '1', '2'), ('2', '3', '3')]}
+
+ITEMS = [(f'ITM{i}', '0', 'UN', 'UN', '1', 'NOR') for i in range(1, 9)]
+
+
+def make_cart_db(make_pricing_db) -> str:
+    return make_pricing_db(
+        [pricing_line(f'ITM{i}', price=f'{i * 3}.17', discounts=['2.5', '1.25', '5']) for i in range(1, 9)],
+        structures=STRUCTURES, items=ITEMS,
+    )
+
+
+def cart():
+    return [PricingContext('C1', f'ITM{i % 8 + 1}', Decimal(i % 13 + 1), 'EUR', 'UN', order_date=datetime(2025, 3, 15))
+            for i in range(48)]
+
+
+def prices(results):
+    return [(result.unit_price, result.base_price, result.free_items) for result in results]
+
+
+def test_process_pool_prices_like_the_serial_engine(make_pricing_db):
+    db_path = make_cart_db(make_pricing_db)
+    serial = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+    pooled = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=2, parallel_min_lines=8)
+
+    parallel_results = pooled.price_cart_lines_parallel(cart())
+
+    assert parallel_results is not None
+    assert prices(parallel_results) == prices(serial.price_cart_lines(cart()))
+    assert prices(pooled.calculate_pricing_batch(cart())) == prices(serial.calculate_pricing_batch(cart()))
+
+
+def test_workers_do_not_price_with_newer_commits(make_pricing_db):
+    db_path = make_cart_db(make_pricing_db)
+    pooled = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=2, parallel_min_lines=8)
+    expected = prices(SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1).calculate_pricing_batch(cart()))
+    pooled.warm_up()
+
+    # A commit the parent has not picked up yet, within the same sync generation
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("BEGIN")
+    conn.execute("UPDATE SPRICLIST SET PRI_0 = '1000'")
+    stamp_snapshot(conn)
+    conn.execute("COMMIT")
+    rebuild_typed_pricing_lines(conn)
+    conn.close()
+
+    assert pooled.price_cart_lines_parallel(cart()) is None
+    assert prices(pooled.calculate_pricing_batch(cart())) == expected
@@ -0,0 +1,81 @@
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+from conftest import DEFAULT_RULE, pricing_line
+from database.sync_data import bump_sync_generation
+from src.pricing.service import SageX3PricingEngine, PricingContext
+
+# Cumulative percentage discount per unit
+STRUCTURES = {'S1': [('2', '2', '1')]}
+
+# Pricing rule on the item and the customer group
+RULE = {**DEFAULT_RULE, 'criteria': [('ITMMASTER', 'ITMREF'), ('BPCUSTOMER', 'BCGCOD')]}
+
+CONTEXT = PricingContext('C1', 'ITM1', Decimal('2'), 'EUR', 'UN', order_date=datetime(2025, 3, 15))
+
+
+def make_engine(make_pricing_db) -> SageX3PricingEngine:
+    db_path = make_pricing_db([pricing_line('ITM1', customer='G1', discounts=['10'])],
+                              structures=STRUCTURES, rules=[RULE])
+    engine = SageX3PricingEngine(db_path, use_price_book=False, parallel_workers=1)
+    engine.warm_up()
+    return engine
+
+
+def change_master_data(db_path: str):
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE BPCUSTOMER SET BCGCOD_0 = 'G2' WHERE BPCNUM_0 = 'C1'")
+    conn.execute("UPDATE PRICSTRUCT SET INCDCR_0 = '1' WHERE PLISTC_0 = 'S1'")
+    conn.commit()
+    conn.close()
+
+
+def test_pricing_reads_nothing_from_the_database(make_pricing_db):
+    engine = make_engine(make_pricing_db)
+    statements = []
+    engine.connection.set_trace_callback(statements.append)
+
+    single = engine.calculate_pricing(CONTEXT)
+    [cart_line] = engine.calculate_pricing_batch([CONTEXT])
+
+    assert single.unit_price == cart_line.unit_price == Decimal('90.00')
+    assert statements == []
+
+
+def test_rule_set_keeps_its_snapshot_until_the_next_sync(make_pricing_db):
+    engine = make_engine(make_pricing_db)
+
+    change_master_data(engine.db_path)
+
+    assert engine.calculate_pricing(CONTEXT).unit_price == Decimal('90.00')
+    bump_sync_generation()
+    engine.warm_up()
+    assert engine.calculate_pricing(CONTEXT).unit_price != Decimal('90.00')
+
+
+def test_unknown_price_structure_has_no_columns(make_pricing_db):
+    engine = make_engine(make_pricing_db)
+
+    assert engine.get_price_structure('S1') == {0: {'incdcr': '2', 'valtyp': '2', 'clcrul': '1',
+                                                   'description': 'S1 column 0'}}
+    assert engine.get_price_structure('MISSING') == {}
+    assert 'MISSING' not in engine.get_rule_set().price_structures
+
+
+def test_inactive_rules_are_compiled_in_the_snapshot(make_pricing_db):
+    engine = make_engine(make_pricing_db)
+    conn = sqlite3.connect(engine.db_path)
+    conn.execute("UPDATE SPRICCONF SET PLIENAFLG_0 = '1'")
+    conn.commit()
+    conn.close()
+    bump_sync_generation()
+    engine.warm_up()
+    compiled = dict(engine.get_rule_set().line_indexes)
+    statements = []
+    engine.connection.set_trace_callback(statements.append)
+
+    assert engine.get_price_line_index('R1').line_count == 1
+    assert engine.get_price_line_index('MISSING').line_count == 0
+    assert statements == []
+    assert engine.get_rule_set().line_indexes == compiled
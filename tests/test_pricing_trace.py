@@ -0,0 +1,99 @@
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from conftest import pricing_line
+from src.pricing.price_book import refresh_price_books
+from src.pricing.service import SageX3PricingEngine, PricingContext
+from src.pricing.trace import pricing_trace
+from src.pricing import vectorized
+
+STRUCTURES = {'S1': [('2', '2', '1'), ('1', '1', '2'), ('2', '3', '3')]}
+
+ITEMS = [(f'ITM{i}', '0', 'UN', 'UN', '1', 'NOR') for i in range(1, 5)]
+
+
+def make_cart_db(make_pricing_db) -> str:
+    return make_pricing_db(
+        [pricing_line(f'ITM{i}', price=f'{i * 7}.35', discounts=['2.5', '1.25', '5']) for i in range(1, 5)],
+        structures=STRUCTURES, items=ITEMS,
+    )
+
+
+def cart():
+    return [PricingContext('C1', f'ITM{i}', Decimal(quantity), 'EUR', 'UN', order_date=datetime(2025, 3, 15))
+            for i, quantity in zip(range(1, 5), ('1', '3', '7', '12'))]
+
+
+def steps(line, name):
+    return [step for step in line['steps'] if step['step'] == name]
+
+
+@pytest.mark.skipif(vectorized.np is None, reason="NumPy is not installed")
+def test_trace_follows_the_vectorized_kernel(make_pricing_db):
+    engine = SageX3PricingEngine(make_cart_db(make_pricing_db), use_price_book=False, parallel_workers=1,
+                                 vectorize_min_lines=2)
+    expected = [result.unit_price for result in engine.calculate_pricing_batch(cart())]
+
+    with pricing_trace() as trace:
+        results = engine.calculate_pricing_batch(cart())
+
+    assert [result.unit_price for result in results] == expected
+    for line in trace.lines:
+        [path] = steps(line, 'adjustment_path')
+        assert path['path'] == 'vectorized'
+        assert path['unit_price'] == path['decimal_unit_price']
+        assert line['steps'][-1]['step'] == 'result'
+        assert line['steps'][-1]['unit_price'] == path['unit_price']
+
+
+def test_trace_follows_the_minor_units_path(make_pricing_db):
+    engine = SageX3PricingEngine(make_cart_db(make_pricing_db), use_price_book=False, parallel_workers=1,
+                                 use_minor_units=True)
+    context = cart()[0]
+
+    with pricing_trace() as trace:
+        result = engine.calculate_pricing(context)
+
+    [path] = steps(trace.lines[0], 'adjustment_path')
+    assert path['path'] == 'minor_units'
+    assert path['unit_price'] == path['decimal_unit_price']
+    assert result.unit_price == SageX3PricingEngine(engine.db_path, use_price_book=False).calculate_pricing(
+        context).unit_price
+
+
+def test_trace_follows_the_price_book(make_pricing_db):
+    db_path = make_cart_db(make_pricing_db)
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE SORDER (SOHNUM_0 TEXT, BPCORD_0 TEXT, CUR_0 TEXT)")
+    conn.execute("CREATE TABLE SORDERP (SOHNUM_0 TEXT, ITMREF_0 TEXT)")
+    conn.execute("INSERT INTO SORDER VALUES ('SO1', 'C1', 'EUR')")
+    conn.execute("INSERT INTO SORDERP VALUES ('SO1', 'ITM2')")
+    conn.commit()
+    conn.close()
+    refresh_price_books(db_path)
+    engine = SageX3PricingEngine(db_path, parallel_workers=1)
+    context = PricingContext('C1', 'ITM2', Decimal('1'), 'EUR', 'UN', order_date=datetime.now())
+
+    with pricing_trace() as trace:
+        result = engine.calculate_pricing(context)
+
+    [book] = steps(trace.lines[0], 'price_book')
+    assert book['pricing_rule'] == 'R1'
+    assert not steps(trace.lines[0], 'resolution')
+    assert result.unit_price == SageX3PricingEngine(db_path, use_price_book=False).calculate_pricing(
+        context).unit_price
+
+
+def test_trace_states_the_process_pool_path(make_pricing_db):
+    engine = SageX3PricingEngine(make_cart_db(make_pricing_db), use_price_book=False, parallel_workers=2,
+                                 parallel_min_lines=2)
+
+    with pricing_trace() as trace:
+        engine.calculate_pricing_batch(cart())
+
+    [execution] = [step for step in trace.document if step['step'] == 'execution']
+    assert execution['production_path'] == 'process_pool'
+    assert execution['workers'] == 2
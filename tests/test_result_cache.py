@@ -0,0 +1,94 @@
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+from conftest import pricing_line
+from database.pricing_lines import rebuild_typed_pricing_lines
+from database.sync_data import bump_sync_generation
+from src.pricing.service import SageX3PricingEngine, PricingContext
+
+LINES = [
+    pricing_line('ITM1', price='100', MAXQTY_0='10', PLIENDDAT_0='2025-06-30 23:59:59'),
+    pricing_line('ITM1', price='90', MINQTY_0='11', PLIENDDAT_0='2025-06-30 23:59:59'),
+    pricing_line('ITM1', price='80', PLISTRDAT_0='2025-07-01 00:00:00'),
+]
+
+JUNE = datetime(2025, 6, 2)
+
+
+def context(quantity, order_date=JUNE):
+    return PricingContext('C1', 'ITM1', Decimal(quantity), 'EUR', 'UN', order_date=order_date)
+
+
+def make_engine(make_pricing_db, **options) -> SageX3PricingEngine:
+    return SageX3PricingEngine(make_pricing_db(LINES), use_price_book=False, parallel_workers=1, **options)
+
+
+def stats(engine):
+    result = engine.get_result_cache_stats()
+    return result['hits'], result['misses']
+
+
+def test_contexts_in_the_same_bracket_hit(make_pricing_db):
+    engine = make_engine(make_pricing_db)
+
+    first = engine.calculate_pricing(context('2'))
+    second = engine.calculate_pricing(context('3'))
+    third = engine.calculate_pricing(context('2', datetime(2025, 6, 20, 8, 30)))
+
+    assert stats(engine) == (2, 1)
+    assert first.unit_price == second.unit_price == third.unit_price == Decimal('100')
+
+
+def test_crossing_a_quantity_bound_misses(make_pricing_db):
+    engine = make_engine(make_pricing_db)
+
+    quantities = ('9', '10', '10.5', '11', '12', '500')
+    prices = [engine.calculate_pricing(context(quantity)).unit_price for quantity in quantities]
+
+    # 10 and 11 are bounds, each is its own bracket, 12 and 500 share the one above 11
+    assert stats(engine) == (1, 5)
+    assert prices[:2] == [Decimal('100')] * 2
+    assert prices[3:] == [Decimal('90')] * 3
+
+
+def test_crossing_a_date_bound_misses(make_pricing_db):
+    engine = make_engine(make_pricing_db)
+
+    before = engine.calculate_pricing(context('2', datetime(2025, 6, 30, 23, 59, 59)))
+    after = engine.calculate_pricing(context('2', datetime(2025, 7, 1)))
+
+    assert stats(engine) == (0, 2)
+    assert (before.unit_price, after.unit_price) == (Decimal('100'), Decimal('80'))
+
+
+def test_cached_results_match_uncached_pricing(make_pricing_db):
+    engine = make_engine(make_pricing_db)
+    uncached = SageX3PricingEngine(engine.db_path, use_price_book=False, parallel_workers=1, result_cache_size=0)
+    contexts = [context(quantity, order_date)
+                for order_date in (datetime(2025, 1, 1), JUNE, datetime(2025, 6, 30, 23, 59, 59), datetime(2025, 7, 1),
+                                   datetime(2026, 1, 1))
+                for quantity in ('0.5', '1', '9.99', '10', '10.01', '11', '11.5', '500')]
+
+    for ctx in contexts + contexts[::-1]:
+        assert engine.calculate_pricing(ctx).unit_price == uncached.calculate_pricing(ctx).unit_price, ctx
+    assert stats(uncached)[0] == 0
+    assert stats(engine)[0] >= len(contexts)
+
+
+def test_a_new_generation_clears_the_cache(make_pricing_db):
+    engine = make_engine(make_pricing_db)
+    engine.warm_up()
+    assert engine.calculate_pricing(context('2')).unit_price == Decimal('100')
+    conn = sqlite3.connect(engine.db_path)
+    conn.execute("UPDATE SPRICLIST SET PRI_0 = '95' WHERE PRI_0 = '100'")
+    conn.commit()
+    rebuild_typed_pricing_lines(conn)
+    conn.close()
+
+    bump_sync_generation()
+    engine.warm_up()
+
+    assert engine.get_result_cache_stats()['size'] == 0
+    assert engine.calculate_pricing(context('2')).unit_price == Decimal('95')
+    assert stats(engine) == (0, 2)
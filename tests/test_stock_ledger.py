@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+
+from database.sync_data import bump_sync_generation
+from src.articles.stock_ledger import StockLedger, get_stock_ledger
+from src.command.model import CreateCommandRequest, LigneCommande
+from src.command.service import create_commande
+
+
+class FakeSession:
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Site S1 holding 10 of ITM1 over two locations and 4 of ITM2"""
+    path = str(tmp_path / 'stock.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE STOCK (AUUID_0, STOFCY_0 TEXT, ITMREF_0 TEXT, QTYSTUACT_0 REAL)")
+    conn.executemany("INSERT INTO STOCK VALUES (?, 'S1', ?, ?)", [('A1', 'ITM1', 6), ('A2', 'ITM1', 4), ('A3', 'ITM2', 4)])
+    conn.execute("""CREATE TABLE SORDER (AUUID_0, SOHNUM_0 TEXT, VACBPR_0 TEXT, SOHTYP_0 TEXT, SALFCY_0 TEXT,
+        BPCORD_0 TEXT, BPCINV_0 TEXT, BPCPYR_0 TEXT, CUR_0 TEXT, ORDNOT_0 REAL, ORDATI_0 REAL, ORDINVNOT_0 REAL,
+        ORDINVATI_0 REAL, PRITYP_0 INTEGER)""")
+    conn.execute("""CREATE TABLE SORDERP (AUUID_0, SOHNUM_0 TEXT, GROPRI_0 REAL, NETPRINOT_0 REAL, NETPRIATI_0 REAL,
+        FOCFLG_0 INTEGER, ITMREF_0 TEXT)""")
+    conn.execute("CREATE TABLE SORDERQ (AUUID_0, SOHNUM_0 TEXT, ITMREF_0 TEXT, QTY_0 REAL, ALLQTY_0 REAL)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr('src.command.service.get_db_file', lambda db: db.db_path)
+    return path
+
+
+def order(number, *lines):
+    return CreateCommandRequest(
+        num_comd=number, site_vente='S1', currency='EUR', client_comd='C1', client_payeur='C1', client_facture='C1',
+        total_ht=0, total_ttc=0, valo_ht=0, valo_ttc=0, price_type=1, regime_taxe='FRA', comd_type='SON',
+        ligne=[LigneCommande(num_comd=number, item_code=item, quantity=quantity, prix_net_ht=1, prix_net_ttc=1.2)
+               for item, quantity in lines],
+    )
+
+
+def sync_back(db_path, number, stock):
+    """Sage sends the order back with the stock left after it"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO SORDER (AUUID_0, SOHNUM_0, SALFCY_0) VALUES ('SAGE-1', ?, 'S1')", (number,))
+    for auuid, quantity in stock.items():
+        conn.execute("UPDATE STOCK SET QTYSTUACT_0 = ? WHERE AUUID_0 = ?", (quantity, auuid))
+    conn.commit()
+    conn.close()
+    bump_sync_generation()
+
+
+def test_ledger_is_seeded_from_the_stock_of_every_location(db_path):
+    ledger = StockLedger(db_path)
+
+    assert ledger.available('S1', 'ITM1') == 10.0
+    assert ledger.available_site('S1') == {'ITM1': 10.0, 'ITM2': 4.0}
+    assert ledger.available('S2', 'ITM1') == 0.0
+
+
+def test_orders_allocate_the_available_stock(db_path):
+    ledger = get_stock_ledger(db_path)
+    ledger.available('S1', 'ITM1')
+
+    create_commande(order('SO1', ('ITM1', 3), ('ITM2', 1)), FakeSession(db_path))
+
+    assert ledger.available_site('S1') == {'ITM1': 7.0, 'ITM2': 3.0}
+
+
+def test_pending_allocations_survive_a_new_generation(db_path):
+    ledger = get_stock_ledger(db_path)
+    create_commande(order('SO2', ('ITM1', 3)), FakeSession(db_path))
+    assert ledger.available('S1', 'ITM1') == 7.0
+
+    bump_sync_generation()  # A sync without the order
+
+    assert ledger.available('S1', 'ITM1') == 7.0
+    assert StockLedger(db_path).available('S1', 'ITM1') == 7.0
+
+
+def test_synced_back_orders_are_counted_in_the_stock_once(db_path):
+    ledger = get_stock_ledger(db_path)
+    create_commande(order('SO3', ('ITM1', 3)), FakeSession(db_path))
+    create_commande(order('SO4', ('ITM1', 2)), FakeSession(db_path))
+    assert ledger.available('S1', 'ITM1') == 5.0
+
+    sync_back(db_path, 'SO3', {'A1': 3})  # 6 - 3 on the first location
+
+    assert ledger.available('S1', 'ITM1') == 5.0  # 7 synced, SO4 still pending
@@ -0,0 +1,89 @@
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+
+from src.taxe.components.lot import DeterminationTaxeLot
+from src.taxe.table_decision import INDEX_CODE_TAXE, TableDecisionTaxe, compiler_critere_taxlink
+
+
+@pytest.fixture
+def table() -> TableDecisionTaxe:
+    """Régime FRA, niveau NOR: règle D1 sous critère TAXLINK puis règle D2 par défaut"""
+    connection = sqlite3.connect(':memory:')
+    colonnes = ['COD_0', 'VACBPR_0', 'VACITM_0', 'LEG_0', 'GRP_0', 'ENAFLG_0'] + [f'FILL{i}_0' for i in range(33)]
+    colonnes += ['VAT_0', 'CRE_0']
+    assert colonnes.index('VAT_0') == INDEX_CODE_TAXE
+    connection.execute(f"CREATE TABLE TABVAC ({', '.join(nom + ' TEXT' for nom in colonnes)})")
+    for cle, code_taxe, actif in (('D1', 'EXO', '2'), ('D2', 'NOR', '2'), ('D3', 'OFF', '1')):
+        connection.execute(f"INSERT INTO TABVAC VALUES ({', '.join('?' * len(colonnes))})",
+                           [cle, 'FRA', 'NOR', 'FRA', '', actif] + [''] * 33 + [code_taxe, ''])
+    connection.execute("CREATE TABLE TAXLINK (CLE_0 TEXT, LIGNE INTEGER, CHAMP TEXT, OPERATEUR TEXT, VALEUR TEXT)")
+    connection.execute("INSERT INTO TAXLINK VALUES ('D1', 1, 'type_client', 'IN', 'EXP, ZON')")
+    connection.execute("CREATE TABLE TABRATVAT (VAT_0 TEXT, LEG_0 TEXT, STRDAT_0 TEXT, VATRAT_0 REAL)")
+    connection.executemany("INSERT INTO TABRATVAT VALUES (?, 'FRA', ?, ?)", [
+        ('NOR', '2014-01-01 00:00:00', 20), ('NOR', '2026-01-01 00:00:00', 21), ('EXO', '2014-01-01', 0),
+    ])
+    connection.execute("CREATE TABLE TABVACBPR (VACBPR_0 TEXT, LEG_0 TEXT)")
+    connection.execute("INSERT INTO TABVACBPR VALUES ('FRA', 'FRA')")
+    connection.execute("CREATE TABLE ITMMASTER (ITMREF_0 TEXT, VACITM_0 TEXT)")
+    connection.execute("INSERT INTO ITMMASTER VALUES ('ITM1', 'NOR')")
+    return TableDecisionTaxe.load(connection, 0)
+
+
+def donnees(date_commande=None, **contexte):
+    return {'regime_taxe_tiers': 'FRA', 'niveau_taxe_article': 'NOR', 'legislation': 'FRA',
+            'date_commande': date_commande, **contexte}
+
+
+def test_taux_en_vigueur_a_la_date_de_commande(table):
+    assert table.taux_a_date('NOR', date(2013, 12, 31)) is None
+    assert table.taux_a_date('NOR', date(2014, 1, 1)) == 20
+    assert table.taux_a_date('NOR', datetime(2025, 12, 31, 23, 59)) == 20
+    assert table.taux_a_date('NOR', date(2026, 1, 1)) == 21
+
+
+def test_determination_au_taux_de_la_date_de_commande(table):
+    determinateur = DeterminationTaxeLot(table)
+    assert determinateur.determiner_code_taxe(donnees(datetime(2025, 6, 1))) == {'code_taxe': 'NOR', 'taux': 20}
+    assert determinateur.determiner_code_taxe(donnees(datetime(2026, 6, 1))) == {'code_taxe': 'NOR', 'taux': 21}
+
+
+def test_regle_retenue_selon_les_criteres_taxlink(table):
+    determinateur = DeterminationTaxeLot(table)
+    assert determinateur.determiner_code_taxe(donnees(type_client='EXP'))['code_taxe'] == 'EXO'
+    assert determinateur.determiner_code_taxe(donnees(type_client='FRA'))['code_taxe'] == 'NOR'
+
+
+def test_regle_inactive_ignoree(table):
+    assert [code for _, code in table.candidats('FRA', 'NOR', 'FRA')] == ['EXO', 'NOR']
+
+
+def test_erreur_sans_regle(table):
+    resultat = DeterminationTaxeLot(table).determiner_code_taxe(donnees(niveau_taxe_article='RED'))
+    assert 'erreur' in resultat
+
+
+def test_legislation_et_niveau_article(table):
+    determinateur = DeterminationTaxeLot(table)
+    assert determinateur.legislation('FRA') == 'FRA'
+    assert determinateur.legislation('XXX') is None
+    assert determinateur.niveau_taxe_article('ITM1') == 'NOR'
+
+
+@pytest.mark.parametrize('critere, contexte, attendu', [
+    ({'CHAMP': 'pays', 'OPERATEUR': '=', 'VALEUR': 'FR'}, {'pays': 'FR'}, True),
+    ({'CHAMP': 'pays', 'OPERATEUR': '=', 'VALEUR': 'FR'}, {'pays': 'SN'}, False),
+    ({'CHAMP': 'pays', 'OPERATEUR': '!=', 'VALEUR': 'FR'}, {}, True),
+    ({'CHAMP': 'pays', 'OPERATEUR': 'IN', 'VALEUR': 'FR, BE,LU'}, {'pays': 'BE'}, True),
+    ({'CHAMP': 'pays', 'OPERATEUR': 'IN', 'VALEUR': 'FR, BE,LU'}, {'pays': 'B'}, False),
+    ({'CHAMP': 'montant', 'OPERATEUR': '>=', 'VALEUR': 100}, {'montant': 100}, True),
+    ({'CHAMP': 'montant', 'OPERATEUR': '>', 'VALEUR': 100}, {'montant': 0}, False),
+    ({'CHAMP': 'montant', 'OPERATEUR': '<', 'VALEUR': 100}, {}, False),
+    ({'CHAMP': 'libelle', 'OPERATEUR': 'LIKE', 'VALEUR': 'export'}, {'libelle': 'vente export'}, True),
+    ({'CHAMP': 'pays', 'OPERATEUR': '~', 'VALEUR': 'FR'}, {'pays': 'SN'}, True),
+    ({'CHAMP': '', 'OPERATEUR': '=', 'VALEUR': 'FR'}, {'pays': 'SN'}, True),
+    ({'CHAMP': 'pays', 'OPERATEUR': '=', 'VALEUR': None}, {'pays': 'SN'}, True),
+])
+def test_critere_taxlink_compile(critere, contexte, attendu):
+    assert compiler_critere_taxlink(critere)(contexte) is attendu
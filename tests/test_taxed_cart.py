@@ -0,0 +1,72 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from conftest import pricing_line
+from src.pricing.model import PricingInput, PricingTaxedCartInput
+from src.pricing.service import calculate_taxed_cart_pricing
+
+ITEMS = [('ITM1', '0', 'UN', 'UN', '1', 'NOR'), ('ITM2', '0', 'UN', 'UN', '1', 'XXX')]
+
+
+class FakeSession:
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+
+@pytest.fixture
+def db(make_pricing_db, monkeypatch):
+    """Regime FRA, level NOR taxed at 20%, no rule for level XXX"""
+    db_path = make_pricing_db([pricing_line('ITM1', price='10'), pricing_line('ITM2', price='5')], items=ITEMS)
+    conn = sqlite3.connect(db_path)
+    columns = ['COD_0', 'VACBPR_0', 'VACITM_0', 'LEG_0', 'GRP_0', 'ENAFLG_0'] + [f'FILL{i}_0' for i in range(33)]
+    columns += ['VAT_0', 'CRE_0']
+    conn.execute(f"CREATE TABLE TABVAC ({', '.join(name + ' TEXT' for name in columns)})")
+    conn.execute(f"INSERT INTO TABVAC VALUES ({', '.join('?' * len(columns))})",
+                 ['D1', 'FRA', 'NOR', 'FRA', '', '2'] + [''] * 33 + ['NOR', ''])
+    conn.execute("CREATE TABLE TAXLINK (CLE_0 TEXT, LIGNE INTEGER, CHAMP TEXT, OPERATEUR TEXT, VALEUR TEXT)")
+    conn.execute("CREATE TABLE TABRATVAT (VAT_0 TEXT, LEG_0 TEXT, STRDAT_0 TEXT, VATRAT_0 REAL)")
+    conn.execute("INSERT INTO TABRATVAT VALUES ('NOR', 'FRA', '2014-01-01 00:00:00', 20)")
+    conn.execute("CREATE TABLE TABVACBPR (VACBPR_0 TEXT, LEG_0 TEXT)")
+    conn.execute("INSERT INTO TABVACBPR VALUES ('FRA', 'FRA')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr('src.pricing.service.get_db_file', lambda session: session.db_path)
+    return FakeSession(db_path)
+
+
+def cart(*items, customer='C1'):
+    return PricingTaxedCartInput(lines=[
+        PricingInput(customer_code=customer, item_code=item, quantity='2', currency='EUR', unit_of_measure='UN',
+                     order_date=datetime(2025, 3, 15))
+        for item in items
+    ])
+
+
+def test_lines_are_taxed_at_the_rate_of_their_code(db):
+    output = calculate_taxed_cart_pricing(cart('ITM1'), db)
+
+    [line] = output.lines
+    assert (line.code_taxe, line.taux, line.total_TTC, line.erreur) == ('NOR', 20.0, 24.0, None)
+    assert (output.regime_taxe, output.total_ht, output.total_ttc) == ('FRA', 20.0, 24.0)
+
+
+def test_line_without_tax_code_carries_the_error(db):
+    output = calculate_taxed_cart_pricing(cart('ITM1', 'ITM2'), db)
+
+    taxed, untaxed = output.lines
+    assert taxed.total_TTC == 24.0 and taxed.erreur is None
+    assert untaxed.erreur
+    assert (untaxed.code_taxe, untaxed.taux, untaxed.total_TTC, untaxed.prix_net_ttc) == (None, None, None, None)
+    assert untaxed.total_HT == 10.0
+    assert output.total_ht == 30.0
+    assert output.total_ttc is None and output.valo_ttc is None
+
+
+def test_unknown_customer_regime_is_an_error_on_every_line(db):
+    output = calculate_taxed_cart_pricing(cart('ITM1', 'ITM1', customer='C9'), db)
+
+    assert output.regime_taxe == ''
+    assert all(line.erreur == "Régime de taxe du client C9 inconnu" for line in output.lines)
+    assert output.total_ttc is None
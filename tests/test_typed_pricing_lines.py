@@ -0,0 +1,43 @@
+import sqlite3
+from itertools import product
+
+from conftest import pricing_line
+
+# Text values as the ingest stores them
+QUANTITIES = ['0', '', None, '5', '10.5', '10abc', ' 7', '1e1', '-3', 'abc', '.5']
+DATES = ['2025-03-15 00:00:00', '2025-03-15 12:00:00', '2025-03-15', '2025-03-15 12:00', '2025-03-15T12:00:00',
+         '2025-03-15 12:00:00.500', '', None, 'never']
+CRITERIA = ['ITM1', '~', 'ITM~', '', None]
+
+PROBE_DATES = ['2025-03-14 23:59:59', '2025-03-15 00:00:00', '2025-03-15 11:59:59', '2025-03-15 12:00:00',
+               '2025-03-15 12:00:01', '2025-03-16 00:00:00']
+PROBE_QUANTITIES = [0.25, 1, 5, 7, 10, 10.5, 11]
+
+# (typed predicate, text predicate of query_applicable_pricing_lines)
+PREDICATES = {
+    'date': [("PLISTRDAT_D <= :value", "PLISTRDAT_0 <= :value"),
+             ("PLIENDDAT_D >= :value", "PLIENDDAT_0 >= :value")],
+    'quantity': [("(MINQTY_N <= :value OR MINQTY_N = 0)",
+                  "(CAST(MINQTY_0 AS REAL) <= :value OR CAST(MINQTY_0 AS REAL) = 0)"),
+                 ("(MAXQTY_N >= :value OR MAXQTY_N = 0)",
+                  "(CAST(MAXQTY_0 AS REAL) >= :value OR CAST(MAXQTY_0 AS REAL) = 0)")],
+    'criterion': [("(PLICRI1_0 = :value OR PLICRI1_W = 1)", "(PLICRI1_0 = :value OR PLICRI1_0 LIKE '%~%')")],
+}
+
+
+def matches(conn, predicate, value):
+    """AUUID_0 of the SPRICLIST_TYPED rows a WHERE predicate retains"""
+    return {row[0] for row in conn.execute(f"SELECT AUUID_0 FROM SPRICLIST_TYPED WHERE {predicate}",
+                                           {'value': value})}
+
+
+def test_typed_columns_filter_as_the_text_columns(make_pricing_db):
+    lines = [pricing_line(criterion or 'ITM1', PLICRI1_0=criterion, PLISTRDAT_0=date, PLIENDDAT_0=date,
+                          MINQTY_0=quantity, MAXQTY_0=quantity)
+             for date, quantity, criterion in product(DATES, QUANTITIES, CRITERIA)]
+    conn = sqlite3.connect(make_pricing_db(lines))
+
+    probes = {'date': PROBE_DATES, 'quantity': PROBE_QUANTITIES, 'criterion': ['ITM1', 'ITM2']}
+    for kind, predicates in PREDICATES.items():
+        for (typed, text), value in product(predicates, probes[kind]):
+            assert matches(conn, typed, value) == matches(conn, text, value), (typed, value)
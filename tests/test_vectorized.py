@@ -0,0 +1,31 @@
+import logging
+from decimal import Decimal
+
+import pytest
+
+from src.pricing import vectorized
+from src.pricing.benchmark import check_vectorized_parity
+
+# Checked on the import, vectorized_available() would log the missing NumPy during the collection
+requires_numpy = pytest.mark.skipif(vectorized.np is None, reason="NumPy is not installed")
+
+
+def test_missing_numpy_is_logged_once(monkeypatch, caplog):
+    monkeypatch.setattr(vectorized, 'np', None)
+    monkeypatch.setattr(vectorized, '_unavailable_logged', False)
+    with caplog.at_level(logging.WARNING, logger=vectorized.__name__):
+        assert not vectorized.vectorized_available()
+        assert not vectorized.vectorized_available()
+    assert len(caplog.records) == 1
+
+
+@requires_numpy
+def test_random_adjustments_match_decimal():
+    parity = check_vectorized_parity(3000, seed=7)
+    assert parity['mismatches'] == 0, parity['cases']
+    assert parity['scalar'] < parity['samples']
+
+
+@requires_numpy
+def test_lines_without_adjustments_are_left_to_the_scalar_engine():
+    assert vectorized.apply_adjustments_vectorized([Decimal('10')], [Decimal('1')], [[]]) == [None]